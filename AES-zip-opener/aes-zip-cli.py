@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+"""
+Headless AES ZIP opener for scripted and batch use (no Tk required)
+
+Run `python aes-zip-cli.py --help` for the available commands.
+"""
+
+import sys
+
+from aeszip.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
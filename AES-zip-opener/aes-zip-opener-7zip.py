@@ -5,18 +5,23 @@ Enhanced version with 7-Zip backend support for all compression methods
 """
 
 import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
-import zipfile
+from tkinter import filedialog, messagebox, simpledialog, ttk
 import os
-import tempfile
-import subprocess
+import sqlite3
 import sys
-from pathlib import Path
-import locale
-import json
-import shutil
-import threading
-from datetime import datetime
+
+from aeszip.backends import ThroughputHistory, default_history_path
+from aeszip.batch import (DEFAULT_JOBS, RESULTS_NAME, ArchiveQueue, FolderWatcher, IOBudget,
+                          iter_archives)
+from aeszip.core import (Archive, OperationCancelled, PasswordError, find_7zip, format_size,
+                         get_compression_method_name)
+from aeszip.index import ArchiveIndex
+from aeszip.jobs import Job, JobScheduler
+from aeszip.keycache import DerivedKeyCache
+from aeszip.preview import PreviewCache, render_preview
+from aeszip.progress import format_progress
+from aeszip.repack import FORMAT_ZIP_AES, format_for
+from aeszip.virtualview import VirtualTreeview
 
 class AESZipOpener:
     def __init__(self, root):
@@ -30,25 +35,46 @@ class AESZipOpener:
         self.password = tk.StringVar()
         self.seven_zip_path = self.find_7zip()
         
+        # Background operations; one runs at a time, the rest queue up
+        self.jobs = JobScheduler(max_workers=1)
+        self.listing_job = None
+        self.busy = False
+        
+        # Batch window's ArchiveQueue and folder watcher, while a batch runs
+        self.batch_queue = None
+        self.batch_watcher = None
+        
+        # Persistent listing index so re-opening a known archive is instant
+        try:
+            self.index = ArchiveIndex()
+        except (OSError, sqlite3.Error):
+            self.index = None
+        
+        # Derived AES keys for this session; forgotten when the password changes
+        self.key_cache = DerivedKeyCache()
+        
+        # Recently previewed entries, kept in memory only
+        self.preview_cache = PreviewCache()
+        
+        # Measured backend speeds; "Auto" picks 7-Zip or Python per archive from them
+        self.history = ThroughputHistory(default_history_path())
+        self.password.trace_add("write", lambda *args: self.forget_secrets())
+        
         self.setup_ui()
         
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(self.POLL_INTERVAL_MS, self.poll_jobs)
+        
         # Check for 7-Zip availability
         if not self.seven_zip_path:
             self.show_7zip_warning()
     
+    # How often job progress is delivered to the UI
+    POLL_INTERVAL_MS = 100
+    
     def find_7zip(self):
         """Find 7-Zip installation on the system"""
-        possible_paths = [
-            r"C:\Program Files\7-Zip\7z.exe",
-            r"C:\Program Files (x86)\7-Zip\7z.exe",
-            r"C:\Tools\7-Zip\7z.exe",
-            "7z.exe"  # If in PATH
-        ]
-        
-        for path in possible_paths:
-            if shutil.which(path) or os.path.exists(path):
-                return path
-        return None
+        return find_7zip()
     
     def show_7zip_warning(self):
         """Show warning if 7-Zip is not found"""
@@ -112,6 +138,22 @@ The application will try Python's built-in ZIP support first, but may fail with
         ttk.Radiobutton(method_frame, text="7-Zip", variable=self.method_var, value="7zip").pack(side=tk.LEFT, padx=(10, 0))
         ttk.Radiobutton(method_frame, text="Python", variable=self.method_var, value="python").pack(side=tk.LEFT, padx=(10, 0))
         
+        # Worker processes for the Python backend
+        self.workers_var = tk.IntVar(value=1)
+        ttk.Label(method_frame, text="Workers:").pack(side=tk.LEFT, padx=(20, 0))
+        ttk.Spinbox(method_frame, from_=1, to=os.cpu_count() or 1, width=4,
+                    textvariable=self.workers_var).pack(side=tk.LEFT, padx=(5, 0))
+        
+        # Incremental extraction: leave unchanged files from a previous run alone
+        self.incremental_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(method_frame, text="Skip unchanged", variable=self.incremental_var).pack(
+            side=tk.LEFT, padx=(20, 0))
+        
+        # Nested extraction: open ZIPs inside the archive in memory and extract them too
+        self.nested_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(method_frame, text="Open nested ZIPs", variable=self.nested_var).pack(
+            side=tk.LEFT, padx=(10, 0))
+        
         # Buttons frame
         buttons_frame = ttk.Frame(main_frame)
         buttons_frame.grid(row=5, column=0, columnspan=3, pady=20)
@@ -122,8 +164,21 @@ The application will try Python's built-in ZIP support first, but may fail with
             side=tk.LEFT, padx=5)
         ttk.Button(buttons_frame, text="Extract Selected", command=self.extract_selected).pack(
             side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="Preview", command=self.preview_selected).pack(
+            side=tk.LEFT, padx=5)
         ttk.Button(buttons_frame, text="Test Archive", command=self.test_archive).pack(
             side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="Search...", command=self.show_search_window).pack(
+            side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="Convert...", command=self.convert_archive).pack(
+            side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="Create...", command=self.create_archive).pack(
+            side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="Batch...", command=self.show_batch_window).pack(
+            side=tk.LEFT, padx=5)
+        self.cancel_button = ttk.Button(buttons_frame, text="Cancel", command=self.cancel_jobs,
+                                        state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
         
         # File list frame
         list_frame = ttk.LabelFrame(main_frame, text="Archive Contents", padding="5")
@@ -132,27 +187,9 @@ The application will try Python's built-in ZIP support first, but may fail with
         list_frame.rowconfigure(0, weight=1)
         main_frame.rowconfigure(6, weight=1)
         
-        # Treeview for file list
-        self.file_tree = ttk.Treeview(list_frame, columns=("Size", "Compressed", "Method", "Modified"), show="tree headings")
-        self.file_tree.heading("#0", text="File Name")
-        self.file_tree.heading("Size", text="Size")
-        self.file_tree.heading("Compressed", text="Compressed")
-        self.file_tree.heading("Method", text="Method")
-        self.file_tree.heading("Modified", text="Modified")
-        self.file_tree.column("#0", width=250)
-        self.file_tree.column("Size", width=80)
-        self.file_tree.column("Compressed", width=80)
-        self.file_tree.column("Method", width=80)
-        self.file_tree.column("Modified", width=130)
-        
-        # Scrollbars
-        v_scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.file_tree.yview)
-        h_scrollbar = ttk.Scrollbar(list_frame, orient=tk.HORIZONTAL, command=self.file_tree.xview)
-        self.file_tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
-        
-        self.file_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        v_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
-        h_scrollbar.grid(row=1, column=0, sticky=(tk.W, tk.E))
+        # Virtual contents view: only visible rows exist as Treeview items
+        self.file_view = VirtualTreeview(list_frame)
+        self.file_view.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
         # Progress bar
         self.progress = ttk.Progressbar(main_frame, mode='indeterminate')
@@ -171,7 +208,9 @@ The application will try Python's built-in ZIP support first, but may fail with
     def browse_file(self):
         filename = filedialog.askopenfilename(
             title="Select AES Encrypted ZIP File",
-            filetypes=[("ZIP files", "*.zip"), ("All files", "*.*")]
+            filetypes=[("ZIP files", "*.zip"),
+                       ("Split ZIP volumes", "*.z01 *.001"),
+                       ("All files", "*.*")]
         )
         if filename:
             self.zip_file_path.set(filename)
@@ -179,203 +218,175 @@ The application will try Python's built-in ZIP support first, but may fail with
     
     def format_size(self, size_bytes):
         """Convert bytes to human readable format"""
-        if size_bytes == 0:
-            return "0 B"
-        size_names = ["B", "KB", "MB", "GB"]
-        i = 0
-        while size_bytes >= 1024 and i < len(size_names) - 1:
-            size_bytes /= 1024.0
-            i += 1
-        return f"{size_bytes:.1f} {size_names[i]}"
+        return format_size(size_bytes)
     
     def get_compression_method_name(self, method_id):
         """Get human-readable compression method name"""
-        methods = {
-            0: "Stored",
-            8: "Deflate",
-            9: "Deflate64",
-            12: "BZIP2",
-            14: "LZMA",
-            95: "XZ",
-            99: "AES"
-        }
-        return methods.get(method_id, f"Method {method_id}")
-    
-    def run_with_progress(self, func, *args, **kwargs):
-        """Run a function with progress indication"""
-        self.progress.start()
-        self.root.update()
-        
-        def worker():
-            try:
-                result = func(*args, **kwargs)
-                self.root.after(0, lambda: self.progress.stop())
-                return result
-            except Exception as e:
-                self.root.after(0, lambda: self.progress.stop())
-                raise e
-        
-        return worker()
-    
-    def list_with_7zip(self):
-        """List archive contents using 7-Zip"""
-        if not self.seven_zip_path:
-            raise Exception("7-Zip not available")
-        
-        cmd = [self.seven_zip_path, "l", "-slt", self.zip_file_path.get()]
-        if self.password.get():
-            cmd.extend([f"-p{self.password.get()}"])
-        
+        return get_compression_method_name(method_id)
+    
+    def current_archive(self):
+        """Build the core Archive for the current file, password and method"""
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, 
-                                  encoding='utf-8', errors='replace', timeout=30)
-            
-            if result.returncode != 0:
-                if "Wrong password" in result.stderr or "Cannot open encrypted archive" in result.stderr:
-                    raise Exception("Incorrect password")
-                else:
-                    raise Exception(f"7-Zip error: {result.stderr}")
-            
-            return self.parse_7zip_listing(result.stdout)
-        except subprocess.TimeoutExpired:
-            raise Exception("Operation timed out")
-    
-    def parse_7zip_listing(self, output):
-        """Parse 7-Zip listing output"""
-        files = []
-        current_file = {}
-        
-        for line in output.split('\n'):
-            line = line.strip()
-            if line.startswith('Path = '):
-                if current_file and not current_file.get('Path', '').endswith('/'):
-                    files.append(current_file)
-                current_file = {'Path': line[7:]}
-            elif line.startswith('Size = '):
-                current_file['Size'] = int(line[7:]) if line[7:].isdigit() else 0
-            elif line.startswith('Packed Size = '):
-                current_file['Packed Size'] = int(line[14:]) if line[14:].isdigit() else 0
-            elif line.startswith('Method = '):
-                current_file['Method'] = line[9:]
-            elif line.startswith('Modified = '):
-                current_file['Modified'] = line[11:]
-        
-        if current_file and not current_file.get('Path', '').endswith('/'):
-            files.append(current_file)
-        
-        return files
-    
-    def list_with_python(self):
-        """List archive contents using Python's zipfile"""
-        files = []
-        with zipfile.ZipFile(self.zip_file_path.get(), 'r') as zip_file:
-            if self.password.get():
-                zip_file.setpassword(self.password.get().encode('utf-8'))
-            
-            for file_info in zip_file.infolist():
-                if not file_info.filename.endswith('/'):
-                    try:
-                        filename = file_info.filename
-                        if isinstance(filename, bytes):
-                            filename = filename.decode('utf-8')
-                    except UnicodeDecodeError:
-                        filename = str(file_info.filename)
-                    
-                    try:
-                        modified = f"{file_info.date_time[0]}-{file_info.date_time[1]:02d}-{file_info.date_time[2]:02d} {file_info.date_time[3]:02d}:{file_info.date_time[4]:02d}"
-                    except:
-                        modified = "Unknown"
-                    
-                    files.append({
-                        'Path': filename,
-                        'Size': file_info.file_size,
-                        'Packed Size': file_info.compress_size,
-                        'Method': self.get_compression_method_name(file_info.compress_type),
-                        'Modified': modified
-                    })
-        return files
+            workers = max(1, self.workers_var.get())
+        except tk.TclError:
+            workers = 1
+        archive = Archive(self.zip_file_path.get(), self.password.get(),
+                          self.method_var.get(), self.seven_zip_path, workers, self.index)
+        archive.key_cache = self.key_cache
+        archive.preview_cache = self.preview_cache
+        archive.history = self.history
+        return archive
+    
+    def submit_job(self, name, func, on_success, on_error, on_progress=None):
+        """Queue an operation on the background scheduler"""
+        job = self.jobs.submit(Job(name, func, on_success, on_error, on_progress))
+        if len(self.jobs.active()) > 1:
+            self.status_var.set(f"{name} queued ({len(self.jobs.active())} jobs pending)")
+        else:
+            self.status_var.set(f"{name}...")
+        return job
+    
+    def poll_jobs(self):
+        """Deliver job events on the Tk thread and keep the progress bar in sync"""
+        self.jobs.poll()
+        busy = bool(self.jobs.active())
+        if busy and not self.busy:
+            self.progress.start()
+        elif self.busy and not busy:
+            self.progress.stop()
+            self.progress.config(mode='indeterminate', value=0)
+        self.busy = busy
+        self.cancel_button.config(state=tk.NORMAL if busy else tk.DISABLED)
+        self.root.after(self.POLL_INTERVAL_MS, self.poll_jobs)
+    
+    def progress_reporter(self, name):
+        """on_progress handler showing ProgressSnapshots in the bar and status line"""
+        def on_progress(snapshot):
+            if snapshot.percent is not None:
+                if str(self.progress.cget('mode')) != 'determinate':
+                    self.progress.stop()
+                    self.progress.config(mode='determinate', maximum=100)
+                self.progress.config(value=snapshot.percent)
+            self.status_var.set(f"{name}... {format_progress(snapshot)}")
+        return on_progress
+    
+    def cancel_jobs(self):
+        """Cancel the running job and everything queued behind it"""
+        self.jobs.cancel_all()
+        self.status_var.set("Cancelling...")
+    
+    def forget_secrets(self):
+        """Drop derived keys and decrypted previews"""
+        self.key_cache.clear()
+        self.preview_cache.clear()
+    
+    def on_close(self):
+        if self.batch_queue is not None:
+            # Cancels every extraction; the job threads end with the process
+            self.batch_queue.shutdown()
+        self.jobs.shutdown()
+        self.forget_secrets()
+        self.root.destroy()
+    
+    # Entries sent to the UI per progress event while a listing streams in
+    LISTING_BATCH = 2000
     
     def view_contents(self):
         if not self.zip_file_path.get():
             messagebox.showerror("Error", "Please select a ZIP file first.")
             return
         
-        # Clear existing items
-        for item in self.file_tree.get_children():
-            self.file_tree.delete(item)
-        
-        try:
-            self.progress.start()
-            self.status_var.set("Reading archive contents...")
-            self.root.update()
-            
-            files = None
-            method_used = ""
-            
-            if self.method_var.get() == "7zip" or (self.method_var.get() == "auto" and self.seven_zip_path):
-                try:
-                    files = self.list_with_7zip()
-                    method_used = "7-Zip"
-                except Exception as e:
-                    if self.method_var.get() == "7zip":
-                        raise e
-                    # Fall back to Python method if auto mode
-                    pass
-            
-            if files is None:
-                files = self.list_with_python()
-                method_used = "Python"
-            
-            # Populate the tree
-            for file_data in files:
-                self.file_tree.insert("", tk.END, 
-                                    text=file_data['Path'],
-                                    values=(
-                                        self.format_size(file_data.get('Size', 0)),
-                                        self.format_size(file_data.get('Packed Size', 0)),
-                                        file_data.get('Method', 'Unknown'),
-                                        file_data.get('Modified', 'Unknown')
-                                    ))
-            
-            self.status_var.set(f"Archive contents loaded using {method_used} - {len(files)} files")
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Error reading archive: {str(e)}")
-            self.status_var.set("Error reading archive")
-        finally:
-            self.progress.stop()
+        if self.listing_job is not None:
+            self.listing_job.cancel()
+        self.file_view.clear()
+        
+        archive = self.current_archive()
+        
+        def work(job):
+            archive.token = job.token
+            batch = []
+            count = 0
+            for entry in archive.iter_list():
+                batch.append(entry)
+                if len(batch) == self.LISTING_BATCH:
+                    count += len(batch)
+                    job.report(batch)
+                    batch = []
+            if batch:
+                count += len(batch)
+                job.report(batch)
+            return count
+        
+        def on_progress(batch):
+            if self.listing_job is job:
+                self.file_view.add_entries(batch)
+                self.status_var.set(f"Reading archive contents using {archive.method_used}... "
+                                    f"{len(self.file_view.store)} files")
+        
+        def on_success(count):
+            if self.listing_job is job:
+                self.listing_job = None
+                self.status_var.set(f"Archive contents loaded using {archive.method_used} - {count} files")
+        
+        def on_error(error):
+            if self.listing_job is job:
+                self.listing_job = None
+                if isinstance(error, OperationCancelled):
+                    self.status_var.set("Listing cancelled")
+                    return
+                if isinstance(error, PasswordError):
+                    messagebox.showerror("Error", "Incorrect password.")
+                    self.status_var.set("Incorrect password")
+                    return
+                messagebox.showerror("Error", f"Error reading archive: {str(error)}")
+                self.status_var.set("Error reading archive")
+        
+        job = self.listing_job = self.submit_job("Reading archive contents", work,
+                                                 on_success, on_error, on_progress)
     
-    def extract_with_7zip(self, extract_dir, selected_files=None):
-        """Extract files using 7-Zip"""
-        if not self.seven_zip_path:
-            raise Exception("7-Zip not available")
-        
-        if selected_files:
-            # Extract selected files
-            for filename in selected_files:
-                cmd = [self.seven_zip_path, "e", self.zip_file_path.get(), 
-                      f"-o{extract_dir}", filename]
-                if self.password.get():
-                    cmd.extend([f"-p{self.password.get()}"])
-                
-                result = subprocess.run(cmd, capture_output=True, text=True,
-                                      encoding='utf-8', errors='replace')
-                if result.returncode != 0:
-                    raise Exception(f"7-Zip extraction error: {result.stderr}")
-        else:
-            # Extract all files
-            cmd = [self.seven_zip_path, "x", self.zip_file_path.get(), 
-                  f"-o{extract_dir}"]
-            if self.password.get():
-                cmd.extend([f"-p{self.password.get()}"])
+    def run_extraction(self, extract_dir, selected_files=None):
+        """Extract in the background and report the outcome when done"""
+        archive = self.current_archive()
+        incremental = self.incremental_var.get()
+        nested = self.nested_var.get()
+        if incremental and nested:
+            messagebox.showerror("Error", "\"Skip unchanged\" and \"Open nested ZIPs\" "
+                                          "cannot be used together.")
+            return
+        
+        def work(job):
+            archive.token = job.token
+            archive.progress = job.report
+            return archive.extract(extract_dir, selected_files, incremental, nested)
+        
+        def on_success(method_used):
+            skipped = ""
+            if incremental:
+                skipped = (f" - skipped {archive.skipped_files} unchanged file(s), "
+                           f"{self.format_size(archive.skipped_bytes)}")
+            if nested:
+                skipped = f" - {archive.nested_archives} nested archive(s) opened"
+            if selected_files:
+                messagebox.showinfo("Success", 
+                                  f"Extracted {len(selected_files)} file(s) to:\n{extract_dir}\n\nMethod used: {method_used}{skipped}")
+                self.status_var.set(f"Extracted {len(selected_files)} files using {method_used}{skipped}")
+            else:
+                messagebox.showinfo("Success", f"All files extracted to:\n{extract_dir}\n\nMethod used: {method_used}{skipped}")
+                self.status_var.set(f"Extraction completed using {method_used}{skipped}")
             
-            result = subprocess.run(cmd, capture_output=True, text=True,
-                                  encoding='utf-8', errors='replace')
-            if result.returncode != 0:
-                if "Wrong password" in result.stderr:
-                    raise Exception("Incorrect password")
-                else:
-                    raise Exception(f"7-Zip extraction error: {result.stderr}")
+            if messagebox.askyesno("Open Folder", "Would you like to open the extraction folder?"):
+                os.startfile(extract_dir)
+        
+        def on_error(error):
+            if isinstance(error, OperationCancelled):
+                self.status_var.set("Extraction cancelled")
+                return
+            what = "selected files" if selected_files else "files"
+            messagebox.showerror("Error", f"Error extracting {what}: {str(error)}")
+            self.status_var.set("Extraction failed")
+        
+        name = "Extracting selected files" if selected_files else "Extracting all files"
+        self.submit_job(name, work, on_success, on_error, self.progress_reporter(name))
     
     def extract_all(self):
         if not self.zip_file_path.get():
@@ -386,52 +397,11 @@ The application will try Python's built-in ZIP support first, but may fail with
         if not extract_dir:
             return
         
-        try:
-            self.progress.start()
-            self.status_var.set("Extracting all files...")
-            self.root.update()
-            
-            if self.method_var.get() == "7zip" or (self.method_var.get() == "auto" and self.seven_zip_path):
-                try:
-                    self.extract_with_7zip(extract_dir)
-                    method_used = "7-Zip"
-                except Exception as e:
-                    if self.method_var.get() == "7zip":
-                        raise e
-                    # Fall back to Python method
-                    self.extract_with_python(extract_dir)
-                    method_used = "Python"
-            else:
-                self.extract_with_python(extract_dir)
-                method_used = "Python"
-            
-            messagebox.showinfo("Success", f"All files extracted to:\n{extract_dir}\n\nMethod used: {method_used}")
-            self.status_var.set(f"Extraction completed using {method_used}")
-            
-            if messagebox.askyesno("Open Folder", "Would you like to open the extraction folder?"):
-                os.startfile(extract_dir)
-                
-        except Exception as e:
-            messagebox.showerror("Error", f"Error extracting files: {str(e)}")
-            self.status_var.set("Extraction failed")
-        finally:
-            self.progress.stop()
-    
-    def extract_with_python(self, extract_dir, selected_files=None):
-        """Extract files using Python's zipfile"""
-        with zipfile.ZipFile(self.zip_file_path.get(), 'r') as zip_file:
-            if self.password.get():
-                zip_file.setpassword(self.password.get().encode('utf-8'))
-            
-            if selected_files:
-                for filename in selected_files:
-                    zip_file.extract(filename, extract_dir)
-            else:
-                zip_file.extractall(extract_dir)
+        self.run_extraction(extract_dir)
     
     def extract_selected(self):
-        selected_items = self.file_tree.selection()
-        if not selected_items:
+        selected_files = self.file_view.selected_paths()
+        if not selected_files:
             messagebox.showwarning("Warning", "Please select files to extract.")
             return
         
@@ -443,39 +413,441 @@ The application will try Python's built-in ZIP support first, but may fail with
         if not extract_dir:
             return
         
+        self.run_extraction(extract_dir, selected_files)
+    
+    def preview_selected(self):
+        """Show the first selected entry in a window without writing it to disk"""
+        selected_files = self.file_view.selected_paths()
+        if not selected_files:
+            messagebox.showwarning("Warning", "Please select a file to preview.")
+            return
+        self.preview_entry(selected_files[0])
+    
+    def preview_entry(self, name):
+        """Show one entry in the preview window"""
+        archive = self.current_archive()
+        
+        def work(job):
+            archive.token = job.token
+            return archive.preview(name)
+        
+        def on_success(preview):
+            self.show_preview(preview)
+            self.status_var.set(f"Previewing {name} ({archive.method_used})")
+        
+        def on_error(error):
+            if isinstance(error, OperationCancelled):
+                self.status_var.set("Preview cancelled")
+            elif isinstance(error, PasswordError):
+                messagebox.showerror("Error", "Incorrect password.")
+                self.status_var.set("Preview failed")
+            else:
+                messagebox.showerror("Error", f"Error previewing file: {str(error)}")
+                self.status_var.set("Preview failed")
+        
+        self.submit_job(f"Previewing {name}", work, on_success, on_error)
+    
+    def show_preview(self, preview):
+        """Reuse one preview window, replacing its text"""
+        window = getattr(self, "preview_window", None)
+        if window is None or not window.winfo_exists():
+            window = self.preview_window = tk.Toplevel(self.root)
+            window.geometry("700x500")
+            text = tk.Text(window, wrap=tk.NONE, font=("Consolas", 10))
+            y_scrollbar = ttk.Scrollbar(window, orient=tk.VERTICAL, command=text.yview)
+            x_scrollbar = ttk.Scrollbar(window, orient=tk.HORIZONTAL, command=text.xview)
+            text.configure(yscrollcommand=y_scrollbar.set, xscrollcommand=x_scrollbar.set)
+            window.columnconfigure(0, weight=1)
+            window.rowconfigure(0, weight=1)
+            text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+            y_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+            x_scrollbar.grid(row=1, column=0, sticky=(tk.W, tk.E))
+            window.preview_text = text
+        window.title(f"Preview - {preview.name}")
+        text = window.preview_text
+        text.config(state=tk.NORMAL)
+        text.delete("1.0", tk.END)
+        text.insert("1.0", render_preview(preview))
+        text.config(state=tk.DISABLED)
+        window.lift()
+    
+    def show_search_window(self):
+        """Window for finding entries by content, decrypted in memory only"""
+        if not self.zip_file_path.get():
+            messagebox.showerror("Error", "Please select a ZIP file first.")
+            return
+        window = getattr(self, "search_window", None)
+        if window is not None and window.winfo_exists():
+            window.lift()
+            return
+        window = self.search_window = tk.Toplevel(self.root)
+        window.title("Search Contents")
+        window.geometry("700x420")
+        window.columnconfigure(1, weight=1)
+        window.rowconfigure(2, weight=1)
+        
+        self.search_pattern = tk.StringVar()
+        self.search_regex = tk.BooleanVar(value=False)
+        self.search_ignore_case = tk.BooleanVar(value=True)
+        self.search_status = tk.StringVar(value="Double-click a match to preview the entry")
+        
+        ttk.Label(window, text="Find:").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        pattern_entry = ttk.Entry(window, textvariable=self.search_pattern)
+        pattern_entry.grid(row=0, column=1, sticky=(tk.W, tk.E), pady=5)
+        pattern_entry.bind("<Return>", lambda event: self.run_search())
+        ttk.Button(window, text="Search", command=self.run_search).grid(row=0, column=2, padx=5, pady=5)
+        options = ttk.Frame(window)
+        options.grid(row=1, column=0, columnspan=3, sticky=tk.W, padx=5)
+        ttk.Checkbutton(options, text="Regular expression", variable=self.search_regex).pack(side=tk.LEFT)
+        ttk.Checkbutton(options, text="Ignore case", variable=self.search_ignore_case).pack(
+            side=tk.LEFT, padx=(20, 0))
+        
+        self.search_tree = ttk.Treeview(window, columns=("offset", "context"))
+        self.search_tree.heading("#0", text="Entry")
+        self.search_tree.heading("offset", text="Offset")
+        self.search_tree.heading("context", text="Context")
+        self.search_tree.column("#0", width=200)
+        self.search_tree.column("offset", width=80, anchor=tk.E)
+        self.search_tree.column("context", width=400)
+        scrollbar = ttk.Scrollbar(window, orient=tk.VERTICAL, command=self.search_tree.yview)
+        self.search_tree.configure(yscrollcommand=scrollbar.set)
+        self.search_tree.grid(row=2, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(5, 0))
+        scrollbar.grid(row=2, column=3, sticky=(tk.N, tk.S))
+        self.search_tree.bind("<Double-1>", self.preview_search_match)
+        
+        ttk.Label(window, textvariable=self.search_status, relief=tk.SUNKEN).grid(
+            row=3, column=0, columnspan=4, sticky=(tk.W, tk.E), padx=5, pady=5)
+        pattern_entry.focus_set()
+    
+    def run_search(self):
+        """Search the current archive in the background, showing matches as they come"""
+        pattern = self.search_pattern.get()
+        if not pattern:
+            return
+        archive = self.current_archive()
+        regex, ignore_case = self.search_regex.get(), self.search_ignore_case.get()
+        self.search_tree.delete(*self.search_tree.get_children())
+        found = [0]
+        
+        def work(job):
+            archive.token = job.token
+            archive.progress = lambda snapshot: job.report(("progress", snapshot))
+            return archive.search(pattern, regex, ignore_case,
+                                  on_results=lambda batch: job.report(("results", batch)))
+        
+        def on_progress(payload):
+            kind, data = payload
+            if kind == "progress":
+                self.search_status.set(f"Searching... {format_progress(data)}")
+                return
+            if not self.search_window.winfo_exists():
+                return
+            for result in data:
+                if result.error:
+                    self.search_tree.insert("", tk.END, text=result.name,
+                                            values=("", f"error: {result.error}"))
+                for match in result.matches:
+                    self.search_tree.insert("", tk.END, text=result.name,
+                                            values=(match.offset, match.context))
+                found[0] += bool(result.matches)
+        
+        def on_success(results):
+            self.search_status.set(f"{found[0]} matching entr{'y' if found[0] == 1 else 'ies'} "
+                                   f"for {pattern!r}")
+            self.status_var.set("Search finished")
+        
+        def on_error(error):
+            if isinstance(error, OperationCancelled):
+                self.status_var.set("Search cancelled")
+            elif isinstance(error, PasswordError):
+                messagebox.showerror("Error", "Incorrect password.")
+                self.status_var.set("Search failed")
+            else:
+                messagebox.showerror("Error", f"Error searching archive: {str(error)}")
+                self.status_var.set("Search failed")
+        
+        self.submit_job(f"Searching for {pattern!r}", work, on_success, on_error, on_progress)
+    
+    def preview_search_match(self, event):
+        item = self.search_tree.focus()
+        if item:
+            self.preview_entry(self.search_tree.item(item, "text"))
+    
+    # How often a watched drop folder is scanned for new archives
+    BATCH_SCAN_MS = 1000
+    
+    def show_batch_window(self):
+        """Window for extracting a folder of archives, optionally watching it for new ones"""
+        window = getattr(self, "batch_window", None)
+        if window is not None and window.winfo_exists():
+            window.lift()
+            return
+        window = self.batch_window = tk.Toplevel(self.root)
+        window.title("Batch Extract")
+        window.geometry("700x420")
+        window.columnconfigure(1, weight=1)
+        window.rowconfigure(4, weight=1)
+        
+        self.batch_source = tk.StringVar()
+        self.batch_output = tk.StringVar()
+        self.batch_jobs = tk.IntVar(value=DEFAULT_JOBS)
+        self.batch_io_limit = tk.DoubleVar(value=0)
+        self.batch_watch = tk.BooleanVar(value=False)
+        self.batch_status = tk.StringVar(value="Uses the password and method of the main window")
+        
+        ttk.Label(window, text="Archives folder:").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Entry(window, textvariable=self.batch_source).grid(row=0, column=1, sticky=(tk.W, tk.E), pady=5)
+        ttk.Button(window, text="Browse", command=lambda: self.browse_folder(self.batch_source)).grid(
+            row=0, column=2, padx=5, pady=5)
+        ttk.Label(window, text="Extract to:").grid(row=1, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Entry(window, textvariable=self.batch_output).grid(row=1, column=1, sticky=(tk.W, tk.E), pady=5)
+        ttk.Button(window, text="Browse", command=lambda: self.browse_folder(self.batch_output)).grid(
+            row=1, column=2, padx=5, pady=5)
+        
+        options = ttk.Frame(window)
+        options.grid(row=2, column=0, columnspan=3, sticky=tk.W, padx=5, pady=5)
+        ttk.Label(options, text="Parallel archives:").pack(side=tk.LEFT)
+        ttk.Spinbox(options, from_=1, to=16, width=4, textvariable=self.batch_jobs).pack(
+            side=tk.LEFT, padx=(5, 0))
+        ttk.Label(options, text="Read limit (MB/s, 0 = none):").pack(side=tk.LEFT, padx=(20, 0))
+        ttk.Entry(options, textvariable=self.batch_io_limit, width=6).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Checkbutton(options, text="Watch for new archives", variable=self.batch_watch).pack(
+            side=tk.LEFT, padx=(20, 0))
+        
+        controls = ttk.Frame(window)
+        controls.grid(row=3, column=0, columnspan=3, pady=5)
+        self.batch_start_button = ttk.Button(controls, text="Start", command=self.start_batch)
+        self.batch_start_button.pack(side=tk.LEFT, padx=5)
+        self.batch_stop_button = ttk.Button(controls, text="Stop", command=self.stop_batch,
+                                            state=tk.DISABLED)
+        self.batch_stop_button.pack(side=tk.LEFT, padx=5)
+        
+        columns = ("status", "method", "seconds")
+        self.batch_tree = ttk.Treeview(window, columns=columns)
+        self.batch_tree.heading("#0", text="Archive")
+        self.batch_tree.heading("status", text="Status")
+        self.batch_tree.heading("method", text="Method")
+        self.batch_tree.heading("seconds", text="Seconds")
+        self.batch_tree.column("#0", width=320)
+        for column in columns:
+            self.batch_tree.column(column, width=110)
+        scrollbar = ttk.Scrollbar(window, orient=tk.VERTICAL, command=self.batch_tree.yview)
+        self.batch_tree.configure(yscrollcommand=scrollbar.set)
+        self.batch_tree.grid(row=4, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(5, 0))
+        scrollbar.grid(row=4, column=3, sticky=(tk.N, tk.S))
+        
+        ttk.Label(window, textvariable=self.batch_status, relief=tk.SUNKEN).grid(
+            row=5, column=0, columnspan=4, sticky=(tk.W, tk.E), padx=5, pady=5)
+        window.protocol("WM_DELETE_WINDOW", self.close_batch_window)
+    
+    def browse_folder(self, variable):
+        folder = filedialog.askdirectory(title="Select Folder")
+        if folder:
+            variable.set(folder)
+    
+    def close_batch_window(self):
+        self.stop_batch()
+        self.batch_window.destroy()
+    
+    def start_batch(self):
+        """Queue every archive in the folder and, if asked, keep watching it"""
+        if self.batch_queue is not None:
+            messagebox.showinfo("Batch Extract", "The previous batch is still stopping.",
+                                parent=self.batch_window)
+            return
+        source, output = self.batch_source.get(), self.batch_output.get()
+        if not os.path.isdir(source) or not output:
+            messagebox.showerror("Error", "Please select an archives folder and an output folder.",
+                                 parent=self.batch_window)
+            return
         try:
-            self.progress.start()
-            self.status_var.set("Extracting selected files...")
-            self.root.update()
-            
-            selected_files = [self.file_tree.item(item, "text") for item in selected_items]
-            
-            if self.method_var.get() == "7zip" or (self.method_var.get() == "auto" and self.seven_zip_path):
-                try:
-                    self.extract_with_7zip(extract_dir, selected_files)
-                    method_used = "7-Zip"
-                except Exception as e:
-                    if self.method_var.get() == "7zip":
-                        raise e
-                    # Fall back to Python method
-                    self.extract_with_python(extract_dir, selected_files)
-                    method_used = "Python"
+            jobs = max(1, self.batch_jobs.get())
+            io_limit = self.batch_io_limit.get()
+            workers = max(1, self.workers_var.get())
+        except tk.TclError:
+            messagebox.showerror("Error", "Parallel archives and read limit must be numbers.",
+                                 parent=self.batch_window)
+            return
+        
+        budget = IOBudget(io_limit * 1024 * 1024) if io_limit > 0 else None
+        queue = ArchiveQueue(output, self.password.get(), self.method_var.get(), self.seven_zip_path,
+                             jobs, budget, workers, os.path.join(output, RESULTS_NAME),
+                             on_result=self.show_batch_result)
+        queue.index = self.index
+        queue.key_cache = self.key_cache
+        queue.history = self.history
+        queue.incremental = self.incremental_var.get()
+        self.batch_queue = queue
+        self.batch_watcher = FolderWatcher(source) if self.batch_watch.get() else None
+        self.batch_tree.delete(*self.batch_tree.get_children())
+        
+        if self.batch_watcher is None:
+            for path in iter_archives([source]):
+                self.add_batch_archive(path)
+        self.batch_start_button.config(state=tk.DISABLED)
+        self.batch_stop_button.config(state=tk.NORMAL)
+        self.root.after(self.POLL_INTERVAL_MS, self.poll_batch)
+        self.root.after(0, self.scan_batch_folder)
+    
+    def add_batch_archive(self, path):
+        # Archives the results log lists as extracted are shown but not queued again
+        status = "queued" if self.batch_queue.add(path) else "done earlier"
+        if self.batch_tree.exists(path):
+            self.batch_tree.item(path, values=(status, "", ""))
+        else:
+            self.batch_tree.insert("", tk.END, iid=path, text=os.path.basename(path),
+                                   values=(status, "", ""))
+    
+    def scan_batch_folder(self):
+        if self.batch_watcher is None or self.batch_queue is None:
+            return
+        for path in self.batch_watcher.scan():
+            self.add_batch_archive(path)
+        self.root.after(self.BATCH_SCAN_MS, self.scan_batch_folder)
+    
+    def poll_batch(self):
+        queue = self.batch_queue
+        if queue is None:
+            return
+        queue.poll()
+        done = len(queue.results)
+        pending = queue.pending()
+        watching = ", watching for new archives" if self.batch_watcher is not None else ""
+        self.batch_status.set(f"{done} finished, {pending} queued or running{watching}")
+        if pending or self.batch_watcher is not None:
+            self.root.after(self.POLL_INTERVAL_MS, self.poll_batch)
+        else:
+            self.finish_batch()
+    
+    def batch_window_open(self):
+        window = getattr(self, "batch_window", None)
+        return window is not None and window.winfo_exists()
+    
+    def show_batch_result(self, result):
+        if self.batch_window_open() and self.batch_tree.exists(result.archive):
+            self.batch_tree.item(result.archive, values=(result.status, result.method or "",
+                                                         result.seconds))
+    
+    def stop_batch(self):
+        """Stop watching and cancel what is queued or running
+
+        Returns at once; poll_batch finishes the batch once the running
+        extractions have wound down, so the window never blocks on them.
+        """
+        queue = self.batch_queue
+        if queue is None:
+            return
+        self.batch_watcher = None
+        queue.cancel()
+        if self.batch_window_open():
+            self.batch_status.set("Stopping...")
+            self.batch_stop_button.config(state=tk.DISABLED)
+    
+    def finish_batch(self):
+        queue, self.batch_queue = self.batch_queue, None
+        if queue is None:
+            return
+        queue.shutdown()
+        failed = sum(1 for result in queue.results if result.status != "ok")
+        if self.batch_window_open():
+            self.batch_status.set(f"{len(queue.results)} archive(s) processed, {failed} not extracted")
+            self.batch_start_button.config(state=tk.NORMAL)
+            self.batch_stop_button.config(state=tk.DISABLED)
+    
+    def convert_archive(self):
+        """Re-pack the archive as tar, tar.zst or ZIP without extracting it first"""
+        if not self.zip_file_path.get():
+            messagebox.showerror("Error", "Please select a ZIP file first.")
+            return
+        
+        output = filedialog.asksaveasfilename(
+            title="Convert Archive To",
+            filetypes=[("Tar archive", "*.tar"),
+                       ("Zstandard-compressed tar", "*.tar.zst"),
+                       ("ZIP archive", "*.zip")],
+            defaultextension=".tar")
+        if not output:
+            return
+        new_password = None
+        if output.lower().endswith(".zip"):
+            new_password = simpledialog.askstring(
+                "New Password", "Password for the new archive\n(leave empty for no encryption):",
+                show="*", parent=self.root)
+            if new_password is None:
+                return
+        fmt = format_for(output, new_password)
+        if fmt is None:
+            messagebox.showerror("Error", "Choose a .tar, .tar.zst or .zip file name.")
+            return
+        
+        archive = self.current_archive()
+        
+        def work(job):
+            archive.token = job.token
+            archive.progress = job.report
+            return archive.convert(output, fmt, new_password)
+        
+        def on_success(method_used):
+            encrypted = " (AES-256 encrypted)" if fmt == FORMAT_ZIP_AES else ""
+            messagebox.showinfo("Success", f"Archive converted to:\n{output}{encrypted}")
+            self.status_var.set(f"Converted to {os.path.basename(output)} using {method_used}")
+        
+        def on_error(error):
+            if isinstance(error, OperationCancelled):
+                self.status_var.set("Conversion cancelled")
+            elif isinstance(error, PasswordError):
+                messagebox.showerror("Error", "Incorrect password.")
+                self.status_var.set("Conversion failed")
             else:
-                self.extract_with_python(extract_dir, selected_files)
-                method_used = "Python"
-            
-            messagebox.showinfo("Success", 
-                              f"Extracted {len(selected_files)} file(s) to:\n{extract_dir}\n\nMethod used: {method_used}")
-            self.status_var.set(f"Extracted {len(selected_files)} files using {method_used}")
-            
-            if messagebox.askyesno("Open Folder", "Would you like to open the extraction folder?"):
-                os.startfile(extract_dir)
-                
-        except Exception as e:
-            messagebox.showerror("Error", f"Error extracting selected files: {str(e)}")
-            self.status_var.set("Extraction failed")
-        finally:
-            self.progress.stop()
+                messagebox.showerror("Error", f"Error converting archive: {str(error)}")
+                self.status_var.set("Conversion failed")
+        
+        name = f"Converting to {os.path.basename(output)}"
+        self.submit_job(name, work, on_success, on_error, self.progress_reporter(name))
+    
+    def create_archive(self):
+        """Pack a folder into a new AES-256 archive, encoding entries in parallel"""
+        source = filedialog.askdirectory(title="Select Folder to Archive")
+        if not source:
+            return
+        output = filedialog.asksaveasfilename(
+            title="Save New Archive As",
+            filetypes=[("ZIP files", "*.zip")],
+            defaultextension=".zip",
+            initialfile=os.path.basename(os.path.normpath(source)) + ".zip")
+        if not output:
+            return
+        password = self.password.get() or simpledialog.askstring(
+            "Password", "Password for the new archive:", show="*", parent=self.root)
+        if not password:
+            return
+        try:
+            workers = max(1, self.workers_var.get())
+        except tk.TclError:
+            workers = 1
+        archive = Archive(output, password, "python", workers=workers)
+        
+        def work(job):
+            archive.token = job.token
+            archive.progress = job.report
+            return archive.create([source])
+        
+        def on_success(count):
+            messagebox.showinfo("Success", f"Created {output}\nwith {count} entries "
+                                           f"(AES-256 encrypted).")
+            self.status_var.set(f"Created {os.path.basename(output)} "
+                                f"({self.format_size(os.path.getsize(output))})")
+            self.zip_file_path.set(output)
+        
+        def on_error(error):
+            if isinstance(error, OperationCancelled):
+                self.status_var.set("Archive creation cancelled")
+                return
+            messagebox.showerror("Error", f"Error creating archive: {str(error)}")
+            self.status_var.set("Archive creation failed")
+        
+        name = f"Creating {os.path.basename(output)}"
+        self.submit_job(name, work, on_success, on_error, self.progress_reporter(name))
     
     def test_archive(self):
         """Test archive integrity"""
@@ -483,47 +855,34 @@ The application will try Python's built-in ZIP support first, but may fail with
             messagebox.showerror("Error", "Please select a ZIP file first.")
             return
         
-        try:
-            self.progress.start()
-            self.status_var.set("Testing archive...")
-            self.root.update()
-            
-            if self.seven_zip_path:
-                cmd = [self.seven_zip_path, "t", self.zip_file_path.get()]
-                if self.password.get():
-                    cmd.extend([f"-p{self.password.get()}"])
-                
-                result = subprocess.run(cmd, capture_output=True, text=True,
-                                      encoding='utf-8', errors='replace')
-                
-                if result.returncode == 0:
-                    messagebox.showinfo("Test Result", "Archive test passed! All files are OK.")
-                    self.status_var.set("Archive test passed")
-                else:
-                    if "Wrong password" in result.stderr:
-                        messagebox.showerror("Test Result", "Incorrect password.")
-                    else:
-                        messagebox.showerror("Test Result", f"Archive test failed:\n{result.stderr}")
-                    self.status_var.set("Archive test failed")
+        archive = self.current_archive()
+        
+        def work(job):
+            archive.token = job.token
+            archive.progress = job.report
+            return archive.test()
+        
+        def on_success(result):
+            passed, details, method_used = result
+            if passed:
+                messagebox.showinfo("Test Result", f"Archive test passed! {details}\n\nMethod used: {method_used}")
+                self.status_var.set("Archive test passed")
             else:
-                # Basic test with Python
-                with zipfile.ZipFile(self.zip_file_path.get(), 'r') as zip_file:
-                    if self.password.get():
-                        zip_file.setpassword(self.password.get().encode('utf-8'))
-                    
-                    bad_files = zip_file.testzip()
-                    if bad_files:
-                        messagebox.showerror("Test Result", f"Archive test failed. Corrupt file: {bad_files}")
-                        self.status_var.set("Archive test failed")
-                    else:
-                        messagebox.showinfo("Test Result", "Archive test passed! (Basic Python test)")
-                        self.status_var.set("Archive test passed")
-                        
-        except Exception as e:
-            messagebox.showerror("Error", f"Error testing archive: {str(e)}")
-            self.status_var.set("Archive test error")
-        finally:
-            self.progress.stop()
+                messagebox.showerror("Test Result", f"Archive test failed:\n{details}")
+                self.status_var.set("Archive test failed")
+        
+        def on_error(error):
+            if isinstance(error, OperationCancelled):
+                self.status_var.set("Archive test cancelled")
+            elif isinstance(error, PasswordError):
+                messagebox.showerror("Test Result", "Incorrect password.")
+                self.status_var.set("Archive test failed")
+            else:
+                messagebox.showerror("Error", f"Error testing archive: {str(error)}")
+                self.status_var.set("Archive test error")
+        
+        self.submit_job("Testing archive", work, on_success, on_error,
+                        self.progress_reporter("Testing archive"))
 
 def main():
     # Set proper encoding for the console
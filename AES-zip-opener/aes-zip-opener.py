@@ -8,11 +8,9 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import zipfile
 import os
-import tempfile
-import subprocess
 import sys
-from pathlib import Path
-import locale
+
+from aeszip import open_zip
 
 class AESZipOpener:
     def __init__(self, root):
@@ -105,7 +103,9 @@ class AESZipOpener:
     def browse_file(self):
         filename = filedialog.askopenfilename(
             title="Select AES Encrypted ZIP File",
-            filetypes=[("ZIP files", "*.zip"), ("All files", "*.*")]
+            filetypes=[("ZIP files", "*.zip"),
+                       ("Split ZIP volumes", "*.z01 *.001"),
+                       ("All files", "*.*")]
         )
         if filename:
             self.zip_file_path.set(filename)
@@ -136,7 +136,7 @@ class AESZipOpener:
             for item in self.file_tree.get_children():
                 self.file_tree.delete(item)
             
-            with zipfile.ZipFile(self.zip_file_path.get(), 'r') as zip_file:
+            with open_zip(self.zip_file_path.get()) as zip_file:
                 # Set password
                 zip_file.setpassword(self.password.get().encode('utf-8'))
                 
@@ -183,7 +183,7 @@ class AESZipOpener:
             return
         
         try:
-            with zipfile.ZipFile(self.zip_file_path.get(), 'r') as zip_file:
+            with open_zip(self.zip_file_path.get()) as zip_file:
                 password_bytes = self.password.get().encode('utf-8')
                 zip_file.setpassword(password_bytes)
                 
@@ -236,7 +236,7 @@ class AESZipOpener:
             return
         
         try:
-            with zipfile.ZipFile(self.zip_file_path.get(), 'r') as zip_file:
+            with open_zip(self.zip_file_path.get()) as zip_file:
                 password_bytes = self.password.get().encode('utf-8')
                 zip_file.setpassword(password_bytes)
                 
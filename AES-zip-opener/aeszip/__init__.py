@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+"""
+Archive engine behind the AES ZIP opener scripts
+"""
+
+from .core import Archive, ArchiveError, PasswordError, find_7zip
+from .mapped import open_zip
+from .winzip import AESZipFile, WZ_AES, aes_info
+
+__all__ = [
+    "AESZipFile", "WZ_AES", "aes_info", "open_zip",
+    "Archive", "ArchiveError", "PasswordError", "find_7zip",
+]
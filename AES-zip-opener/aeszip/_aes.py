@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+AES in WinZip counter mode
+
+WinZip AES uses a 128-bit little-endian block counter starting at 1, which is
+not the big-endian CTR mode most libraries implement. The keystream is built
+from the fastest AES available: the ``cryptography`` package, ``pycryptodome``
+or, when neither is installed, a pure-Python table implementation.
+"""
+
+import sys
+from array import array
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    BACKEND = "cryptography"
+except ImportError:
+    try:
+        from Crypto.Cipher import AES as _CryptoAES
+        from Crypto.Util import Counter as _CryptoCounter
+        BACKEND = "pycryptodome"
+    except ImportError:
+        BACKEND = "python"
+
+BLOCK_SIZE = 16
+
+
+def _build_tables():
+    """Build the S-box and the four encryption T-tables"""
+    def rotl8(x, shift):
+        return ((x << shift) | (x >> (8 - shift))) & 0xFF
+
+    sbox = [0] * 256
+    p = q = 1
+    while True:
+        # p walks the multiplicative group by 3, q tracks its inverse
+        p = p ^ ((p << 1) & 0xFF) ^ (0x1B if p & 0x80 else 0)
+        q ^= q << 1
+        q ^= q << 2
+        q ^= q << 4
+        q &= 0xFF
+        if q & 0x80:
+            q ^= 0x09
+        sbox[p] = q ^ rotl8(q, 1) ^ rotl8(q, 2) ^ rotl8(q, 3) ^ rotl8(q, 4) ^ 0x63
+        if p == 1:
+            break
+    sbox[0] = 0x63
+
+    te0, te1, te2, te3 = [], [], [], []
+    for s in sbox:
+        s2 = ((s << 1) ^ 0x1B) & 0xFF if s & 0x80 else s << 1
+        s3 = s2 ^ s
+        word = (s2 << 24) | (s << 16) | (s << 8) | s3
+        te0.append(word)
+        te1.append(((word >> 8) | (word << 24)) & 0xFFFFFFFF)
+        te2.append(((word >> 16) | (word << 16)) & 0xFFFFFFFF)
+        te3.append(((word >> 24) | (word << 8)) & 0xFFFFFFFF)
+    return sbox, te0, te1, te2, te3
+
+
+_SBOX = _TE0 = _TE1 = _TE2 = _TE3 = None
+
+
+class PythonAES:
+    """Pure-Python AES block encryption (encrypt direction only)"""
+
+    def __init__(self, key):
+        global _SBOX, _TE0, _TE1, _TE2, _TE3
+        if _SBOX is None:
+            _SBOX, _TE0, _TE1, _TE2, _TE3 = _build_tables()
+        if len(key) not in (16, 24, 32):
+            raise ValueError("AES key must be 16, 24 or 32 bytes")
+        self.rounds = len(key) // 4 + 6
+        self.round_keys = self._expand_key(bytes(key))
+
+    @staticmethod
+    def _expand_key(key):
+        sbox = _SBOX
+        nk = len(key) // 4
+        total = 4 * (nk + 7)
+        words = [int.from_bytes(key[i:i + 4], "big") for i in range(0, len(key), 4)]
+        rcon = 1
+        for i in range(nk, total):
+            temp = words[i - 1]
+            if i % nk == 0:
+                temp = ((temp << 8) | (temp >> 24)) & 0xFFFFFFFF
+                temp = ((sbox[temp >> 24] << 24) | (sbox[(temp >> 16) & 0xFF] << 16) |
+                        (sbox[(temp >> 8) & 0xFF] << 8) | sbox[temp & 0xFF])
+                temp ^= rcon << 24
+                rcon = ((rcon << 1) ^ 0x1B) & 0xFF if rcon & 0x80 else rcon << 1
+            elif nk > 6 and i % nk == 4:
+                temp = ((sbox[temp >> 24] << 24) | (sbox[(temp >> 16) & 0xFF] << 16) |
+                        (sbox[(temp >> 8) & 0xFF] << 8) | sbox[temp & 0xFF])
+            words.append(words[i - nk] ^ temp)
+        return words
+
+    def encrypt_block(self, block):
+        """Encrypt a single 16-byte block"""
+        rk = self.round_keys
+        te0, te1, te2, te3, sbox = _TE0, _TE1, _TE2, _TE3, _SBOX
+        s0 = int.from_bytes(block[0:4], "big") ^ rk[0]
+        s1 = int.from_bytes(block[4:8], "big") ^ rk[1]
+        s2 = int.from_bytes(block[8:12], "big") ^ rk[2]
+        s3 = int.from_bytes(block[12:16], "big") ^ rk[3]
+        k = 4
+        for _ in range(self.rounds - 1):
+            t0 = te0[s0 >> 24] ^ te1[(s1 >> 16) & 0xFF] ^ te2[(s2 >> 8) & 0xFF] ^ te3[s3 & 0xFF] ^ rk[k]
+            t1 = te0[s1 >> 24] ^ te1[(s2 >> 16) & 0xFF] ^ te2[(s3 >> 8) & 0xFF] ^ te3[s0 & 0xFF] ^ rk[k + 1]
+            t2 = te0[s2 >> 24] ^ te1[(s3 >> 16) & 0xFF] ^ te2[(s0 >> 8) & 0xFF] ^ te3[s1 & 0xFF] ^ rk[k + 2]
+            t3 = te0[s3 >> 24] ^ te1[(s0 >> 16) & 0xFF] ^ te2[(s1 >> 8) & 0xFF] ^ te3[s2 & 0xFF] ^ rk[k + 3]
+            s0, s1, s2, s3 = t0, t1, t2, t3
+            k += 4
+        out0 = ((sbox[s0 >> 24] << 24) | (sbox[(s1 >> 16) & 0xFF] << 16) |
+                (sbox[(s2 >> 8) & 0xFF] << 8) | sbox[s3 & 0xFF]) ^ rk[k]
+        out1 = ((sbox[s1 >> 24] << 24) | (sbox[(s2 >> 16) & 0xFF] << 16) |
+                (sbox[(s3 >> 8) & 0xFF] << 8) | sbox[s0 & 0xFF]) ^ rk[k + 1]
+        out2 = ((sbox[s2 >> 24] << 24) | (sbox[(s3 >> 16) & 0xFF] << 16) |
+                (sbox[(s0 >> 8) & 0xFF] << 8) | sbox[s1 & 0xFF]) ^ rk[k + 2]
+        out3 = ((sbox[s3 >> 24] << 24) | (sbox[(s0 >> 16) & 0xFF] << 16) |
+                (sbox[(s1 >> 8) & 0xFF] << 8) | sbox[s2 & 0xFF]) ^ rk[k + 3]
+        return ((out0 << 96) | (out1 << 64) | (out2 << 32) | out3).to_bytes(16, "big")
+
+    def encrypt_blocks(self, data):
+        """Encrypt a whole number of blocks (ECB)"""
+        encrypt = self.encrypt_block
+        return b"".join(encrypt(data[i:i + 16]) for i in range(0, len(data), 16))
+
+
+def _counter_blocks(start, count):
+    """Return ``count`` little-endian 128-bit counter blocks starting at ``start``"""
+    if sys.byteorder == "little" and start + count < 1 << 64:
+        buf = bytearray(count * BLOCK_SIZE)
+        memoryview(buf).cast("Q")[0::2] = array("Q", range(start, start + count))
+        return buf
+    return b"".join(i.to_bytes(BLOCK_SIZE, "little") for i in range(start, start + count))
+
+
+def _xor(data, keystream):
+    n = len(data)
+    return (int.from_bytes(data, "little") ^
+            int.from_bytes(keystream[:n], "little")).to_bytes(n, "little")
+
+
+class WinZipCTR:
+    """AES-CTR stream with WinZip's little-endian counter
+
+    Encryption and decryption are the same operation. Data may be fed in
+    chunks of any size; the counter and any unused keystream carry over.
+    """
+
+    def __init__(self, key):
+        self.counter = 1
+        self.leftover = b""
+        self._stream = None
+        if BACKEND == "pycryptodome":
+            ctr = _CryptoCounter.new(128, initial_value=1, little_endian=True)
+            self._stream = _CryptoAES.new(bytes(key), _CryptoAES.MODE_CTR, counter=ctr)
+        elif BACKEND == "cryptography":
+            self._ecb = Cipher(algorithms.AES(bytes(key)), modes.ECB()).encryptor().update
+        else:
+            self._ecb = PythonAES(key).encrypt_blocks
+
+    def process(self, data):
+        """Encrypt or decrypt the next chunk of the stream"""
+        if not data:
+            return b""
+        if self._stream is not None:
+            return self._stream.encrypt(bytes(data))
+
+        keystream = self.leftover
+        needed = len(data) - len(keystream)
+        if needed > 0:
+            blocks = -(-needed // BLOCK_SIZE)
+            keystream += self._ecb(_counter_blocks(self.counter, blocks))
+            self.counter += blocks
+        self.leftover = keystream[len(data):]
+        return _xor(data, keystream)
@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+"""
+Pluggable backends and throughput-aware selection
+
+A Backend runs list/test/extract/preview for an Archive; 7-Zip and the
+in-process Python reader are registered by default, and register_backend()
+adds more. In auto mode every backend that can handle the operation is
+ranked by its predicted time, and the others remain as fallbacks.
+
+Predictions come from the central directory: entries are grouped by
+encryption and compression method ("aes:lzma", "none:stored", ...), and
+each group costs a fixed amount per entry (file creation, key derivation)
+plus its bytes over the backend's throughput for that method. The prior
+figures below are corrected by what was measured: after every run the
+ratio of actual to predicted time is folded into a per backend, operation
+and dominant group factor kept in the per-user cache, so a machine with
+slow disks or a fast 7-Zip build converges on its own numbers.
+
+Extraction can also be split per entry: when one group is much cheaper on
+the other backend (e.g. a few large LZMA entries among many tiny stored
+ones) each backend extracts the entries it is best at.
+"""
+
+import json
+import os
+import threading
+import time
+import zipfile
+from collections import OrderedDict, namedtuple
+
+from .discovery import cache_dir, save_json
+from .mapped import open_zip
+from .volumes import archive_key
+from .winzip import WZ_AES, aes_info
+
+SEVEN_ZIP = "7-Zip"
+PYTHON = "Python"
+
+OPERATIONS = ("list", "test", "extract", "preview")
+
+HISTORY_VERSION = 1
+# Weight of the newest measurement in a history factor
+HISTORY_ALPHA = 0.3
+# Runs shorter than this are mostly noise and are not learned from
+MIN_LEARN_SECONDS = 0.05
+FACTOR_LIMITS = (0.05, 20.0)
+
+# Cost of a size-unknown listing is judged at this many entries
+NOMINAL_ENTRIES = 1000
+
+_METHOD_KEYS = {
+    zipfile.ZIP_STORED: "stored",
+    zipfile.ZIP_DEFLATED: "deflate",
+    zipfile.ZIP_BZIP2: "bzip2",
+    zipfile.ZIP_LZMA: "lzma",
+}
+
+# Prior cost model. Seconds per process start, seconds per entry by
+# operation, and MB/s by compression method and by encryption.
+_MB = 1024 * 1024
+PRIORS = {
+    SEVEN_ZIP: {
+        "startup": 0.03,
+        "per_entry": {"list": 2e-5, "test": 5e-5, "extract": 2e-4, "preview": 0.0},
+        "kdf": 1e-3,
+        "methods": {"stored": 800, "deflate": 250, "bzip2": 30, "lzma": 60},
+        "other_methods": 100,
+        "crypto": {"none": None, "zipcrypto": 300, "aes": 600},
+    },
+    PYTHON: {
+        "startup": 0.0,
+        "per_entry": {"list": 3e-6, "test": 3e-5, "extract": 3e-4, "preview": 0.0},
+        "kdf": 2e-3,
+        "methods": {"stored": 600, "deflate": 150, "bzip2": 20, "lzma": 40},
+        # Deflate64, PPMd, ... cannot be read in-process at all
+        "other_methods": None,
+        # ZipCrypto is decrypted in pure Python by zipfile; AES speed depends on _aes.BACKEND
+        "crypto": {"none": None, "zipcrypto": 1, "aes": None},
+    },
+}
+_PYTHON_AES_MB_S = {"cryptography": 500, "pycryptodome": 300, "python": 0.5}
+
+# Per-entry groups: count, uncompressed bytes
+GroupCost = namedtuple("GroupCost", "entries bytes")
+
+
+def entry_group(zinfo):
+    """Group key of one ZipInfo, e.g. "aes:deflate" or "none:m9" """
+    info = aes_info(zinfo) if zinfo.compress_type == WZ_AES else None
+    if info is not None:
+        crypto, method = "aes", info.compress_type
+    else:
+        crypto = "zipcrypto" if zinfo.flag_bits & 0x1 else "none"
+        method = zinfo.compress_type
+    return f"{crypto}:{_METHOD_KEYS.get(method, f'm{method}')}"
+
+
+class ArchiveProfile:
+    """The (name, group, size) of every file entry in an archive"""
+
+    def __init__(self, entries):
+        self.entries = entries
+
+    def select(self, names=None):
+        if not names:
+            return self
+        wanted = set(names)
+        return ArchiveProfile([entry for entry in self.entries if entry[0] in wanted])
+
+    def groups(self):
+        groups = {}
+        for _, group, size in self.entries:
+            count, total = groups.get(group, (0, 0))
+            groups[group] = GroupCost(count + 1, total + size)
+        return groups
+
+    def names_by_group(self):
+        names = {}
+        for name, group, _ in self.entries:
+            names.setdefault(group, []).append(name)
+        return names
+
+
+def list_groups(count=NOMINAL_ENTRIES):
+    """Groups for costing a listing, which reads names only"""
+    return {"none:stored": GroupCost(count, 0)}
+
+
+def dominant_group(groups):
+    """The group most of the work is in, which history is learned against"""
+    if not groups:
+        return None
+    return max(groups, key=lambda group: (groups[group].bytes, groups[group].entries))
+
+
+_profiles = OrderedDict()
+_profiles_lock = threading.Lock()
+MAX_CACHED_PROFILES = 4
+
+
+def profile_archive(path):
+    """ArchiveProfile from the central directory, or None if Python cannot read it
+
+    The last few profiles are kept, keyed by the archive's size and mtime.
+    """
+    key = archive_key(path)
+    if key is None:
+        return None
+    with _profiles_lock:
+        profile = _profiles.get(key)
+        if profile is not None:
+            _profiles.move_to_end(key)
+            return profile
+    try:
+        with open_zip(path) as zip_file:
+            entries = [(info.filename, entry_group(info), info.file_size)
+                       for info in zip_file.infolist() if not info.is_dir()]
+    except (OSError, zipfile.BadZipFile, NotImplementedError):
+        return None
+    profile = ArchiveProfile(entries)
+    with _profiles_lock:
+        _profiles[key] = profile
+        while len(_profiles) > MAX_CACHED_PROFILES:
+            _profiles.popitem(last=False)
+    return profile
+
+
+class ThroughputHistory:
+    """Learned corrections to the prior cost model, persisted as JSON
+
+    Keys are "backend/operation/group"; each holds a factor (measured time
+    over predicted time, exponentially averaged), the number of runs and
+    the last measured MB/s for reference.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._records = {}
+        self._lock = threading.Lock()
+        if path is not None:
+            self._records = self._load(path)
+
+    @staticmethod
+    def _load(path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get("version") != HISTORY_VERSION:
+            return {}
+        records = data.get("records")
+        return records if isinstance(records, dict) else {}
+
+    def factor(self, backend, op, group):
+        record = self._records.get(f"{backend}/{op}/{group}")
+        return record["factor"] if record else 1.0
+
+    def record(self, backend, op, group, predicted, seconds, size):
+        """Fold one measured run into the history"""
+        if group is None or predicted <= 0 or seconds < MIN_LEARN_SECONDS:
+            return
+        key = f"{backend}/{op}/{group}"
+        with self._lock:
+            record = self._records.get(key)
+            # predicted already includes the old factor, so scale the ratio by it
+            old = record["factor"] if record else 1.0
+            measured = min(max(old * seconds / predicted, FACTOR_LIMITS[0]), FACTOR_LIMITS[1])
+            factor = measured if record is None else \
+                (1 - HISTORY_ALPHA) * old + HISTORY_ALPHA * measured
+            self._records[key] = {
+                "factor": round(factor, 4),
+                "runs": (record["runs"] if record else 0) + 1,
+                "mb_per_s": round(size / seconds / _MB, 2),
+                "updated": time.time(),
+            }
+        if self.path is not None:
+            self.save()
+
+    def records(self):
+        with self._lock:
+            return dict(self._records)
+
+    def save(self):
+        # Written under the lock, so a save never replaces a newer one
+        with self._lock:
+            save_json(self.path, {"version": HISTORY_VERSION, "records": dict(self._records)})
+
+
+def default_history_path():
+    return os.path.join(cache_dir(), "throughput.json")
+
+
+# Backends
+
+class Backend:
+    """Base class: one way of running archive operations
+
+    Subclasses set name and implement the operations in terms of an Archive.
+    prior is the cost model used before anything has been measured.
+    """
+
+    name = None
+    prior = None
+    # True if the backend only reads archives the Python ZIP reader can parse
+    zip_only = False
+
+    def available(self, archive):
+        return True
+
+    def group_seconds(self, op, group, cost, workers=1):
+        """Predicted seconds for one group of entries, or None if unsupported"""
+        prior = self.prior
+        crypto, method = group.split(":", 1)
+        mb_s = prior["methods"].get(method, prior["other_methods"])
+        if mb_s is None:
+            return None
+        seconds = cost.entries * prior["per_entry"][op] + cost.bytes / (mb_s * _MB)
+        crypto_mb_s = self.crypto_throughput(crypto)
+        if crypto_mb_s is not None:
+            seconds += cost.bytes / (crypto_mb_s * _MB)
+        if crypto == "aes" and op != "list":
+            # One PBKDF2 run per entry, salts are per entry
+            seconds += cost.entries * prior["kdf"]
+        return seconds
+
+    def crypto_throughput(self, crypto):
+        return self.prior["crypto"][crypto]
+
+    def predict(self, archive, op, groups, history=None):
+        """Predicted seconds for op over {group: GroupCost}, or None if unsupported"""
+        seconds = self.prior["startup"]
+        for group, cost in groups.items():
+            group_seconds = self.group_seconds(op, group, cost, archive.workers)
+            if group_seconds is None:
+                return None
+            seconds += group_seconds
+        if history is not None:
+            seconds *= history.factor(self.name, op, dominant_group(groups))
+        return seconds
+
+    def iter_list(self, archive):
+        raise NotImplementedError
+
+    def test(self, archive):
+        raise NotImplementedError
+
+    def extract(self, archive, extract_dir, selected_files=None):
+        raise NotImplementedError
+
+    def preview(self, archive, name, limit):
+        raise NotImplementedError
+
+
+class SevenZipBackend(Backend):
+    name = SEVEN_ZIP
+    prior = PRIORS[SEVEN_ZIP]
+
+    def available(self, archive):
+        return bool(archive.seven_zip_path)
+
+    def iter_list(self, archive):
+        return archive.iter_list_with_7zip()
+
+    def test(self, archive):
+        return archive.test_with_7zip()
+
+    def extract(self, archive, extract_dir, selected_files=None):
+        return archive.extract_with_7zip(extract_dir, selected_files)
+
+    def preview(self, archive, name, limit):
+        return archive.preview_with_7zip(name, limit)
+
+
+class PythonBackend(Backend):
+    name = PYTHON
+    prior = PRIORS[PYTHON]
+    zip_only = True
+
+    def crypto_throughput(self, crypto):
+        if crypto == "aes":
+            from ._aes import BACKEND
+            return _PYTHON_AES_MB_S.get(BACKEND, 1)
+        return super().crypto_throughput(crypto)
+
+    def group_seconds(self, op, group, cost, workers=1):
+        seconds = super().group_seconds(op, group, cost, workers)
+        if seconds is None or op in ("list", "preview"):
+            return seconds
+        # The worker pool spreads entries over processes (roughly; batches are coarse)
+        workers = workers or os.cpu_count() or 1
+        return seconds / max(1, min(workers, os.cpu_count() or 1, cost.entries))
+
+    def iter_list(self, archive):
+        return archive.iter_list_with_python()
+
+    def test(self, archive):
+        return archive.test_with_python()
+
+    def extract(self, archive, extract_dir, selected_files=None):
+        return archive.extract_with_python(extract_dir, selected_files)
+
+    def preview(self, archive, name, limit):
+        return archive.preview_with_python(name, limit)
+
+
+_BACKENDS = OrderedDict()
+
+
+def register_backend(backend, method=None):
+    """Make a Backend available; method is the Archive.method value selecting only it"""
+    _BACKENDS[method or backend.name.lower().replace("-", "")] = backend
+
+
+def get_backend(method):
+    return _BACKENDS[method]
+
+
+def registered_backends():
+    return list(_BACKENDS.values())
+
+
+register_backend(SevenZipBackend(), "7zip")
+register_backend(PythonBackend(), "python")
+
+
+def rank_backends(archive, op, groups, history=None, readable=True):
+    """Available backends ordered by predicted time for op, with their predictions
+
+    groups is {group: GroupCost} for the entries involved; readable is
+    False when the Python reader cannot parse the archive. Returns
+    [(backend, seconds or None)]; backends that cannot handle the archive
+    come last with None, as fallbacks.
+    """
+    ranked = []
+    for order, backend in enumerate(registered_backends()):
+        if not backend.available(archive):
+            continue
+        seconds = None if backend.zip_only and not readable else \
+            backend.predict(archive, op, groups, history)
+        ranked.append((backend, seconds, order))
+    ranked.sort(key=lambda item: (item[1] is None, item[1] or 0, item[2]))
+    return [(backend, seconds) for backend, seconds, _ in ranked]
+
+
+def plan_split(archive, profile, history=None):
+    """Assign each group of entries to its cheapest backend for extraction
+
+    Returns [(backend, names)] with more than one backend only when the
+    saving pays for the extra process start; otherwise None.
+    """
+    if profile is None:
+        return None
+    backends = [backend for backend, _ in rank_backends(archive, "extract", profile.groups(),
+                                                        history)]
+    if len(backends) < 2:
+        return None
+    assignment = {}
+    saving = 0.0
+    for group, cost in profile.groups().items():
+        options = []
+        for backend in backends:
+            seconds = backend.group_seconds("extract", group, cost, archive.workers)
+            if seconds is not None:
+                if history is not None:
+                    seconds *= history.factor(backend.name, "extract", group)
+                options.append((seconds, backend))
+        if not options:
+            return None
+        options.sort(key=lambda option: option[0])
+        assignment[group] = options[0][1]
+        if len(options) > 1:
+            saving += options[1][0] - options[0][0]
+    used = {backend.name for backend in assignment.values()}
+    if len(used) < 2:
+        return None
+    if saving <= max(backend.prior["startup"] for backend in backends if backend.prior):
+        return None
+    names_by_group = profile.names_by_group()
+    plan = []
+    for backend in backends:
+        names = [name for group, chosen in assignment.items() if chosen is backend
+                 for name in names_by_group[group]]
+        if names:
+            plan.append((backend, names))
+    return plan
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+Extracting many archives: a bounded queue and a drop-folder watcher
+
+ArchiveQueue extracts every archive it is given into its own sub-folder of
+the output directory, several at a time on a JobScheduler with a fixed
+number of jobs. An optional IOBudget caps the combined rate of all jobs:
+in-process extraction pays for every chunk it decompresses, while 7-Zip
+and worker-pool runs pay for the compressed size of the entries they read
+before they start. Each
+finished archive produces an ArchiveResult, appended as a JSON line to the
+results log; a queue started on an existing log skips archives it already
+extracted successfully, unless they have changed since.
+
+FolderWatcher polls a drop folder and reports archives once their size and
+modification time have stopped changing, so files that are still being
+copied in are left alone.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+from .core import Archive, OperationCancelled, PasswordError
+from .jobs import Job, JobScheduler
+from .volumes import archive_key, archive_stem
+
+# A split archive is found through its name.zip (after name.z01, ...) or name.zip.001
+ARCHIVE_EXTENSIONS = (".zip", ".zip.001")
+
+DEFAULT_JOBS = 2
+# Seconds an archive's size and mtime must stay put before it is picked up
+DEFAULT_SETTLE_SECONDS = 2.0
+RESULTS_NAME = "aeszip-batch.jsonl"
+
+# status is "ok", "bad-password", "error" or "cancelled"
+ArchiveResult = namedtuple("ArchiveResult",
+                           "archive status method output seconds size error finished")
+
+
+def iter_archives(paths, recursive=False):
+    """Expand files and directories into a sorted stream of archive paths"""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        found = []
+        if recursive:
+            for dirpath, _, filenames in os.walk(path):
+                found.extend(os.path.join(dirpath, name) for name in filenames)
+        else:
+            found = [os.path.join(path, name) for name in os.listdir(path)]
+        for name in sorted(found):
+            if name.lower().endswith(ARCHIVE_EXTENSIONS) and os.path.isfile(name):
+                yield name
+
+
+class IOBudget:
+    """Token bucket shared by every job: rate bytes per second on average
+
+    A caller may overdraw the bucket; it then sleeps until the debt is
+    repaid, checking its CancelToken so a cancelled job stops waiting.
+    """
+
+    # Longest single sleep, so cancellation is noticed promptly
+    MAX_SLEEP = 0.1
+
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst or rate
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.burst
+        self._stamp = clock()
+        self._lock = threading.Lock()
+
+    def consume(self, count, token=None):
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= count
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        while wait > 0:
+            if token is not None:
+                token.check()
+            step = min(wait, self.MAX_SLEEP)
+            self._sleep(step)
+            wait -= step
+
+
+class ArchiveQueue:
+    """Extracts archives concurrently, at most `jobs` at a time
+
+    Results are delivered by poll(), on the calling thread, to on_result
+    and self.results. index, history, key_cache and tracer are handed to
+    every Archive, as the single-archive commands do.
+    """
+
+    def __init__(self, output_dir, password="", method="auto", seven_zip_path=None,
+                 jobs=DEFAULT_JOBS, io_budget=None, workers=1, results_path=None,
+                 on_result=None):
+        self.output_dir = output_dir
+        self.password = password
+        self.method = method
+        self.seven_zip_path = seven_zip_path
+        self.workers = workers
+        self.io_budget = io_budget
+        self.results_path = results_path
+        self.on_result = on_result
+        self.index = None
+        self.history = None
+        self.key_cache = None
+        self.tracer = None
+        self.incremental = False
+        self.results = []
+        self._scheduler = JobScheduler(max_workers=jobs)
+        self._queued = set()
+        self._outputs = {}
+        self._done = self._load_done(results_path)
+
+    @staticmethod
+    def _load_done(results_path):
+        """Keys of archives the results log says were extracted successfully"""
+        done = set()
+        if not results_path:
+            return done
+        try:
+            with open(results_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get("status") == "ok":
+                        done.add((os.path.normcase(os.path.abspath(record["archive"])),
+                                  record.get("size"), record.get("mtime_ns")))
+        except OSError:
+            pass
+        return done
+
+    def output_for(self, path):
+        """Sub-folder an archive is extracted into, unique within this queue"""
+        key = os.path.normcase(os.path.abspath(path))
+        output = self._outputs.get(key)
+        if output is None:
+            stem = archive_stem(path)
+            taken = set(self._outputs.values())
+            output = os.path.join(self.output_dir, stem)
+            number = 2
+            while output in taken:
+                output = os.path.join(self.output_dir, f"{stem}-{number}")
+                number += 1
+            self._outputs[key] = output
+        return output
+
+    def add(self, path):
+        """Queue one archive; returns False if it is already queued or done"""
+        key = archive_key(path)
+        if key is None or key in self._done or key in self._queued:
+            return False
+        self._queued.add(key)
+
+        archive = Archive(path, self.password, self.method, self.seven_zip_path, self.workers,
+                          self.index)
+        archive.key_cache = self.key_cache
+        archive.history = self.history
+        archive.tracer = self.tracer
+        archive.io_budget = self.io_budget
+        output = self.output_for(path)
+        timing = {}
+
+        def work(job):
+            archive.token = job.token
+            timing["start"] = time.perf_counter()
+            return archive.extract(output, None, self.incremental)
+
+        def finish(status, method=None, error=None):
+            seconds = time.perf_counter() - timing["start"] if "start" in timing else 0.0
+            self._queued.discard(key)
+            if status == "ok":
+                self._done.add(key)
+            result = ArchiveResult(path, status, method, output, round(seconds, 3), key[1],
+                                   error, time.strftime("%Y-%m-%dT%H:%M:%S"))
+            self._record(result, key)
+
+        def on_error(error):
+            if isinstance(error, OperationCancelled):
+                finish("cancelled", error=str(error))
+            elif isinstance(error, PasswordError):
+                finish("bad-password", error=str(error))
+            else:
+                finish("error", error=f"{type(error).__name__}: {error}")
+
+        self._scheduler.submit(Job(f"Extracting {os.path.basename(path)}", work,
+                                   lambda method: finish("ok", method), on_error))
+        return True
+
+    def _record(self, result, key):
+        self.results.append(result)
+        if self.results_path:
+            record = dict(result._asdict(), mtime_ns=key[2])
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.results_path)), exist_ok=True)
+                with open(self.results_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            except OSError:
+                pass
+        if self.on_result is not None:
+            self.on_result(result)
+
+    def poll(self):
+        """Deliver finished archives to on_result; returns how many finished"""
+        before = len(self.results)
+        self._scheduler.poll()
+        return len(self.results) - before
+
+    def pending(self):
+        """Archives queued or being extracted"""
+        return len(self._scheduler.active())
+
+    def wait(self, interval=0.1):
+        """Poll until everything queued has finished"""
+        while self.pending():
+            self.poll()
+            time.sleep(interval)
+        self.poll()
+
+    def cancel(self):
+        """Cancel running and queued extractions"""
+        self._scheduler.cancel_all()
+
+    def shutdown(self):
+        self._scheduler.shutdown()
+
+
+class FolderWatcher:
+    """Reports archives dropped into a folder once they have finished arriving"""
+
+    def __init__(self, directory, recursive=False, settle_seconds=DEFAULT_SETTLE_SECONDS,
+                 clock=time.monotonic):
+        self.directory = directory
+        self.recursive = recursive
+        self.settle_seconds = settle_seconds
+        self._clock = clock
+        # path -> ((size, mtime), when that signature was first seen)
+        self._candidates = {}
+        self._reported = set()
+
+    def scan(self):
+        """Archives that have appeared or changed and are now stable"""
+        now = self._clock()
+        ready = []
+        present = set()
+        try:
+            paths = list(iter_archives([self.directory], self.recursive))
+        except OSError:
+            return ready
+        for path in paths:
+            key = archive_key(path)
+            if key is None or key in self._reported:
+                continue
+            present.add(path)
+            signature = key[1:]
+            seen = self._candidates.get(path)
+            if seen is None or seen[0] != signature:
+                self._candidates[path] = (signature, now)
+                if self.settle_seconds > 0:
+                    continue
+            elif now - seen[1] < self.settle_seconds:
+                continue
+            if not _readable(path):
+                # Still locked by whoever is writing it (Windows)
+                continue
+            self._reported.add(key)
+            del self._candidates[path]
+            ready.append(path)
+        for path in list(self._candidates):
+            if path not in present:
+                del self._candidates[path]
+        return ready
+
+
+def _readable(path):
+    try:
+        with open(path, "rb"):
+            return True
+    except OSError:
+        return False
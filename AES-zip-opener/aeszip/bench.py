@@ -0,0 +1,433 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the 7-Zip and Python backends
+
+Synthetic archives are generated from a fixed seed, so every machine and
+every run benchmarks the same contents: many tiny files or a few large
+ones, Stored, Deflate, BZIP2 or LZMA, ZipCrypto or AES-256. Archives are
+cached in the work directory; only the encryption salts differ between
+generations.
+
+Each case (archive x list/test/extract x backend) runs in a fresh child
+process so that imports, caches and memory from one case cannot flatter
+the next. The child times the operation itself and reports its peak RSS;
+with psutil installed the parent also samples the whole process tree for
+the summed peak RSS and the number of processes (7-Zip, pool workers).
+
+Results are JSON lines, one per case, and can be compared against a
+previous run to flag cases that became slower or bigger.
+"""
+
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from collections import namedtuple
+
+from .writer import AESZipWriter, ENCRYPTION_AES256, ENCRYPTION_ZIPCRYPTO, encode_entry
+
+# Bump when the generated contents change so cached archives are rebuilt
+GENERATOR_VERSION = 1
+
+SEED = 20240601
+PASSWORD = "benchmark"
+DATE_TIME = (2024, 1, 1, 12, 0, 0)
+
+# files, smallest file, largest file
+Shape = namedtuple("Shape", "files min_size max_size")
+
+PROFILES = {
+    "quick": {
+        "tiny": Shape(1000, 64, 4096),
+        "huge": Shape(2, 2 * 1024 * 1024, 2 * 1024 * 1024),
+    },
+    "full": {
+        "tiny": Shape(20000, 64, 4096),
+        "huge": Shape(4, 32 * 1024 * 1024, 32 * 1024 * 1024),
+    },
+}
+
+COMPRESSIONS = {
+    "stored": zipfile.ZIP_STORED,
+    "deflate": zipfile.ZIP_DEFLATED,
+    "bzip2": zipfile.ZIP_BZIP2,
+    "lzma": zipfile.ZIP_LZMA,
+}
+
+ENCRYPTIONS = (ENCRYPTION_ZIPCRYPTO, ENCRYPTION_AES256)
+
+OPERATIONS = ("list", "test", "extract")
+
+# Share of each file that is compressible text rather than random bytes
+TEXT_RATIO = 0.7
+_BLOCK = 64 * 1024
+_WORDS = ("archive", "password", "cipher", "block", "stream", "entry", "header",
+          "central", "directory", "deflate", "window", "counter", "salt", "verify",
+          "extract", "volume", "offset", "record", "the", "of", "and", "to", "a")
+
+# A case is slower than its baseline when both limits are exceeded
+DEFAULT_THRESHOLD = 0.15
+MIN_REGRESSION_SECONDS = 0.05
+MIN_REGRESSION_MB = 5
+
+# psutil sampling interval for peak RSS and process count
+SAMPLE_INTERVAL = 0.02
+
+Case = namedtuple("Case", "shape compression encryption op method workers")
+
+
+def case_id(case):
+    backend = "7zip" if case.method == "7zip" else f"python-j{case.workers}"
+    return f"{case.shape}/{case.compression}/{case.encryption}/{case.op}/{backend}"
+
+
+def default_work_dir():
+    from .discovery import cache_dir
+
+    return os.path.join(cache_dir(), "bench")
+
+
+# Archive generation
+
+class _Contents:
+    """Deterministic file contents: slices of a text pool mixed with noise"""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        words = self.rng.choices(_WORDS, k=256 * 1024)
+        self.pool = " ".join(words).encode("ascii")
+
+    def data(self, size):
+        rng = self.rng
+        parts = []
+        remaining = size
+        while remaining > 0:
+            n = min(_BLOCK, remaining)
+            if rng.random() < TEXT_RATIO:
+                start = rng.randrange(len(self.pool) - n)
+                parts.append(self.pool[start:start + n])
+            else:
+                parts.append(rng.randbytes(n))
+            remaining -= n
+        return b"".join(parts)
+
+
+def archive_name(profile, shape, compression, encryption):
+    return f"{shape}-{compression}-{encryption}-{profile}-v{GENERATOR_VERSION}.zip"
+
+
+def generate_archive(path, shape, compression, encryption, seed=SEED):
+    """Write one synthetic archive; the same arguments give the same contents"""
+    contents = _Contents(f"{seed}-{shape.files}-{shape.min_size}-{shape.max_size}")
+    pwd = PASSWORD.encode("utf-8")
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with AESZipWriter(temp_path, "w") as zip_file:
+        for number in range(shape.files):
+            size = contents.rng.randint(shape.min_size, shape.max_size)
+            name = f"dir{number % 16:02d}/file{number:06d}.bin"
+            zinfo = zipfile.ZipInfo(name, DATE_TIME)
+            zinfo.external_attr = 0o644 << 16
+            encoded = encode_entry(contents.data(size), pwd, COMPRESSIONS[compression], encryption)
+            zip_file.write_encoded(zinfo, encoded)
+    os.replace(temp_path, path)
+    return path
+
+
+def ensure_archive(work_dir, profile, shape, compression, encryption):
+    """Path of a cached synthetic archive, generating it first if needed"""
+    path = os.path.join(work_dir, archive_name(profile, shape, compression, encryption))
+    if not os.path.exists(path):
+        os.makedirs(work_dir, exist_ok=True)
+        generate_archive(path, PROFILES[profile][shape], compression, encryption)
+    return path
+
+
+# Running one case (in the child process)
+
+def _self_peak_kb():
+    """This process's peak RSS in kilobytes
+
+    On Linux ru_maxrss survives fork() and exec(), so a child would report
+    the parent's peak; VmHWM belongs to the current process image only.
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _peak_rss_mb():
+    """Peak RSS of this process or its largest child, or None where unknown"""
+    try:
+        import resource
+    except ImportError:  # Windows; psutil sampling covers it
+        return None
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if sys.platform == "darwin":
+        children //= 1024
+    return round(max(_self_peak_kb(), children) / 1024, 1)
+
+
+def run_case(path, case, seven_zip_path=None):
+    """Run one operation in this process and return its measurements as a dict"""
+    import shutil
+
+    from .core import Archive
+
+    archive = Archive(path, PASSWORD, case.method, seven_zip_path, case.workers)
+    result = {"status": "ok", "method_used": None}
+    extract_dir = None
+    start = time.perf_counter()
+    try:
+        if case.op == "list":
+            _, result["method_used"] = archive.list()
+        elif case.op == "test":
+            passed, details, result["method_used"] = archive.test()
+            if not passed:
+                result.update(status="failed", error=details)
+        else:
+            extract_dir = tempfile.mkdtemp(prefix="extract-", dir=os.path.dirname(path))
+            result["method_used"] = archive.extract(extract_dir)
+    except Exception as e:
+        result.update(status="error", error=f"{type(e).__name__}: {e}")
+    result["seconds"] = time.perf_counter() - start
+    if extract_dir is not None:
+        shutil.rmtree(extract_dir, ignore_errors=True)
+    result["peak_rss_mb"] = _peak_rss_mb()
+    result["pool_workers"] = archive.pool_workers
+    return result
+
+
+def _child_main():
+    """Entry point of the per-case child: a JSON request on stdin, a JSON result on stdout"""
+    request = json.load(sys.stdin)
+    case = Case(**request["case"])
+    result = run_case(request["path"], case, request.get("seven_zip_path"))
+    json.dump(result, sys.stdout)
+    return 0
+
+
+# Running the suite (in the parent process)
+
+def _sample_tree(pid, stop, peak):
+    """Track the summed RSS and process count of pid and its descendants"""
+    import psutil
+
+    try:
+        root = psutil.Process(pid)
+    except psutil.Error:
+        return
+    while not stop.is_set():
+        try:
+            processes = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return
+        rss = 0
+        for process in processes:
+            try:
+                rss += process.memory_info().rss
+            except psutil.Error:
+                pass
+        peak["rss"] = max(peak["rss"], rss)
+        peak["processes"] = max(peak["processes"], len(processes))
+        stop.wait(SAMPLE_INTERVAL)
+
+
+def _psutil_available():
+    try:
+        import psutil  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _started_processes(result):
+    """Process count when it cannot be sampled: the child plus what it started"""
+    if result.get("method_used") == "7-Zip":
+        return 2
+    return 1 + result.get("pool_workers", 0)
+
+
+def measure_case(path, case, seven_zip_path=None, timeout=None):
+    """Run one case in a fresh interpreter and return its raw measurements"""
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, (package_parent, env.get("PYTHONPATH"))))
+    request = json.dumps({"path": path, "case": case._asdict(), "seven_zip_path": seven_zip_path})
+    process = subprocess.Popen([sys.executable, "-m", "aeszip.bench"], stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env,
+                               text=True, encoding="utf-8")
+    sampled = _psutil_available()
+    peak = {"rss": 0, "processes": 0}
+    stop = threading.Event()
+    sampler = None
+    if sampled:
+        sampler = threading.Thread(target=_sample_tree, args=(process.pid, stop, peak), daemon=True)
+        sampler.start()
+    try:
+        stdout, stderr = process.communicate(request, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        return {"status": "error", "error": f"timed out after {timeout} s", "seconds": None}
+    finally:
+        stop.set()
+        if sampler is not None:
+            sampler.join()
+    try:
+        result = json.loads(stdout)
+    except ValueError:
+        lines = stderr.strip().splitlines()
+        return {"status": "error", "seconds": None,
+                "error": lines[-1] if lines else f"exit code {process.returncode}"}
+    result["sampled"] = sampled
+    if sampled:
+        result["peak_rss_mb"] = round(peak["rss"] / (1024 * 1024), 1)
+        result["processes"] = peak["processes"]
+    else:
+        result["processes"] = _started_processes(result)
+    return result
+
+
+def environment():
+    """What a result depends on besides the code: machine, Python, backends"""
+    from ._aes import BACKEND
+    from .discovery import discover_7zip
+
+    seven_zip = discover_7zip()
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "aes_backend": BACKEND,
+        "seven_zip_version": seven_zip.version if seven_zip is not None else None,
+    }
+
+
+def archive_stats(path):
+    with zipfile.ZipFile(path) as zip_file:
+        infos = zip_file.infolist()
+    return len(infos), sum(info.file_size for info in infos), os.path.getsize(path)
+
+
+def iter_cases(shapes, compressions, encryptions, operations, backends):
+    """Every combination, with backends given as (method, workers) pairs"""
+    for shape in shapes:
+        for compression in compressions:
+            for encryption in encryptions:
+                for op in operations:
+                    for method, workers in backends:
+                        if op == "list" and workers != 1:
+                            # Listing never uses the worker pool
+                            continue
+                        yield Case(shape, compression, encryption, op, method, workers)
+
+
+def run_suite(cases, profile="quick", work_dir=None, repeat=1, seven_zip_path=None,
+              timeout=None, on_result=None):
+    """Run cases and return one result record per case
+
+    Each case runs `repeat` times and keeps the fastest run. on_result, if
+    given, is called with every record as soon as it is ready.
+    """
+    work_dir = work_dir or default_work_dir()
+    env = environment()
+    stats = {}
+    records = []
+    for case in cases:
+        path = ensure_archive(work_dir, profile, case.shape, case.compression, case.encryption)
+        if path not in stats:
+            stats[path] = archive_stats(path)
+        files, size, archive_bytes = stats[path]
+        runs = [measure_case(path, case, seven_zip_path if case.method == "7zip" else None,
+                             timeout)
+                for _ in range(max(1, repeat))]
+        ok_runs = [run for run in runs if run["status"] == "ok"]
+        best = min(ok_runs, key=lambda run: run["seconds"]) if ok_runs else runs[-1]
+        seconds = best.get("seconds")
+        record = dict(env, case=case_id(case), profile=profile, **case._asdict(),
+                      files=files, bytes=size, archive_bytes=archive_bytes,
+                      status=best["status"], method_used=best.get("method_used"),
+                      seconds=round(seconds, 4) if seconds is not None else None,
+                      repeats=len(runs))
+        if best.get("error"):
+            record["error"] = best["error"]
+        if seconds:
+            record["mb_per_s"] = round(size / seconds / (1024 * 1024), 2)
+            record["files_per_s"] = round(files / seconds, 1)
+        record["peak_rss_mb"] = max((run["peak_rss_mb"] for run in runs
+                                     if run.get("peak_rss_mb") is not None), default=None)
+        record["processes"] = max((run["processes"] for run in runs if "processes" in run),
+                                  default=None)
+        record["sampled"] = best.get("sampled", False)
+        records.append(record)
+        if on_result is not None:
+            on_result(record)
+    return records
+
+
+# Comparing runs
+
+def load_results(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Return human-readable regressions of results against a baseline run
+
+    A case regresses when it stops succeeding, or when its time or peak RSS
+    grows by more than threshold (and by more than a small absolute amount,
+    so that noise on millisecond cases is not reported).
+    """
+    previous = {(record["profile"], record["case"]): record for record in baseline}
+    regressions = []
+    for record in results:
+        old = previous.get((record["profile"], record["case"]))
+        if old is None:
+            continue
+        name = record["case"]
+        if old["status"] == "ok" and record["status"] != "ok":
+            regressions.append(f"{name}: now {record['status']} ({record.get('error', '')})")
+            continue
+        if old.get("seconds") and record.get("seconds"):
+            slower = record["seconds"] - old["seconds"]
+            if slower > old["seconds"] * threshold and slower > MIN_REGRESSION_SECONDS:
+                regressions.append(f"{name}: {old['seconds']:.3f} s -> {record['seconds']:.3f} s "
+                                   f"(+{slower / old['seconds']:.0%})")
+        if old.get("peak_rss_mb") and record.get("peak_rss_mb"):
+            bigger = record["peak_rss_mb"] - old["peak_rss_mb"]
+            if bigger > old["peak_rss_mb"] * threshold and bigger > MIN_REGRESSION_MB:
+                regressions.append(f"{name}: peak RSS {old['peak_rss_mb']} MB -> "
+                                   f"{record['peak_rss_mb']} MB")
+    return regressions
+
+
+def format_result(record):
+    """One table row for a result record"""
+    if record["status"] != "ok":
+        return f"{record['case']:<44} {record['status']}: {record.get('error', '')}"
+    rss = record["peak_rss_mb"]
+    return (f"{record['case']:<44} {record['seconds']:>8.3f} s "
+            f"{record.get('mb_per_s', 0):>8.1f} MB/s {record.get('files_per_s', 0):>9.0f} files/s "
+            f"{rss if rss is not None else '-':>7} MB {record['processes']:>3} proc")
+
+
+if __name__ == "__main__":
+    sys.exit(_child_main())
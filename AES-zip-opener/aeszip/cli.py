@@ -0,0 +1,603 @@
+# -*- coding: utf-8 -*-
+"""
+Headless command line for listing, testing and extracting archives
+
+    python -m aeszip list  ARCHIVE_OR_DIR...           [--json]
+    python -m aeszip test  ARCHIVE_OR_DIR...           [--json]
+    python -m aeszip extract ARCHIVE_OR_DIR... -o DIR  [--json] [--nested]
+    python -m aeszip search -e TEXT ARCHIVE_OR_DIR...  [-E] [-i] [-j N]
+    python -m aeszip convert ARCHIVE_OR_DIR... -o OUT  [--format tar|tar.zst|zip|zip-aes]
+    python -m aeszip create NEW.zip FILE_OR_DIR...     [-c deflate|...] [-j N]
+    python -m aeszip batch ARCHIVE_OR_DIR... -o DIR    [--watch] [--jobs N] [--io-limit MB]
+    python -m aeszip bench [--profile full] [-o results.jsonl] [--baseline old.jsonl]
+
+Directories are expanded to the archives they contain, so a whole drop
+folder is processed in one process. The password comes from --password,
+the AESZIP_PASSWORD environment variable or --password-file.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from .backends import ThroughputHistory, default_history_path
+from .batch import DEFAULT_JOBS, DEFAULT_SETTLE_SECONDS, RESULTS_NAME, iter_archives
+from .create import COMPRESSIONS
+from .core import METHODS, Archive, ArchiveError, PasswordError, find_7zip, format_size
+from .index import ArchiveIndex
+from .keycache import DerivedKeyCache
+from .nested import NestedLimits
+from .progress import format_progress
+from .repack import EXTENSIONS, FORMAT_ZIP_AES, FORMATS, format_for
+from .search import DEFAULT_MAX_MATCHES, DEFAULT_WINDOW
+from .volumes import archive_stem
+
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2
+EXIT_BAD_PASSWORD = 3
+EXIT_TEST_FAILED = 4
+
+
+def read_password(args):
+    """Resolve the password from the command line, a file or the environment"""
+    if args.password is not None:
+        return args.password
+    if args.password_file:
+        with open(args.password_file, encoding="utf-8") as f:
+            return f.readline().rstrip("\r\n")
+    return os.environ.get("AESZIP_PASSWORD", "")
+
+
+def read_new_password(args):
+    """Resolve the password for re-encrypted output, like read_password()"""
+    if args.new_password is not None:
+        return args.new_password
+    if args.new_password_file:
+        with open(args.new_password_file, encoding="utf-8") as f:
+            return f.readline().rstrip("\r\n")
+    return os.environ.get("AESZIP_NEW_PASSWORD", "")
+
+
+def convert_output_for(archive_path, args, many):
+    """Output file: -o itself for one archive, else one file per archive inside -o"""
+    if not many and not os.path.isdir(args.output):
+        return args.output
+    return os.path.join(args.output, archive_stem(archive_path) + EXTENSIONS[args.format])
+
+
+def output_dir_for(archive_path, args, many):
+    """Extract each archive into its own sub-directory when processing several"""
+    if not many:
+        return args.output
+    return os.path.join(args.output, archive_stem(archive_path))
+
+
+def run_one(command, archive, args, many):
+    """Run one command on one archive and return its result record"""
+    record = {"archive": archive.path, "command": command}
+    start = time.perf_counter()
+    try:
+        if command == "list":
+            files, method_used = archive.list()
+            record.update(status="ok", method=method_used, count=len(files),
+                          files=[entry._asdict() for entry in files])
+        elif command == "test":
+            passed, details, method_used = archive.test()
+            record.update(status="ok" if passed else "failed", method=method_used, details=details)
+            if archive.test_report is not None:
+                record["entries"] = [result._asdict() for result in archive.test_report]
+        elif command == "search":
+            results = archive.search(args.pattern, args.regex, args.ignore_case,
+                                     args.files or None, window=args.window,
+                                     max_matches=args.max_matches)
+            record.update(status="ok", method="Python",
+                          matched=sum(1 for result in results if result.matches),
+                          results=[dict(result._asdict(),
+                                        matches=[match._asdict() for match in result.matches])
+                                   for result in results])
+        elif command == "convert":
+            output = convert_output_for(archive.path, args, many)
+            if os.path.abspath(output) == os.path.abspath(archive.path):
+                raise ValueError("The output would overwrite the archive")
+            method_used = archive.convert(output, args.format, args.new_password_value,
+                                          args.files or None, args.level)
+            record.update(status="ok", method=method_used, output=output, format=args.format)
+        else:
+            extract_dir = output_dir_for(archive.path, args, many)
+            method_used = archive.extract(extract_dir, args.files or None, args.incremental,
+                                          args.nested)
+            record.update(status="ok", method=method_used, output=extract_dir)
+            if args.incremental:
+                record.update(skipped=archive.skipped_files, skipped_bytes=archive.skipped_bytes)
+            if args.nested:
+                record["nested_archives"] = archive.nested_archives
+    except PasswordError as e:
+        record.update(status="bad-password", error=str(e))
+    except (ArchiveError, OSError, RuntimeError, ValueError, NotImplementedError) as e:
+        record.update(status="error", error=str(e))
+    except Exception as e:  # zipfile.BadZipFile and friends
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def exit_code_for(record):
+    return {
+        "ok": EXIT_OK,
+        "failed": EXIT_TEST_FAILED,
+        "bad-password": EXIT_BAD_PASSWORD,
+    }.get(record["status"], EXIT_FAILURE)
+
+
+def print_record(record, args, out):
+    """Write one result either as a JSON line or as readable text"""
+    if args.json:
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        return
+
+    status = record["status"]
+    if status not in ("ok", "failed"):
+        out.write(f"{record['archive']}: {status}: {record.get('error', '')}\n")
+    elif record["command"] == "list":
+        out.write(f"{record['archive']} ({record['count']} files, {record['method']})\n")
+        for file_data in record["files"]:
+            out.write(f"  {format_size(file_data['size']):>10}  "
+                      f"{file_data['modified']:16}  {file_data['path']}\n")
+    elif record["command"] == "search":
+        for result in record["results"]:
+            prefix = f"{record['archive']}:{result['name']}"
+            if result["error"]:
+                out.write(f"{prefix}: error: {result['error']}\n")
+            for match in result["matches"]:
+                out.write(f"{prefix}:{match['offset']}: {match['context']}\n")
+            if result["truncated"]:
+                out.write(f"{prefix}: ... more matches not shown (--max-matches)\n")
+    elif record["command"] == "convert":
+        out.write(f"{record['archive']}: converted to {record['output']} "
+                  f"({record['format']}, {record['method']})\n")
+    elif record["command"] == "test":
+        out.write(f"{record['archive']}: {'passed' if status == 'ok' else 'FAILED'} "
+                  f"({record['method']}) {record['details']}\n")
+    else:
+        skipped = ""
+        if "skipped" in record:
+            skipped = f", skipped {record['skipped']} unchanged ({format_size(record['skipped_bytes'])})"
+        nested = ""
+        if "nested_archives" in record:
+            nested = f", {record['nested_archives']} nested archive(s) opened"
+        out.write(f"{record['archive']}: extracted to {record['output']} "
+                  f"({record['method']}{skipped}{nested})\n")
+
+
+def stderr_progress(name):
+    """Progress callback redrawing one status line on stderr"""
+    def report(snapshot):
+        sys.stderr.write(f"\r{name}: {format_progress(snapshot)}\033[K")
+        sys.stderr.flush()
+    return report
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="aeszip", description="List, test and extract (AES encrypted) ZIP archives")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("archives", nargs="+", metavar="ARCHIVE",
+                        help="archive files or directories of archives")
+    common.add_argument("-p", "--password", help="archive password (visible to other processes; "
+                                                 "prefer AESZIP_PASSWORD or --password-file)")
+    common.add_argument("--password-file", help="read the password from the first line of a file")
+    common.add_argument("-m", "--method", choices=METHODS, default="auto",
+                        help="backend to use (default: auto)")
+    common.add_argument("--7zip", dest="seven_zip", metavar="PATH",
+                        help="path to the 7-Zip executable")
+    common.add_argument("-r", "--recursive", action="store_true",
+                        help="descend into sub-directories when given a directory")
+    common.add_argument("--json", action="store_true",
+                        help="print one JSON object per archive")
+    common.add_argument("--index", metavar="PATH",
+                        help="listing index database (default: per-user cache)")
+    common.add_argument("--no-index", action="store_true",
+                        help="do not read or update the listing index")
+    common.add_argument("--progress", action="store_true",
+                        help="show percent, throughput and ETA on stderr while testing or extracting")
+    common.add_argument("--trace", metavar="FILE",
+                        help="time every phase and write a Chrome trace (JSON) timeline to FILE")
+
+    commands = parser.add_subparsers(dest="command", required=True)
+    info = commands.add_parser("info", help="show the backends in use and startup time")
+    info.add_argument("--json", action="store_true", help="print a JSON object")
+    info.add_argument("--rescan", action="store_true",
+                      help="search for 7-Zip again instead of using the cached result")
+    bench = commands.add_parser("bench", help="benchmark the backends on synthetic archives")
+    bench.add_argument("--profile", choices=("quick", "full"), default="quick",
+                       help="archive sizes (default: quick)")
+    bench.add_argument("--shape", nargs="+", choices=("tiny", "huge"), default=["tiny", "huge"],
+                       help="many tiny files and/or a few large ones")
+    bench.add_argument("--compression", nargs="+", choices=("stored", "deflate", "bzip2", "lzma"),
+                       default=["stored", "deflate", "bzip2", "lzma"])
+    bench.add_argument("--encryption", nargs="+", choices=("zipcrypto", "aes256"),
+                       default=["zipcrypto", "aes256"])
+    bench.add_argument("--op", nargs="+", choices=("list", "test", "extract"),
+                       default=["list", "test", "extract"])
+    bench.add_argument("-j", "--workers", nargs="+", type=int, metavar="N",
+                       help="Python backend worker counts to compare (default: 1 and one per CPU)")
+    bench.add_argument("--no-7zip", action="store_true", help="benchmark the Python backend only")
+    bench.add_argument("--7zip", dest="seven_zip", metavar="PATH",
+                       help="path to the 7-Zip executable")
+    bench.add_argument("--repeat", type=int, default=1, metavar="N",
+                       help="runs per case; the fastest is kept (default 1)")
+    bench.add_argument("--work-dir", metavar="DIR",
+                       help="where synthetic archives are generated and cached")
+    bench.add_argument("-o", "--output", metavar="FILE", help="write the results as JSON lines")
+    bench.add_argument("--baseline", metavar="FILE",
+                       help="compare against earlier results; regressions make the exit code 1")
+    bench.add_argument("--threshold", type=float, default=0.15, metavar="RATIO",
+                       help="slowdown or memory growth counted as a regression (default 0.15)")
+    bench.add_argument("--json", action="store_true", help="print one JSON object per case")
+    create = commands.add_parser("create", help="create an AES-256 encrypted archive from "
+                                                "files and folders")
+    create.add_argument("output", metavar="ARCHIVE", help="archive to create (replaced if it exists)")
+    create.add_argument("sources", nargs="+", metavar="PATH", help="files and folders to add")
+    create.add_argument("-p", "--password", help="archive password (visible to other processes; "
+                                                 "prefer AESZIP_PASSWORD or --password-file)")
+    create.add_argument("--password-file", help="read the password from the first line of a file")
+    create.add_argument("-c", "--compression", choices=COMPRESSIONS, default="deflate",
+                        help="compression method (default: deflate)")
+    create.add_argument("--level", type=int, metavar="N", help="compression level")
+    create.add_argument("-j", "--workers", type=int, default=0, metavar="N",
+                        help="processes compressing and encrypting entries "
+                             "(default 0 = one per CPU)")
+    create.add_argument("--json", action="store_true", help="print a JSON object")
+    create.add_argument("--progress", action="store_true",
+                        help="show percent, throughput and ETA on stderr")
+    commands.add_parser("list", parents=[common], help="list archive contents")
+    workers = argparse.ArgumentParser(add_help=False)
+    workers.add_argument("-j", "--workers", type=int, default=1, metavar="N",
+                         help="Python backend worker processes (0 = one per CPU, default 1)")
+    commands.add_parser("test", parents=[common, workers],
+                        help="test archive integrity (every entry, with --json a per-entry report)")
+    search = commands.add_parser("search", parents=[common, workers],
+                                 help="find entries containing a string or regular expression, "
+                                      "without extracting them")
+    search.add_argument("-e", "--pattern", required=True, help="text (or regex with -E) to find")
+    search.add_argument("-E", "--regex", action="store_true",
+                        help="treat the pattern as a Python regular expression")
+    search.add_argument("-i", "--ignore-case", action="store_true", help="ignore case")
+    search.add_argument("-f", "--files", nargs="+", metavar="NAME",
+                        help="search only these entries")
+    search.add_argument("--window", type=int, default=DEFAULT_WINDOW, metavar="BYTES",
+                        help="longest regex match (default %(default)s)")
+    search.add_argument("--max-matches", type=int, default=DEFAULT_MAX_MATCHES, metavar="N",
+                        help="matches reported per entry (default %(default)s)")
+    convert = commands.add_parser("convert", parents=[common],
+                                  help="re-pack archives as tar, tar.zst or ZIP (optionally "
+                                       "re-encrypted) in one streaming pass")
+    convert.add_argument("-o", "--output", required=True,
+                         help="output file, or directory for one file per archive")
+    convert.add_argument("--format", choices=FORMATS,
+                         help="output format (default: from the output file's extension)")
+    convert.add_argument("--new-password",
+                         help="password for zip-aes output (prefer AESZIP_NEW_PASSWORD or "
+                              "--new-password-file)")
+    convert.add_argument("--new-password-file",
+                         help="read the new password from the first line of a file")
+    convert.add_argument("--level", type=int, metavar="N",
+                         help="zstd or deflate compression level")
+    convert.add_argument("-f", "--files", nargs="+", metavar="NAME",
+                         help="convert only these entries")
+    extract = commands.add_parser("extract", parents=[common, workers], help="extract archives")
+    extract.add_argument("-o", "--output", required=True, help="extraction directory")
+    extract.add_argument("-f", "--files", nargs="+", metavar="NAME",
+                         help="extract only these entries")
+    extract.add_argument("-i", "--incremental", action="store_true",
+                         help="skip files already extracted with the same size, time and CRC")
+    extract.add_argument("--nested", action="store_true",
+                         help="extract ZIP archives found inside into folders of their own, "
+                              "in memory (Python backend)")
+    extract.add_argument("--max-depth", type=int, default=NestedLimits().max_depth, metavar="N",
+                         help="levels of nested archives opened (default %(default)s)")
+    extract.add_argument("--max-ratio", type=float, default=NestedLimits().max_ratio,
+                         metavar="RATIO", help="refuse nested extraction when data expands more "
+                                               "than this many times (default %(default)s)")
+    batch = commands.add_parser("batch", parents=[common, workers],
+                                help="extract many archives concurrently, optionally watching "
+                                     "folders for new ones")
+    batch.add_argument("-o", "--output", required=True,
+                       help="extraction directory (one sub-folder per archive)")
+    batch.add_argument("-J", "--jobs", type=int, default=DEFAULT_JOBS, metavar="N",
+                       help=f"archives extracted at the same time (default {DEFAULT_JOBS})")
+    batch.add_argument("--io-limit", type=float, metavar="MB",
+                       help="overall read budget in MB per second, shared by all jobs")
+    batch.add_argument("--watch", action="store_true",
+                       help="keep watching the given directories for new archives until Ctrl+C")
+    batch.add_argument("--interval", type=float, default=1.0, metavar="SECONDS",
+                       help="how often watched directories are scanned (default 1)")
+    batch.add_argument("--settle", type=float, default=DEFAULT_SETTLE_SECONDS, metavar="SECONDS",
+                       help="how long a new archive must stay unchanged before it is extracted "
+                            f"(default {DEFAULT_SETTLE_SECONDS:g})")
+    batch.add_argument("--results", metavar="FILE",
+                       help=f"per-archive results log (default: {RESULTS_NAME} in the output "
+                            "directory); archives it lists as extracted are skipped")
+    batch.add_argument("-i", "--incremental", action="store_true",
+                       help="skip files already extracted with the same size, time and CRC")
+    return parser
+
+
+def show_info(args, startup, out):
+    """Print what `info` reports: backends, caches and startup cost"""
+    from ._aes import BACKEND
+    from .discovery import default_cache_path, discover_7zip
+    from .index import default_index_path
+
+    seven_zip = discover_7zip(refresh=args.rescan)
+    record = {
+        "aes_backend": BACKEND,
+        "seven_zip": seven_zip._asdict() if seven_zip is not None else None,
+        "discovery_cache": default_cache_path(),
+        "index": default_index_path(),
+        "throughput_history": default_history_path(),
+        "learned": ThroughputHistory(default_history_path()).records(),
+        # CPU time from interpreter start to main(), i.e. startup and imports
+        "startup_cpu_ms": round(startup * 1000, 1),
+    }
+    if args.json:
+        out.write(json.dumps(record) + "\n")
+        return EXIT_OK
+    out.write(f"AES backend:     {BACKEND}\n")
+    if seven_zip is None:
+        out.write("7-Zip:           not found\n")
+    else:
+        out.write(f"7-Zip:           {seven_zip.path} ({seven_zip.version or 'unknown version'})\n")
+        out.write(f"7-Zip methods:   {', '.join(seven_zip.methods) or 'unknown'}\n")
+    out.write(f"Discovery cache: {record['discovery_cache']}\n")
+    out.write(f"Listing index:   {record['index']}\n")
+    out.write(f"Throughput:      {record['throughput_history']} "
+              f"({len(record['learned'])} learned)\n")
+    for key, learned in sorted(record["learned"].items()):
+        out.write(f"  {key:<32} x{learned['factor']:<6} {learned['mb_per_s']} MB/s, "
+                  f"{learned['runs']} runs\n")
+    out.write(f"Startup CPU:     {record['startup_cpu_ms']} ms\n")
+    return EXIT_OK
+
+
+def run_create(args, out):
+    """Create one archive and report it like run_one() reports the others"""
+    record = {"archive": args.output, "command": "create"}
+    archive = Archive(args.output, read_password(args), "python", workers=args.workers)
+    if args.progress:
+        archive.progress = stderr_progress(os.path.basename(args.output))
+    start = time.perf_counter()
+    try:
+        count = archive.create(args.sources, args.compression, args.level)
+        record.update(status="ok", method="Python", count=count,
+                      size=os.path.getsize(args.output))
+    except (ArchiveError, OSError, ValueError, RuntimeError) as e:
+        record.update(status="error", error=str(e))
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    if args.progress:
+        sys.stderr.write("\n")
+    if args.json:
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    elif record["status"] == "ok":
+        out.write(f"{record['archive']}: {record['count']} entries, "
+                  f"{format_size(record['size'])} in {record['seconds']} s\n")
+    else:
+        out.write(f"{record['archive']}: error: {record['error']}\n")
+    return exit_code_for(record)
+
+
+def run_bench(args, out):
+    """Run the `bench` command: generate, measure, report and compare"""
+    from . import bench
+
+    workers = args.workers or sorted({1, os.cpu_count() or 1})
+    backends = [("python", count) for count in workers]
+    seven_zip_path = None
+    if not args.no_7zip:
+        seven_zip_path = args.seven_zip or find_7zip()
+        if seven_zip_path:
+            backends.insert(0, ("7zip", 1))
+        else:
+            print("warning: 7-Zip not found; benchmarking the Python backend only",
+                  file=sys.stderr)
+    cases = bench.iter_cases(args.shape, args.compression, args.encryption, args.op, backends)
+
+    def report(record):
+        out.write((json.dumps(record) if args.json else bench.format_result(record)) + "\n")
+        out.flush()
+
+    results = bench.run_suite(cases, args.profile, args.work_dir, args.repeat, seven_zip_path,
+                              on_result=report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for record in results:
+                f.write(json.dumps(record) + "\n")
+
+    code = EXIT_OK if all(record["status"] == "ok" for record in results) else EXIT_FAILURE
+    if args.baseline:
+        regressions = bench.compare(results, bench.load_results(args.baseline), args.threshold)
+        for line in regressions:
+            print(f"regression: {line}", file=sys.stderr)
+        if regressions:
+            code = EXIT_FAILURE
+    return code
+
+
+def run_batch(args, queue, out):
+    """Run the `batch` command: feed the queue until it drains (or Ctrl+C when watching)"""
+    from .batch import FolderWatcher
+
+    codes = set()
+
+    def report(result):
+        record = {"archive": result.archive, "command": "extract", "status": result.status,
+                  "method": result.method, "output": result.output, "seconds": result.seconds}
+        if result.error:
+            record["error"] = result.error
+        print_record(record, args, out)
+        codes.add(exit_code_for(record))
+
+    queue.on_result = report
+    watchers = []
+    skipped = 0
+    for path in args.archives:
+        if args.watch and os.path.isdir(path):
+            watchers.append(FolderWatcher(path, args.recursive, args.settle))
+            continue
+        for archive_path in iter_archives([path], args.recursive):
+            if not os.path.isfile(archive_path):
+                print_record({"archive": archive_path, "command": "extract", "status": "error",
+                              "error": "not found"}, args, out)
+                codes.add(EXIT_FAILURE)
+            elif not queue.add(archive_path):
+                skipped += 1
+    if skipped:
+        print(f"{skipped} archive(s) already extracted according to {queue.results_path}",
+              file=sys.stderr)
+
+    next_scan = 0
+    try:
+        while watchers or queue.pending():
+            if watchers and time.monotonic() >= next_scan:
+                for watcher in watchers:
+                    for path in watcher.scan():
+                        queue.add(path)
+                next_scan = time.monotonic() + args.interval
+            queue.poll()
+            time.sleep(0.1)
+        queue.poll()
+    except KeyboardInterrupt:
+        queue.cancel()
+        queue.wait()
+        if not watchers:
+            codes.add(EXIT_FAILURE)
+    finally:
+        queue.shutdown()
+    return codes
+
+
+def main(argv=None):
+    startup = time.process_time()
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "info":
+        return show_info(args, startup, sys.stdout)
+    if args.command == "bench":
+        if args.repeat < 1 or (args.workers and min(args.workers) < 0):
+            parser.error("--repeat must be 1 or more and --workers 0 or more")
+        return run_bench(args, sys.stdout)
+    if args.command == "create":
+        if args.workers < 0:
+            parser.error("--workers must be 0 or more")
+        if not read_password(args):
+            parser.error("a password is required: --password, --password-file or "
+                         "AESZIP_PASSWORD")
+        return run_create(args, sys.stdout)
+
+    seven_zip_path = args.seven_zip or (find_7zip() if args.method != "python" else None)
+    if args.method == "7zip" and not seven_zip_path:
+        parser.error("7-Zip not found; use --7zip PATH or --method python")
+    if not hasattr(args, "files"):
+        args.files = None
+    if args.command == "search" and (args.window < 1 or args.max_matches < 1):
+        parser.error("--window and --max-matches must be 1 or more")
+    nested_limits = None
+    if getattr(args, "nested", False):
+        if args.incremental:
+            parser.error("--nested and --incremental cannot be combined")
+        if args.max_depth < 0 or args.max_ratio <= 1:
+            parser.error("--max-depth must be 0 or more and --max-ratio above 1")
+        nested_limits = NestedLimits(max_depth=args.max_depth, max_ratio=args.max_ratio)
+    workers = getattr(args, "workers", 1)
+    if workers < 0:
+        parser.error("--workers must be 0 or more")
+
+    password = read_password(args)
+    if args.command == "convert":
+        args.new_password_value = read_new_password(args)
+        if args.format is None:
+            args.format = format_for(args.output, args.new_password_value)
+            if args.format is None:
+                parser.error("cannot tell the format from the output name; use --format")
+        if args.format == FORMAT_ZIP_AES and not args.new_password_value:
+            parser.error("zip-aes output needs --new-password, --new-password-file "
+                         "or AESZIP_NEW_PASSWORD")
+    if args.command == "batch":
+        if args.jobs < 1 or args.interval <= 0 or args.settle < 0 or \
+                (args.io_limit is not None and args.io_limit <= 0):
+            parser.error("--jobs must be 1 or more and --interval and --io-limit positive")
+    else:
+        archives = list(iter_archives(args.archives, args.recursive))
+        if not archives:
+            parser.error("no archives found")
+        many = len(archives) > 1
+
+    index = None
+    if not args.no_index:
+        try:
+            index = ArchiveIndex(args.index)
+        except (OSError, sqlite3.Error) as e:
+            print(f"warning: listing index disabled: {e}", file=sys.stderr)
+
+    tracer = None
+    if args.trace:
+        from .trace import Tracer
+        tracer = Tracer()
+
+    key_cache = DerivedKeyCache()
+    history = ThroughputHistory(default_history_path())
+    codes = set()
+    if args.command == "batch":
+        from .batch import ArchiveQueue, IOBudget
+
+        budget = IOBudget(args.io_limit * 1024 * 1024) if args.io_limit else None
+        queue = ArchiveQueue(args.output, password, args.method, seven_zip_path, args.jobs,
+                             budget, workers,
+                             args.results or os.path.join(args.output, RESULTS_NAME))
+        queue.index = index
+        queue.key_cache = key_cache
+        queue.history = history
+        queue.tracer = tracer
+        queue.incremental = args.incremental
+        archives = []
+        codes = run_batch(args, queue, sys.stdout)
+    for path in archives:
+        archive = Archive(path, password, args.method, seven_zip_path, workers, index)
+        archive.key_cache = key_cache
+        archive.history = history
+        archive.tracer = tracer
+        archive.nested_limits = nested_limits
+        if args.progress:
+            archive.progress = stderr_progress(os.path.basename(path))
+        if tracer is not None:
+            with tracer.span("archive", "archive", command=args.command, path=path):
+                record = run_one(args.command, archive, args, many)
+        else:
+            record = run_one(args.command, archive, args, many)
+        if args.progress and archive.progress is not None:
+            sys.stderr.write("\n")
+        print_record(record, args, sys.stdout)
+        codes.add(exit_code_for(record))
+
+    if tracer is not None:
+        from .trace import format_summary
+        try:
+            tracer.save(args.trace)
+        except OSError as e:
+            print(f"warning: could not write trace: {e}", file=sys.stderr)
+            codes.add(EXIT_FAILURE)
+        print(format_summary(tracer), file=sys.stderr)
+
+    codes.discard(EXIT_OK)
+    if not codes:
+        return EXIT_OK
+    return codes.pop() if len(codes) == 1 else EXIT_FAILURE
+
+
+if __name__ == "__main__":
+    sys.exit(main())
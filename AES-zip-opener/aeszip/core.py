@@ -0,0 +1,880 @@
+# -*- coding: utf-8 -*-
+"""
+Archive operations shared by the GUI and the command line
+
+Nothing in here touches tkinter: every operation takes plain arguments,
+returns plain data and reports failures as ArchiveError.
+"""
+
+import os
+import time
+import zipfile
+from collections import namedtuple
+
+# subprocess and tempfile are imported by the 7-Zip methods that need them,
+# so runs served from the index or the Python reader start faster
+from .backends import (dominant_group, get_backend, list_groups, plan_split, profile_archive,
+                       rank_backends)
+from .create import COMPRESSIONS, collect_files, create_archive
+from .discovery import discover_7zip
+from .incremental import plan_incremental, restore_mtime
+from .mapped import open_zip
+from .parallel import extract_parallel, test_parallel
+from .preview import PREVIEW_LIMIT, Preview
+from .progress import ProgressTracker, iter_7zip_progress
+from .repack import repack
+from .search import DEFAULT_MAX_MATCHES, DEFAULT_WINDOW, compile_pattern, iter_search
+from .trace import null_span
+from .volumes import archive_size, is_zip_archive
+from .winzip import aes_info
+
+METHODS = ("auto", "7zip", "python")
+
+# Failed entries listed in a test summary; the full list is in Archive.test_report
+MAX_REPORTED_FAILURES = 20
+
+# One listed file. Kept as a tuple so million-entry listings stay small.
+# crc is None when the archive does not record one (e.g. WinZip AE-2).
+ArchiveEntry = namedtuple("ArchiveEntry", "path size packed method modified crc",
+                          defaults=(None,))
+
+
+class ArchiveError(Exception):
+    """An archive operation failed"""
+
+
+class PasswordError(ArchiveError):
+    """The archive password is missing or wrong"""
+
+
+class OperationCancelled(ArchiveError):
+    """The operation was cancelled before it finished"""
+
+
+class ZipBombError(ArchiveError):
+    """A nested extraction was stopped because an entry expands implausibly far"""
+
+
+def find_7zip():
+    """Find 7-Zip installation on the system (cached, see discovery.py)"""
+    info = discover_7zip()
+    return info.path if info is not None else None
+
+
+def format_size(size_bytes):
+    """Convert bytes to human readable format"""
+    if size_bytes == 0:
+        return "0 B"
+    size_names = ["B", "KB", "MB", "GB"]
+    i = 0
+    while size_bytes >= 1024 and i < len(size_names) - 1:
+        size_bytes /= 1024.0
+        i += 1
+    return f"{size_bytes:.1f} {size_names[i]}"
+
+
+def get_compression_method_name(method_id):
+    """Get human-readable compression method name"""
+    methods = {
+        0: "Stored",
+        8: "Deflate",
+        9: "Deflate64",
+        12: "BZIP2",
+        14: "LZMA",
+        95: "XZ",
+        99: "AES"
+    }
+    return methods.get(method_id, f"Method {method_id}")
+
+
+def describe_method(file_info):
+    """Describe an entry's method the way 7-Zip does, e.g. AES-256 Deflate"""
+    info = aes_info(file_info)
+    if info is None:
+        return get_compression_method_name(file_info.compress_type)
+    return f"AES-{info.bits} {get_compression_method_name(info.compress_type)}"
+
+
+def iter_7zip_listing(lines):
+    """Parse `7z l -slt` output line by line, yielding an ArchiveEntry per file
+
+    The archive's own properties block (before the "----------" separator) and
+    folder entries are skipped.
+    """
+    in_entries = False
+    current = None
+
+    for line in lines:
+        line = line.strip()
+        if not in_entries:
+            in_entries = line == '----------'
+            continue
+        if line.startswith('Path = '):
+            if current and not current['folder']:
+                yield _entry_from_fields(current)
+            current = {'path': line[7:], 'folder': line.endswith('/')}
+        elif current is None:
+            continue
+        elif not line:
+            if not current['folder']:
+                yield _entry_from_fields(current)
+            current = None
+        elif line.startswith('Size = '):
+            current['size'] = int(line[7:]) if line[7:].isdigit() else 0
+        elif line.startswith('Packed Size = '):
+            current['packed'] = int(line[14:]) if line[14:].isdigit() else 0
+        elif line.startswith('Method = '):
+            current['method'] = line[9:]
+        elif line.startswith('Modified = '):
+            current['modified'] = line[11:]
+        elif line.startswith('CRC = '):
+            try:
+                current['crc'] = int(line[6:], 16)
+            except ValueError:
+                pass
+        elif line == 'Folder = +' or (line.startswith('Attributes = ') and line[13:14] == 'D'):
+            current['folder'] = True
+
+    if current and not current['folder']:
+        yield _entry_from_fields(current)
+
+
+def _entry_from_fields(fields):
+    return ArchiveEntry(fields['path'], fields.get('size', 0), fields.get('packed', 0),
+                        fields.get('method', 'Unknown'), fields.get('modified', 'Unknown'),
+                        fields.get('crc'))
+
+
+def parse_7zip_listing(output):
+    """Parse 7-Zip listing output"""
+    return list(iter_7zip_listing(output.splitlines()))
+
+
+class Archive:
+    """One archive plus the password and backend choice used to open it"""
+
+    def __init__(self, path, password="", method="auto", seven_zip_path=None, workers=1,
+                 index=None):
+        if method not in METHODS:
+            raise ValueError(f"Unknown method {method!r}")
+        self.path = path
+        self.password = password
+        self.method = method
+        self.seven_zip_path = seven_zip_path
+        # Python backend extraction processes; 0 or None means one per CPU
+        self.workers = workers
+        # Optional ArchiveIndex consulted before listing
+        self.index = index
+        # Optional jobs.CancelToken checked between units of work
+        self.token = None
+        # Optional callable receiving progress.ProgressSnapshot updates
+        self.progress = None
+        # Optional keycache.DerivedKeyCache shared by the Python backend
+        self.key_cache = None
+        # parallel.EntryResult list from the last Python backend test
+        self.test_report = None
+        # Optional preview.PreviewCache consulted by preview()
+        self.preview_cache = None
+        # Set by an incremental extract()
+        self.skipped_files = self.skipped_bytes = 0
+        self.method_used = None
+        # Optional trace.Tracer timing each phase of every operation
+        self.tracer = None
+        # Optional backends.ThroughputHistory that auto mode learns from
+        self.history = None
+        # Optional batch.IOBudget shared with other archives being extracted
+        self.io_budget = None
+        # nested.NestedLimits for extract(nested=True); None means the defaults
+        self.nested_limits = None
+        # Inner archives opened by the last nested extract()
+        self.nested_archives = 0
+        # Worker processes started by the last Python backend run; 0 if it ran in-process
+        self.pool_workers = 0
+
+    def _7zip_command(self, command, *args):
+        if not self.seven_zip_path:
+            raise ArchiveError("7-Zip not available")
+        cmd = [self.seven_zip_path, command, self.path, *args]
+        if self.password:
+            cmd.append(f"-p{self.password}")
+        return cmd
+
+    def _check_cancelled(self):
+        if self.token is not None:
+            self.token.check()
+
+    def _charge_io(self, members=None):
+        """Pay the I/O budget up front for work this process cannot meter
+
+        7-Zip and test_parallel/extract_parallel read the archive outside the
+        read hook, so they are charged the compressed size of the entries
+        they will read (all, or members) before they start. Archives the
+        Python reader cannot list are charged their full size.
+        """
+        if self.io_budget is None:
+            return
+        try:
+            with open_zip(self.path) as zip_file:
+                infos = zip_file.infolist() if not members else \
+                    [zip_file.getinfo(name) for name in members]
+            count = sum(info.compress_size for info in infos)
+        except (OSError, KeyError, zipfile.BadZipFile):
+            try:
+                count = archive_size(self.path)
+            except (OSError, zipfile.BadZipFile):
+                return
+        self.io_budget.consume(count, self.token)
+
+    def _span(self, name, cat="phase", **args):
+        if self.tracer is None:
+            return null_span(name)
+        return self.tracer.span(name, cat, **args)
+
+    def _run_7zip(self, cmd, tracker=None, members=None):
+        """Run 7-Zip to completion, terminating it if the operation is cancelled
+
+        With a tracker, 7-Zip's percentage output (-bsp1) drives it. members
+        are the entries an extraction is limited to, if any.
+        """
+        import subprocess
+        import tempfile
+
+        if cmd[1] in ("x", "e", "t"):
+            self._charge_io(members)
+        if tracker is not None:
+            cmd = cmd + ["-bso0", "-bsp1"]
+        with tempfile.TemporaryFile() as stderr_file, \
+                self._span("7-Zip", "process", command=cmd[1]):
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                       stderr=stderr_file if tracker is not None else subprocess.PIPE,
+                                       stdin=subprocess.DEVNULL, text=True,
+                                       encoding='utf-8', errors='replace')
+            if self.token is not None:
+                self.token.attach(process)
+            try:
+                if tracker is not None:
+                    for percent, entries_done in iter_7zip_progress(process.stdout):
+                        tracker.set_percent(percent, entries_done)
+                    process.wait()
+                    stdout = ""
+                    stderr_file.seek(0)
+                    stderr = stderr_file.read().decode('utf-8', 'replace')
+                else:
+                    stdout, stderr = process.communicate()
+            finally:
+                if self.token is not None:
+                    self.token.detach(process)
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+        self._check_cancelled()
+        if tracker is not None and process.returncode == 0:
+            tracker.set_percent(100, tracker.total_entries)
+            tracker.finish()
+        return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+    def _tracker(self, members=None, in_process=True):
+        """ProgressTracker for this operation, with totals from the central directory
+
+        Returns None when nobody is listening. Totals stay unknown for archives
+        the Python reader cannot parse (7-Zip then supplies percentages).
+        """
+        if self.progress is None:
+            return None
+        tracker = ProgressTracker(self.progress, measure_cpu=in_process)
+        try:
+            with open_zip(self.path) as zip_file:
+                infos = zip_file.infolist() if not members else \
+                    [zip_file.getinfo(name) for name in members]
+        except (OSError, KeyError, zipfile.BadZipFile):
+            return tracker
+        files = [info for info in infos if not info.is_dir()]
+        tracker.total_bytes = sum(info.file_size for info in files)
+        tracker.total_entries = len(files)
+        return tracker
+
+    def _on_read(self, tracker):
+        """read_callback for AESZipFile: count bytes, pace them and honour cancellation"""
+        budget = self.io_budget
+
+        def on_read(count):
+            if tracker is not None:
+                tracker.add_bytes(count)
+            if budget is not None:
+                budget.consume(count, self.token)
+            self._check_cancelled()
+        return on_read
+
+    def _on_pool(self, workers):
+        self.pool_workers = max(self.pool_workers, workers)
+
+    def _open_python(self):
+        with self._span("open"):
+            zip_file = open_zip(self.path)
+        zip_file.key_cache = self.key_cache
+        zip_file.tracer = self.tracer
+        if self.password:
+            zip_file.setpassword(self.password.encode('utf-8'))
+        return zip_file
+
+    def _groups(self, op, members=None):
+        """backends.GroupCost per entry group for op, and whether Python can read the archive"""
+        if op == "list":
+            return list_groups(), is_zip_archive(self.path)
+        profile = profile_archive(self.path)
+        if profile is None:
+            return list_groups(), False
+        return profile.select(members).groups(), True
+
+    def ranked_backends(self, op, members=None):
+        """[(Backend, predicted seconds or None)] to try for op, best first
+
+        An explicit method gives that backend alone. In auto mode every
+        available backend is ranked by backends.rank_backends(). Predictions
+        are only made when there is a history to compare them with.
+        """
+        if self.method != "auto":
+            backend = get_backend(self.method)
+            predicted = None
+            if self.history is not None:
+                # Explicit runs are measured too, so auto mode learns from them
+                groups, readable = self._groups(op, members)
+                if readable or not backend.zip_only:
+                    predicted = backend.predict(self, op, groups, self.history)
+            return [(backend, predicted)]
+        groups, readable = self._groups(op, members)
+        return rank_backends(self, op, groups, self.history, readable)
+
+    def _learn(self, backend, op, predicted, seconds, groups):
+        if self.history is not None and predicted is not None:
+            self.history.record(backend.name, op, dominant_group(groups), predicted, seconds,
+                                sum(cost.bytes for cost in groups.values()))
+
+    def _with_backends(self, op, run, members=None, ranked=None):
+        """Call run(backend) on the best backend, falling back in auto mode
+
+        Returns (result, backend name) and feeds the measured time to
+        self.history.
+        """
+        ranked = ranked or self.ranked_backends(op, members)
+        groups = None
+        for number, (backend, predicted) in enumerate(ranked):
+            start = time.perf_counter()
+            try:
+                result = run(backend)
+            except OperationCancelled:
+                raise
+            except Exception:
+                if self.method != "auto" or number == len(ranked) - 1:
+                    raise
+                continue  # Fall back to the next backend in auto mode
+            if predicted is not None and self.history is not None:
+                groups = groups or self._groups(op, members)[0]
+                self._learn(backend, op, predicted, time.perf_counter() - start, groups)
+            return result, backend.name
+        raise ArchiveError("No backend available")
+
+    def verify_password(self, required=True):
+        """Check the password against the archive in milliseconds
+
+        Uses the WinZip AES password verifier and the HMAC of the smallest
+        encrypted entry (see AESZipFile.check_password) whatever backend
+        will do the real work. Raises PasswordError for a wrong password, or
+        a missing one when required. Returns True if the password was
+        checked, False if there was nothing to check (no encrypted entries,
+        or not a ZIP file the Python reader understands).
+        """
+        try:
+            zip_file = self._open_python()
+        except (zipfile.BadZipFile, OSError):
+            return False
+        with zip_file, self._span("verify-password"):
+            if not self.password and not required:
+                return False
+            try:
+                return zip_file.check_password() is not None
+            except RuntimeError as e:
+                if "password" in str(e):
+                    raise PasswordError("Incorrect password" if self.password else str(e))
+                raise
+
+    # Listing
+
+    def iter_list_with_7zip(self):
+        """Stream archive contents from a 7-Zip listing as it is produced"""
+        import subprocess
+        import tempfile
+
+        cmd = self._7zip_command("l", "-slt")
+
+        # stderr goes to a file so a chatty 7-Zip can never block on a full pipe
+        with tempfile.TemporaryFile() as stderr_file, \
+                self._span("list", "operation", method="7-Zip"), \
+                self._span("7-Zip", "process", command="l"):
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file,
+                                       stdin=subprocess.DEVNULL, text=True,
+                                       encoding='utf-8', errors='replace')
+            if self.token is not None:
+                self.token.attach(process)
+            try:
+                yield from iter_7zip_listing(process.stdout)
+                returncode = process.wait()
+            finally:
+                if self.token is not None:
+                    self.token.detach(process)
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                process.stdout.close()
+            self._check_cancelled()
+
+            if returncode != 0:
+                stderr_file.seek(0)
+                stderr = stderr_file.read().decode('utf-8', 'replace')
+                if "Wrong password" in stderr or "Cannot open encrypted archive" in stderr:
+                    raise PasswordError("Incorrect password")
+                raise ArchiveError(f"7-Zip error: {stderr}")
+
+    def list_with_7zip(self):
+        """List archive contents using 7-Zip"""
+        return list(self.iter_list_with_7zip())
+
+    def iter_list_with_python(self):
+        """Stream archive contents from the built-in ZIP reader"""
+        with self._span("list", "operation", method="Python"), self._open_python() as zip_file:
+            for count, file_info in enumerate(zip_file.infolist()):
+                if count % 1000 == 0:
+                    self._check_cancelled()
+                if file_info.filename.endswith('/'):
+                    continue
+                try:
+                    modified = "{}-{:02d}-{:02d} {:02d}:{:02d}".format(*file_info.date_time[:5])
+                except (TypeError, ValueError):
+                    modified = "Unknown"
+
+                info = aes_info(file_info)
+                crc = None if info is not None and info.version == 2 else file_info.CRC
+                yield ArchiveEntry(file_info.filename, file_info.file_size,
+                                   file_info.compress_size, describe_method(file_info),
+                                   modified, crc)
+
+    def list_with_python(self):
+        """List archive contents using the built-in ZIP reader"""
+        return list(self.iter_list_with_python())
+
+    def iter_list(self):
+        """Stream entries from the index or the preferred backend
+
+        In auto mode a 7-Zip failure before the first entry falls back to the
+        Python reader. The backend in use is stored in self.method_used.
+        A supplied password is verified first, as neither backend checks it
+        when only reading names.
+        """
+        self.verify_password(required=False)
+        if self.index is not None:
+            with self._span("index-lookup"):
+                cached = self.index.lookup(self.path)
+            if cached is not None:
+                entries, method = cached
+                self.method_used = f"{method} (cached)"
+                yield from entries
+                return
+
+        entries = [] if self.index is not None else None
+        for entry in self._iter_list_uncached():
+            if entries is not None:
+                entries.append(entry)
+            yield entry
+        if entries is not None:
+            with self._span("index-store"):
+                self.index.store(self.path, entries, self.method_used)
+
+    def _iter_list_uncached(self):
+        ranked = self.ranked_backends("list")
+        for number, (backend, predicted) in enumerate(ranked):
+            self.method_used = backend.name
+            produced = 0
+            start = time.perf_counter()
+            try:
+                for entry in backend.iter_list(self):
+                    produced += 1
+                    yield entry
+            except OperationCancelled:
+                raise
+            except Exception:
+                if self.method != "auto" or produced or number == len(ranked) - 1:
+                    raise
+                continue  # Fall back to the next backend in auto mode
+            if predicted is not None:
+                groups = list_groups(produced)
+                predicted = backend.predict(self, "list", groups, self.history)
+                self._learn(backend, "list", predicted, time.perf_counter() - start, groups)
+            return
+
+    def list(self):
+        """List entries, returning (files, method used)"""
+        files = list(self.iter_list())
+        return files, self.method_used
+
+    # Extraction
+
+    def extract_with_7zip(self, extract_dir, selected_files=None):
+        """Extract files using 7-Zip"""
+        import tempfile
+
+        list_file = None
+        try:
+            if selected_files:
+                # One 7-Zip run for the whole selection: names go through a UTF-8
+                # list file with wildcard matching disabled, and "x" keeps the
+                # directory structure
+                with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.lst',
+                                                 delete=False) as f:
+                    f.write('\n'.join(selected_files) + '\n')
+                    list_file = f.name
+                cmd = self._7zip_command("x", f"-o{extract_dir}", "-y", "-spd",
+                                         "-scsUTF-8", f"@{list_file}")
+            else:
+                # Extract all files
+                cmd = self._7zip_command("x", f"-o{extract_dir}", "-y")
+
+            with self._span("extract", "operation", method="7-Zip"):
+                result = self._run_7zip(cmd, self._tracker(selected_files, in_process=False),
+                                        selected_files)
+        finally:
+            if list_file:
+                os.unlink(list_file)
+
+        if result.returncode != 0:
+            if "Wrong password" in result.stderr:
+                raise PasswordError("Incorrect password")
+            raise ArchiveError(f"7-Zip extraction error: {result.stderr}")
+
+    def extract_with_python(self, extract_dir, selected_files=None):
+        """Extract files using the built-in ZIP reader"""
+        with self._span("extract", "operation", method="Python", workers=self.workers):
+            self._extract_with_python(extract_dir, selected_files)
+
+    def _extract_with_python(self, extract_dir, selected_files):
+        try:
+            if self.workers != 1:
+                pwd = self.password.encode('utf-8') if self.password else None
+                tracker = None
+                if self.progress is not None:
+                    tracker = ProgressTracker(self.progress, measure_cpu=False)
+                self._charge_io(selected_files)
+                self.pool_workers = 0
+                extract_parallel(self.path, pwd, extract_dir, selected_files or None,
+                                 self.workers, self.token, tracker, self.key_cache, self.tracer,
+                                 self._on_pool)
+                if tracker is not None:
+                    tracker.finish()
+                return
+            tracker = self._tracker(selected_files)
+            with self._open_python() as zip_file:
+                zip_file.read_callback = self._on_read(tracker)
+                for member in selected_files or zip_file.infolist():
+                    self._check_cancelled()
+                    target = zip_file.extract(member, extract_dir)
+                    zinfo = zip_file.getinfo(member) if isinstance(member, str) else member
+                    if not zinfo.is_dir():
+                        with self._span("set-mtime", "io"):
+                            restore_mtime(target, zinfo)
+                    if tracker is not None:
+                        tracker.add_entries()
+            if tracker is not None:
+                tracker.finish()
+        except RuntimeError as e:
+            if "password" in str(e):
+                raise PasswordError("Incorrect password" if self.password else str(e))
+            raise
+
+    def extract(self, extract_dir, selected_files=None, incremental=False, nested=False):
+        """Extract all (or the selected) files, returning the method used
+
+        In incremental mode, files already present in extract_dir with the
+        listed size, time and CRC are left alone; self.skipped_files and
+        self.skipped_bytes say how much was skipped.
+
+        In nested mode, ZIP archives inside the archive are extracted into
+        folders of their own instead of being written out, without
+        temporary files (see nested.py). This always uses the Python backend.
+        """
+        self.skipped_files = self.skipped_bytes = 0
+        self.nested_archives = 0
+        if nested:
+            if incremental:
+                raise ValueError("Nested extraction cannot be incremental")
+            self.verify_password()
+            with self._span("extract", "operation", method="Python", nested=True):
+                self._extract_nested(extract_dir, selected_files)
+            return "Python (nested)"
+        if incremental:
+            entries, _ = self.list()
+            if selected_files:
+                wanted = set(selected_files)
+                entries = [entry for entry in entries if entry.path in wanted]
+            with self._span("plan-incremental"):
+                plan = plan_incremental(entries, extract_dir, token=self.token)
+            self.skipped_files, self.skipped_bytes = plan.skipped, plan.skipped_bytes
+            if not plan.extract:
+                return "none - all files up to date"
+            if plan.skipped:
+                selected_files = plan.extract
+        self.verify_password()
+        if self.method == "auto":
+            split = plan_split(self, self._profile(selected_files), self.history)
+            if split:
+                return self._extract_split(extract_dir, split)
+        return self._with_backends(
+            "extract", lambda backend: backend.extract(self, extract_dir, selected_files),
+            selected_files)[1]
+
+    def _extract_nested(self, extract_dir, selected_files):
+        # nested imports tempfile, which other runs do without
+        from .nested import NestedExtractor
+
+        tracker = self._tracker(selected_files)
+        try:
+            with self._open_python() as zip_file:
+                zip_file.read_callback = self._on_read(tracker)
+                extractor = NestedExtractor(
+                    zip_file.pwd, self.nested_limits, archive_size(self.path),
+                    self.key_cache, self.tracer, self._on_read(None),
+                    tracker.add_entries if tracker is not None else None)
+                try:
+                    extractor.extract(zip_file, extract_dir, selected_files)
+                finally:
+                    self.nested_archives = extractor.archives
+            if tracker is not None:
+                tracker.finish()
+        except RuntimeError as e:
+            if "password" in str(e):
+                raise PasswordError("Incorrect password" if self.password else str(e))
+            raise
+
+    def _profile(self, members=None):
+        profile = profile_archive(self.path)
+        return profile.select(members) if profile is not None else None
+
+    def _extract_split(self, extract_dir, split):
+        """Extract each share of the entries with the backend planned for it"""
+        used = []
+        for backend, names in split:
+            ranked = self.ranked_backends("extract", names)
+            # The planned backend first; the rest stay as fallbacks
+            ranked.sort(key=lambda item: item[0] is not backend)
+            _, name = self._with_backends(
+                "extract", lambda chosen: chosen.extract(self, extract_dir, names), names, ranked)
+            if name not in used:
+                used.append(name)
+        return " + ".join(used)
+
+    # Preview
+
+    def preview_with_7zip(self, name, limit=PREVIEW_LIMIT):
+        """Read the start of one entry from 7-Zip's stdout"""
+        import subprocess
+        import tempfile
+
+        cmd = self._7zip_command("x", "-so", "-spd", name)
+        with tempfile.TemporaryFile() as stderr_file:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file,
+                                       stdin=subprocess.DEVNULL)
+            if self.token is not None:
+                self.token.attach(process)
+            try:
+                data = process.stdout.read(limit + 1)
+                truncated = len(data) > limit
+                if truncated:
+                    # Enough read; no need to let 7-Zip decode the rest
+                    process.kill()
+                returncode = process.wait()
+            finally:
+                if self.token is not None:
+                    self.token.detach(process)
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                process.stdout.close()
+            self._check_cancelled()
+            if not truncated and returncode != 0:
+                stderr_file.seek(0)
+                stderr = stderr_file.read().decode('utf-8', 'replace')
+                if "Wrong password" in stderr:
+                    raise PasswordError("Incorrect password")
+                raise ArchiveError(f"7-Zip error: {stderr}")
+        return Preview(name, data[:limit], None, truncated)
+
+    def preview_with_python(self, name, limit=PREVIEW_LIMIT):
+        """Decrypt and decompress the start of one entry into memory"""
+        try:
+            with self._open_python() as zip_file:
+                info = zip_file.getinfo(name)
+                chunks = []
+                remaining = limit
+                with zip_file.open(info) as f:
+                    while remaining > 0:
+                        self._check_cancelled()
+                        chunk = f.read(min(remaining, 2 ** 16))
+                        if not chunk:
+                            break
+                        chunks.append(chunk)
+                        remaining -= len(chunk)
+        except KeyError:
+            raise ArchiveError(f"No entry named {name!r} in the archive")
+        except RuntimeError as e:
+            if "password" in str(e):
+                raise PasswordError("Incorrect password" if self.password else str(e))
+            raise
+        data = b"".join(chunks)
+        return Preview(name, data, info.file_size, info.file_size > len(data))
+
+    def preview(self, name, limit=PREVIEW_LIMIT):
+        """Return a preview.Preview of one entry, from the cache when possible"""
+        if self.preview_cache is not None:
+            cached = self.preview_cache.get(self.path, name)
+            if cached is not None and (not cached.truncated or len(cached.data) >= limit):
+                self.method_used = "cache"
+                return cached
+        preview, self.method_used = self._with_backends(
+            "preview", lambda backend: backend.preview(self, name, limit), [name])
+        if self.preview_cache is not None:
+            self.preview_cache.put(self.path, preview)
+        return preview
+
+    # Testing
+
+    def test_with_7zip(self):
+        """Test archive integrity using 7-Zip, returning (passed, details)"""
+        with self._span("test", "operation", method="7-Zip"):
+            result = self._run_7zip(self._7zip_command("t"), self._tracker(in_process=False))
+        if result.returncode == 0:
+            return True, "All files are OK."
+        if "Wrong password" in result.stderr:
+            raise PasswordError("Incorrect password")
+        return False, result.stderr.strip()
+
+    def test_with_python(self):
+        """Test archive integrity using the built-in ZIP reader, returning (passed, details)
+
+        Every entry is checked, across self.workers processes, and the
+        per-entry results are kept in self.test_report.
+        """
+        pwd = self.password.encode('utf-8') if self.password else None
+        tracker = None
+        if self.progress is not None:
+            tracker = ProgressTracker(self.progress, measure_cpu=self.workers == 1)
+        self._charge_io()
+        self.pool_workers = 0
+        with self._span("test", "operation", method="Python", workers=self.workers):
+            report = test_parallel(self.path, pwd, None, self.workers, self.token, tracker,
+                                   self.key_cache, self.tracer, self._on_pool)
+        if tracker is not None:
+            tracker.finish()
+        self.test_report = report
+        bad = [result for result in report if result.status != "ok"]
+        if not bad:
+            return True, "All files are OK."
+        if all(result.status == "bad-password" for result in bad):
+            raise PasswordError("Incorrect password" if self.password else bad[0].error)
+        lines = [f"{len(bad)} of {len(report)} files failed:"]
+        lines.extend(f"{result.name}: {result.status}" for result in bad[:MAX_REPORTED_FAILURES])
+        if len(bad) > MAX_REPORTED_FAILURES:
+            lines.append(f"... and {len(bad) - MAX_REPORTED_FAILURES} more")
+        return False, "\n".join(lines)
+
+    def test(self):
+        """Test archive integrity, returning (passed, details, method used)"""
+        try:
+            self.verify_password()
+        except zipfile.BadZipFile as e:
+            return False, str(e), "Python"
+        (passed, details), method_used = self._with_backends(
+            "test", lambda backend: backend.test(self))
+        return passed, details, method_used
+
+    # Search
+
+    def search(self, pattern, regex=False, ignore_case=False, members=None, on_results=None,
+               window=DEFAULT_WINDOW, max_matches=DEFAULT_MAX_MATCHES):
+        """Find the entries whose content matches pattern, as a list of search.SearchResult
+
+        Entries are decrypted and decompressed in memory only, across
+        self.workers processes; nothing is written to disk. on_results,
+        when given, receives each batch's results as soon as it is done.
+        Search always uses the Python backend.
+        """
+        if not is_zip_archive(self.path):
+            raise ArchiveError("Search needs an archive the Python backend can read")
+        compiled, overlap = compile_pattern(pattern, regex, ignore_case)
+        self.verify_password()
+        pwd = self.password.encode('utf-8') if self.password else None
+        tracker = None
+        if self.progress is not None:
+            tracker = ProgressTracker(self.progress, measure_cpu=self.workers == 1)
+        self._charge_io(members)
+        results = []
+        self.pool_workers = 0
+        with self._span("search", "operation", method="Python", workers=self.workers):
+            for batch in iter_search(self.path, pwd, compiled, overlap, members, self.workers,
+                                     self.token, tracker, self.key_cache, self.tracer, window,
+                                     max_matches, self._on_pool):
+                results.extend(batch)
+                if batch and on_results is not None:
+                    on_results(batch)
+        if tracker is not None:
+            tracker.finish()
+        return sorted(results, key=lambda result: result.name)
+
+    def create(self, sources, compression="deflate", level=None):
+        """Write files and folders to a new AES-256 archive at self.path
+
+        Entries are compressed and encrypted across self.workers processes
+        and written in order by this one (see create.py). compression is a
+        key of create.COMPRESSIONS. Returns the number of entries written.
+        """
+        if not self.password:
+            raise ArchiveError("A password is required to create an encrypted archive")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression {compression!r}")
+        with self._span("collect"):
+            entries = collect_files(sources, exclude=(self.path, self.path + ".part"))
+        if not entries:
+            raise ArchiveError("Nothing to add to the archive")
+        tracker = None
+        if self.progress is not None:
+            tracker = ProgressTracker(self.progress, measure_cpu=self.workers == 1)
+        with self._span("create", "operation", method="Python", workers=self.workers):
+            create_archive(self.path, entries, self.password.encode('utf-8'),
+                           COMPRESSIONS[compression], level, self.workers, self.token, tracker)
+        if tracker is not None:
+            tracker.finish()
+        return len(entries)
+
+    def convert(self, output, fmt, new_password=None, members=None, level=None):
+        """Re-pack the archive into output as fmt (see repack.FORMATS) in one pass
+
+        Entries stream from the decryptor into the new archive without
+        touching the disk in between; zip-aes re-encrypts them under
+        new_password. Conversion always uses the Python backend.
+        """
+        if not is_zip_archive(self.path):
+            raise ArchiveError("Conversion needs an archive the Python backend can read")
+        self.verify_password()
+        tracker = self._tracker(members)
+        try:
+            with self._open_python() as zip_file, \
+                    self._span("convert", "operation", method="Python", format=fmt):
+                zip_file.read_callback = self._on_read(tracker)
+                repack(zip_file, output, fmt,
+                       new_password.encode('utf-8') if new_password else None, members,
+                       level=level, on_entry=tracker.add_entries if tracker is not None else None,
+                       check=self._check_cancelled)
+            if tracker is not None:
+                tracker.finish()
+        except RuntimeError as e:
+            if "password" in str(e):
+                raise PasswordError("Incorrect password" if self.password else str(e))
+            raise
+        return "Python"
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Creating AES-256 encrypted archives, encoding entries in parallel
+
+Files are compressed and encrypted by a pool of worker processes with
+writer.encode_entry(), each worker reading its file itself, while this
+process is the single writer: it appends the encoded entries in the order
+they were collected, so the archive is the same whatever the number of
+workers. Only MAX_INFLIGHT_BYTES of input are handed out ahead of the
+writer, and files of STREAM_BYTES or more are never encoded in memory:
+the writer streams them through AESZipWriter.open_encrypted() while the
+workers carry on with the files after them.
+
+Each entry gets its own salt and keys, so key derivation is spread over
+the workers too. ZIP64 records are written wherever entries, offsets or
+the entry count need them. Directories are stored as plain entries.
+"""
+
+import os
+import zipfile
+from collections import deque
+
+from .winzip import CHUNK_SIZE
+from .writer import ENCRYPTION_AES256, AESZipWriter, encode_entry
+
+COMPRESSIONS = {
+    "stored": zipfile.ZIP_STORED,
+    "deflate": zipfile.ZIP_DEFLATED,
+    "bzip2": zipfile.ZIP_BZIP2,
+    "lzma": zipfile.ZIP_LZMA,
+}
+
+# Already compressed formats, stored as they are rather than compressed again
+STORED_EXTENSIONS = (".zip", ".7z", ".rar", ".gz", ".bz2", ".xz", ".zst", ".jpg", ".jpeg",
+                     ".png", ".gif", ".webp", ".mp3", ".mp4", ".mkv", ".avi", ".mov",
+                     ".docx", ".xlsx", ".pptx")
+
+# Files this large are streamed by the writer instead of encoded in a worker
+STREAM_BYTES = 16 * 1024 * 1024
+# Input handed to workers but not yet written; bounds memory for encoded entries
+MAX_INFLIGHT_BYTES = 128 * 1024 * 1024
+
+
+def collect_files(paths, exclude=()):
+    """[(source path, ZipInfo)] for files and folders, in archive order
+
+    A folder is stored under its own name (adding C:\\docs gives docs/...),
+    a file under its base name. Paths in exclude are skipped, so an
+    archive created inside the folder it archives leaves itself out.
+    Raises ValueError for two sources that would get the same name.
+    """
+    excluded = {os.path.normcase(os.path.abspath(path)) for path in exclude}
+    entries = []
+    names = set()
+
+    def add(source, arcname):
+        if os.path.normcase(os.path.abspath(source)) in excluded:
+            return
+        zinfo = zipfile.ZipInfo.from_file(source, arcname)
+        if zinfo.filename in names:
+            raise ValueError(f"Two files would be stored as {zinfo.filename!r}")
+        names.add(zinfo.filename)
+        entries.append((source, zinfo))
+
+    for path in paths:
+        path = os.path.normpath(path)
+        if not os.path.isdir(path):
+            add(path, os.path.basename(path))
+            continue
+        base = os.path.dirname(os.path.abspath(path))
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            add(dirpath, os.path.relpath(dirpath, base))
+            for name in sorted(filenames):
+                source = os.path.join(dirpath, name)
+                add(source, os.path.relpath(source, base))
+    return entries
+
+
+def compression_for(zinfo, compress_type):
+    """compress_type, or Stored for empty and already compressed files"""
+    if zinfo.file_size == 0 or zinfo.filename.lower().endswith(STORED_EXTENSIONS):
+        return zipfile.ZIP_STORED
+    return compress_type
+
+
+def _encode_file(path, pwd, compress_type, compresslevel):
+    """Worker entry point: read and encode one file"""
+    with open(path, "rb") as f:
+        data = f.read()
+    return encode_entry(data, pwd, compress_type, ENCRYPTION_AES256, compresslevel)
+
+
+class _Encoded:
+    """Future-like wrapper for an entry encoded in this process"""
+
+    def __init__(self, encoded):
+        self._encoded = encoded
+
+    def result(self):
+        return self._encoded
+
+
+def create_archive(output, entries, pwd, compress_type=zipfile.ZIP_DEFLATED,
+                   compresslevel=None, workers=None, token=None, tracker=None):
+    """Write entries (from collect_files()) to a new AES-256 archive at output
+
+    workers processes encode entries (0 or None: one per CPU). tracker, a
+    progress.ProgressTracker, is fed as entries are written and token, a
+    jobs.CancelToken, is checked between entries and chunks. The archive
+    is written to output + ".part" and renamed when complete; a failed run
+    leaves nothing behind. Returns the size of the archive.
+    """
+    if not pwd:
+        raise ValueError("A password is required to create an encrypted archive")
+    workers = workers or os.cpu_count() or 1
+    if tracker is not None:
+        tracker.total_bytes = sum(zinfo.file_size for _, zinfo in entries)
+        tracker.total_entries = sum(1 for _, zinfo in entries if not zinfo.is_dir())
+
+    pool = None
+    if workers > 1 and sum(1 for _, zinfo in entries if not zinfo.is_dir()) > 1:
+        # Only pool runs pay for importing multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(max_workers=workers)
+
+    partial = output + ".part"
+    # (source, zinfo, compress_type, future or None) in archive order
+    pending = deque()
+    inflight = 0
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with AESZipWriter(partial, "w", allowZip64=True) as zip_file:
+            zip_file.setpassword(pwd)
+
+            def write_next():
+                nonlocal inflight
+                source, zinfo, method, future = pending.popleft()
+                if zinfo.is_dir():
+                    zip_file.writestr(zinfo, b"")
+                    return
+                if future is None:
+                    _stream_file(zip_file, source, zinfo, method, compresslevel, token, tracker)
+                else:
+                    inflight -= zinfo.file_size
+                    zip_file.write_encoded(zinfo, future.result())
+                    if tracker is not None:
+                        tracker.add_bytes(zinfo.file_size)
+                if tracker is not None:
+                    tracker.add_entries()
+
+            for source, zinfo in entries:
+                if token is not None:
+                    token.check()
+                method = compression_for(zinfo, compress_type)
+                future = None
+                if not zinfo.is_dir() and zinfo.file_size < STREAM_BYTES:
+                    args = (source, pwd, method, compresslevel)
+                    future = pool.submit(_encode_file, *args) if pool is not None else \
+                        _Encoded(_encode_file(*args))
+                    inflight += zinfo.file_size
+                pending.append((source, zinfo, method, future))
+                # Keep the workers busy, but never too far ahead of the writer
+                while pending and (inflight > MAX_INFLIGHT_BYTES or len(pending) > 4 * workers):
+                    write_next()
+            while pending:
+                if token is not None:
+                    token.check()
+                write_next()
+        os.replace(partial, output)
+        return os.path.getsize(output)
+    except BaseException:
+        try:
+            os.remove(partial)
+        except OSError:
+            pass
+        raise
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _stream_file(zip_file, source, zinfo, compress_type, compresslevel, token, tracker):
+    """Encrypt one large file straight from disk into the archive"""
+    with open(source, "rb") as f, \
+            zip_file.open_encrypted(zinfo, compress_type, compresslevel) as target:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            target.write(chunk)
+            if tracker is not None:
+                tracker.add_bytes(len(chunk))
+            if token is not None:
+                token.check()
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Cached 7-Zip discovery
+
+Looking for 7-Zip means probing several install locations and PATH, and
+asking it for its version and codecs means starting a process. The result
+is stored as JSON in the per-user cache directory and reused for as long
+as the executable's size and modification time are unchanged, so a normal
+start costs one stat() call. A negative result ("not installed") is
+trusted for NOT_FOUND_TTL seconds before PATH is searched again.
+"""
+
+import itertools
+import json
+import os
+import time
+from collections import namedtuple
+
+SevenZipInfo = namedtuple("SevenZipInfo", "path version methods")
+
+CANDIDATES = (
+    r"C:\Program Files\7-Zip\7z.exe",
+    r"C:\Program Files (x86)\7-Zip\7z.exe",
+    r"C:\Tools\7-Zip\7z.exe",
+    "7z.exe",  # If in PATH
+    "7z",
+    "7za",
+)
+
+NOT_FOUND_TTL = 300
+
+CACHE_VERSION = 1
+
+
+def cache_dir():
+    """Per-user directory for the index and discovery cache"""
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") \
+        or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "aes-zip-opener")
+
+
+def default_cache_path():
+    return os.path.join(cache_dir(), "backends.json")
+
+
+def _locate():
+    """Probe the candidate locations; returns an absolute path or None"""
+    import shutil
+
+    for candidate in CANDIDATES:
+        found = shutil.which(candidate)
+        if found:
+            return os.path.abspath(found)
+        if os.path.isabs(candidate) and os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def parse_7zip_info(output):
+    """Return (version, methods) from `7z i` output"""
+    version = None
+    methods = []
+    in_codecs = False
+    for line in output.splitlines():
+        stripped = line.strip()
+        if version is None and stripped.startswith("7-Zip"):
+            # "7-Zip 23.01 (x64) : ...", "7-Zip (a) 23.01 ...", "7-Zip [64] 16.02 : ..."
+            version = next((part for part in stripped.split()[1:]
+                            if part[:1].isdigit() and "." in part), None)
+        elif stripped.startswith("Codecs:"):
+            in_codecs = True
+        elif in_codecs:
+            if not stripped or stripped.endswith(":"):
+                in_codecs = False
+            else:
+                methods.append(stripped.split()[-1])
+    return version, methods
+
+
+def probe(path, timeout=10):
+    """Ask one 7-Zip executable for its version and codecs"""
+    import subprocess
+
+    try:
+        result = subprocess.run([path, "i"], capture_output=True, text=True,
+                                encoding="utf-8", errors="replace",
+                                stdin=subprocess.DEVNULL, timeout=timeout)
+    except (OSError, subprocess.SubprocessError):
+        return SevenZipInfo(path, None, [])
+    version, methods = parse_7zip_info(result.stdout)
+    return SevenZipInfo(path, version, methods)
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _load(cache_path):
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+        return None
+    return data
+
+
+# Numbers the temporary files of saves made by this process
+_save_counter = itertools.count()
+
+
+def save_json(cache_path, data):
+    """Atomically replace a JSON cache file; failures are ignored
+
+    Every call writes its own temporary file, so saves from several
+    threads or processes never interleave: the last rename wins.
+    """
+    temp_path = f"{cache_path}.{os.getpid()}.{next(_save_counter)}.tmp"
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+def discover_7zip(cache_path=None, refresh=False):
+    """Return SevenZipInfo for the installed 7-Zip, or None if there is none"""
+    cache_path = cache_path or default_cache_path()
+    data = None if refresh else _load(cache_path)
+    if data is not None:
+        path = data.get("path")
+        if path is None:
+            if time.time() - data.get("checked", 0) < NOT_FOUND_TTL:
+                return None
+        else:
+            try:
+                if _stat_key(path) == data.get("stat"):
+                    return SevenZipInfo(path, data.get("seven_zip_version"),
+                                        data.get("methods", []))
+            except OSError:
+                pass
+
+    path = _locate()
+    info = probe(path) if path else None
+    record = {"version": CACHE_VERSION, "checked": time.time(), "path": path}
+    if info is not None:
+        try:
+            record["stat"] = _stat_key(path)
+        except OSError:
+            record["stat"] = None
+        record.update(seven_zip_version=info.version, methods=info.methods)
+    save_json(cache_path, record)
+    return info
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Compact column store for archive listings
+
+A million-entry listing kept as a list of dicts or tuples costs hundreds of
+bytes per entry. EntryStore keeps one array per column (sizes as machine
+integers, methods interned to small ids) plus a display-order permutation,
+so sorting never moves the data itself.
+"""
+
+from array import array
+
+from .core import ArchiveEntry
+
+SORT_COLUMNS = ("path", "size", "packed", "method", "modified")
+
+
+class EntryStore:
+    """Columnar backing store for a listing, with an independent display order"""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.paths = []
+        self.sizes = array('q')
+        self.packed = array('q')
+        self.method_ids = array('H')
+        self.modified = []
+        self.methods = []
+        self._method_index = {}
+        self.order = array('l')
+        self.sort_column = None
+        self.sort_reverse = False
+
+    def __len__(self):
+        return len(self.paths)
+
+    def append(self, entry):
+        """Add one ArchiveEntry at the end of the current display order"""
+        method_id = self._method_index.get(entry.method)
+        if method_id is None:
+            method_id = self._method_index[entry.method] = len(self.methods)
+            self.methods.append(entry.method)
+        self.order.append(len(self.paths))
+        self.paths.append(entry.path)
+        self.sizes.append(entry.size)
+        self.packed.append(entry.packed)
+        self.method_ids.append(method_id)
+        self.modified.append(entry.modified)
+
+    def extend(self, entries):
+        for entry in entries:
+            self.append(entry)
+
+    def index_at(self, position):
+        """Map a display position to the stored entry index"""
+        return self.order[position]
+
+    def entry(self, index):
+        """Rebuild the ArchiveEntry stored at index"""
+        return ArchiveEntry(self.paths[index], self.sizes[index], self.packed[index],
+                            self.methods[self.method_ids[index]], self.modified[index])
+
+    def row(self, position):
+        """Return the ArchiveEntry shown at a display position"""
+        return self.entry(self.order[position])
+
+    def sort(self, column, reverse=False):
+        """Reorder the display by one column; ties keep their previous order"""
+        if column not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {column!r}")
+        if column == "path":
+            key = self.paths.__getitem__
+        elif column == "size":
+            key = self.sizes.__getitem__
+        elif column == "packed":
+            key = self.packed.__getitem__
+        elif column == "method":
+            names = self.methods
+            ids = self.method_ids
+            key = lambda i: names[ids[i]]
+        else:
+            key = self.modified.__getitem__
+        self.order = array('l', sorted(self.order, key=key, reverse=reverse))
+        self.sort_column = column
+        self.sort_reverse = reverse
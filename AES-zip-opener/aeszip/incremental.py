@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental extraction support
+
+An entry is skipped when the extraction directory already holds a file with
+the same size and modification time (to the minute, as listings report it)
+and, when the listing has one, the same CRC-32. Everything comes from the
+listing (usually the index), so nothing is decrypted to decide; the CRC
+check reads the existing local file only.
+
+Extraction sets each file's modification time from the archive so the next
+incremental run can recognise it, as 7-Zip does.
+"""
+
+import os
+import time
+import zlib
+from collections import namedtuple
+
+IncrementalPlan = namedtuple("IncrementalPlan", "extract skipped skipped_bytes")
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def local_path(extract_dir, arcname):
+    """Where extraction puts an entry, following zipfile's path sanitising"""
+    arcname = arcname.replace('/', os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    parts = [part for part in arcname.split(os.path.sep)
+             if part not in ('', os.path.curdir, os.path.pardir)]
+    return os.path.join(extract_dir, *parts)
+
+
+def file_crc(path, token=None):
+    crc = 0
+    with open(path, 'rb') as f:
+        while True:
+            if token is not None:
+                token.check()
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return crc
+            crc = zlib.crc32(chunk, crc)
+
+
+def is_unchanged(path, entry, verify_crc=True, token=None):
+    """True if path already holds the ArchiveEntry's contents"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    if st.st_size != entry.size:
+        return False
+    local_modified = time.strftime("%Y-%m-%d %H:%M", time.localtime(st.st_mtime))
+    if local_modified != entry.modified[:16]:
+        return False
+    if verify_crc and entry.crc is not None:
+        try:
+            return file_crc(path, token) == entry.crc
+        except OSError:
+            return False
+    return True
+
+
+def plan_incremental(entries, extract_dir, verify_crc=True, token=None):
+    """Split ArchiveEntries into names to extract and unchanged ones to skip"""
+    extract = []
+    skipped = skipped_bytes = 0
+    for entry in entries:
+        if is_unchanged(local_path(extract_dir, entry.path), entry, verify_crc, token):
+            skipped += 1
+            skipped_bytes += entry.size
+        else:
+            extract.append(entry.path)
+    return IncrementalPlan(extract, skipped, skipped_bytes)
+
+
+def restore_mtime(path, zinfo):
+    """Give an extracted file its modification time from the archive"""
+    try:
+        mtime = time.mktime(zinfo.date_time + (0, 0, -1))
+        os.utime(path, (mtime, mtime))
+    except (OSError, OverflowError, ValueError):
+        pass
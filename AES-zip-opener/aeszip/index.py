@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent index of archive listings
+
+Listings are stored in SQLite keyed by the archive's absolute path, size and
+modification time (over every volume of a split archive), so re-opening an
+unchanged archive skips 7-Zip and the central directory entirely. A changed
+file misses and its stale rows are dropped; the database is kept under a
+byte budget by evicting the least recently used archives.
+
+Only metadata (names, sizes, methods, times, CRCs) is stored, never
+passwords or file contents.
+"""
+
+import os
+import sqlite3
+import time
+
+from .core import ArchiveEntry
+from .discovery import cache_dir
+from .volumes import archive_key
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Rough per-row overhead on top of the text columns, used for the byte budget
+ROW_OVERHEAD = 48
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archives (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    method TEXT NOT NULL,
+    last_used REAL NOT NULL,
+    bytes INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    archive_id INTEGER NOT NULL REFERENCES archives(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    packed INTEGER NOT NULL,
+    method TEXT NOT NULL,
+    modified TEXT NOT NULL,
+    crc INTEGER,
+    PRIMARY KEY (archive_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+def default_index_path():
+    """Per-user cache location for the index database"""
+    return os.path.join(cache_dir(), "index.sqlite")
+
+
+class ArchiveIndex:
+    """Size-bounded LRU cache of archive listings on disk"""
+
+    def __init__(self, db_path=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.db_path = db_path or default_index_path()
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        # A short-lived connection per call keeps the index usable from any thread
+        db = sqlite3.connect(self.db_path, timeout=10)
+        db.execute("PRAGMA foreign_keys = ON")
+        return db
+
+    def lookup(self, path):
+        """Return (entries, method) for an unchanged archive, or None"""
+        archive = archive_key(path)
+        if archive is None:
+            return None
+        key, size, mtime_ns = archive
+        db = self._connect()
+        try:
+            with db:
+                row = db.execute("SELECT id, size, mtime_ns, method FROM archives WHERE path = ?",
+                                 (key,)).fetchone()
+                if row is None:
+                    return None
+                archive_id, cached_size, cached_mtime, method = row
+                if (cached_size, cached_mtime) != (size, mtime_ns):
+                    # The file changed since it was indexed
+                    db.execute("DELETE FROM archives WHERE id = ?", (archive_id,))
+                    return None
+                db.execute("UPDATE archives SET last_used = ? WHERE id = ?",
+                           (time.time(), archive_id))
+                rows = db.execute("SELECT path, size, packed, method, modified, crc "
+                                  "FROM entries WHERE archive_id = ? ORDER BY seq",
+                                  (archive_id,)).fetchall()
+            return [ArchiveEntry(*row) for row in rows], method
+        finally:
+            db.close()
+
+    def store(self, path, entries, method):
+        """Record a complete listing for the archive's current version"""
+        archive = archive_key(path)
+        if archive is None:
+            return
+        key, size, mtime_ns = archive
+        total = sum(len(e.path) + len(e.method) + len(e.modified) + ROW_OVERHEAD
+                    for e in entries)
+        if total > self.max_bytes:
+            return
+        db = self._connect()
+        try:
+            with db:
+                db.execute("DELETE FROM archives WHERE path = ?", (key,))
+                cursor = db.execute(
+                    "INSERT INTO archives (path, size, mtime_ns, method, last_used, bytes) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, size, mtime_ns, method, time.time(), total))
+                archive_id = cursor.lastrowid
+                db.executemany(
+                    "INSERT INTO entries (archive_id, seq, path, size, packed, method, modified, crc) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    ((archive_id, seq, *entry) for seq, entry in enumerate(entries)))
+                self._evict(db)
+        finally:
+            db.close()
+
+    def _evict(self, db):
+        """Drop least recently used archives until the index fits its budget"""
+        used = db.execute("SELECT COALESCE(SUM(bytes), 0) FROM archives").fetchone()[0]
+        if used <= self.max_bytes:
+            return
+        for archive_id, size in db.execute(
+                "SELECT id, bytes FROM archives ORDER BY last_used").fetchall():
+            db.execute("DELETE FROM archives WHERE id = ?", (archive_id,))
+            used -= size
+            if used <= self.max_bytes:
+                break
+
+    def invalidate(self, path):
+        """Forget one archive"""
+        db = self._connect()
+        try:
+            with db:
+                db.execute("DELETE FROM archives WHERE path = ?",
+                           (os.path.normcase(os.path.abspath(path)),))
+        finally:
+            db.close()
+
+    def clear(self):
+        """Forget every archive"""
+        db = self._connect()
+        try:
+            with db:
+                db.execute("DELETE FROM archives")
+            db.execute("VACUUM")
+        finally:
+            db.close()
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Background jobs with cancellation
+
+Archive operations run on worker threads. Everything a job wants the UI to
+know (progress, result, failure) is posted to a queue that the UI
+thread drains with poll(), typically from a Tk after() loop, so callbacks
+always run on the thread that owns the widgets. Jobs beyond the worker
+count wait their turn in submission order.
+"""
+
+import itertools
+import queue
+import threading
+
+from .core import OperationCancelled
+
+
+class CancelToken:
+    """Cancellation flag shared between a job and the code it runs
+
+    Child processes attached to the token are terminated as soon as it is
+    cancelled; Python loops call check() between units of work.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._processes = set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            self._event.set()
+            processes = list(self._processes)
+        for process in processes:
+            _terminate(process)
+
+    def check(self):
+        """Raise OperationCancelled if the job has been cancelled"""
+        if self._event.is_set():
+            raise OperationCancelled("Operation cancelled")
+
+    def attach(self, process):
+        """Terminate this process when the token is cancelled"""
+        with self._lock:
+            self._processes.add(process)
+            cancelled = self._event.is_set()
+        if cancelled:
+            _terminate(process)
+
+    def detach(self, process):
+        with self._lock:
+            self._processes.discard(process)
+
+
+def _terminate(process):
+    try:
+        if process.poll() is None:
+            process.terminate()
+    except OSError:
+        pass
+
+
+class Job:
+    """One unit of background work and the callbacks interested in it"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    _ids = itertools.count(1)
+
+    def __init__(self, name, func, on_success=None, on_error=None, on_progress=None):
+        self.id = next(self._ids)
+        self.name = name
+        self.func = func
+        self.on_success = on_success
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.token = CancelToken()
+        self.state = Job.QUEUED
+        self.result = None
+        self.error = None
+        self._post = None
+
+    def report(self, payload):
+        """Called from the worker thread to send progress to the UI thread"""
+        if self._post is not None:
+            self._post(self, "progress", payload)
+
+    def cancel(self):
+        self.token.cancel()
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.name!r} {self.state}>"
+
+
+class JobScheduler:
+    """Runs jobs on a fixed pool of worker threads"""
+
+    def __init__(self, max_workers=1):
+        self._pending = queue.Queue()
+        self._events = queue.Queue()
+        self._lock = threading.Lock()
+        self._jobs = []
+        self._threads = [threading.Thread(target=self._worker, name=f"aeszip-job-{i}",
+                                          daemon=True)
+                         for i in range(max_workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, job):
+        job._post = self._post
+        with self._lock:
+            self._jobs.append(job)
+        self._pending.put(job)
+        return job
+
+    def active(self):
+        """Jobs that are queued or running"""
+        with self._lock:
+            return [job for job in self._jobs if job.state in (Job.QUEUED, Job.RUNNING)]
+
+    def cancel_all(self):
+        for job in self.active():
+            job.cancel()
+
+    def shutdown(self):
+        """Cancel everything and stop the worker threads"""
+        self.cancel_all()
+        for _ in self._threads:
+            self._pending.put(None)
+
+    def _post(self, job, kind, payload=None):
+        self._events.put((job, kind, payload))
+
+    def _worker(self):
+        while True:
+            job = self._pending.get()
+            if job is None:
+                return
+            if job.token.cancelled:
+                job.state = Job.CANCELLED
+                job.error = OperationCancelled("Operation cancelled")
+                self._post(job, "finished")
+                continue
+
+            job.state = Job.RUNNING
+            try:
+                job.result = job.func(job)
+                job.state = Job.DONE
+            except OperationCancelled as e:
+                job.error = e
+                job.state = Job.CANCELLED
+            except Exception as e:
+                job.error = e
+                job.state = Job.FAILED
+            self._post(job, "finished")
+
+    def poll(self, limit=None):
+        """Dispatch queued job events on the calling thread; returns how many ran"""
+        handled = 0
+        while limit is None or handled < limit:
+            try:
+                job, kind, payload = self._events.get_nowait()
+            except queue.Empty:
+                break
+            handled += 1
+            if kind == "progress":
+                if job.on_progress:
+                    job.on_progress(payload)
+            elif kind == "finished":
+                with self._lock:
+                    self._jobs.remove(job)
+                if job.state == Job.DONE:
+                    if job.on_success:
+                        job.on_success(job.result)
+                elif job.on_error:
+                    job.on_error(job.error)
+        return handled
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Session cache of WinZip AES derived keys
+
+Every AES entry has its own salt, and turning password + salt into keys
+costs 1000 PBKDF2-HMAC-SHA1 iterations. Listing, testing and extracting
+the same archive in one session would repeat that work for every entry,
+which dominates the runtime of archives with many small files. The cache
+keeps the derived keys by (password digest, salt, key length) in LRU order
+up to a fixed number of entries. The digest is an HMAC-SHA256 under a
+random key of the cache's own, and the password itself is never stored.
+
+Call clear() when the password changes or the session ends. Python cannot
+reliably overwrite bytes objects, so clearing drops every reference to the
+keys rather than zeroing them.
+"""
+
+import hashlib
+import hmac
+import os
+import threading
+from collections import OrderedDict
+
+from .winzip import derive_keys
+
+# About 100 bytes per AES-256 entry, so a few MB at most
+DEFAULT_MAX_ENTRIES = 65536
+
+
+class DerivedKeyCache:
+    """Bounded, thread-safe LRU of derive_keys() results"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, preload=None):
+        """preload is the snapshot() of another cache, e.g. in a worker process
+
+        A preloaded cache also remembers the keys it derives itself, for
+        take_derived() to hand back to the cache it was loaded from.
+        """
+        self.max_entries = max_entries
+        self._digest_key, keys = preload or (os.urandom(32), ())
+        self._keys = OrderedDict(keys)
+        self._derived = [] if preload is not None else None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _password_digest(self, pwd):
+        # Keyed, so the cache keys cannot be matched against a list of hashed passwords
+        return hmac.new(self._digest_key, pwd, hashlib.sha256).digest()
+
+    def derive(self, pwd, salt, key_length):
+        """derive_keys() with memoization"""
+        with self._lock:
+            key = (self._password_digest(pwd), bytes(salt), key_length)
+            keys = self._keys.get(key)
+            if keys is not None:
+                self._keys.move_to_end(key)
+                self.hits += 1
+                return keys
+            self.misses += 1
+        keys = derive_keys(pwd, salt, key_length)
+        with self._lock:
+            self._store(key, keys)
+            if self._derived is not None:
+                self._derived.append((key, keys))
+        return keys
+
+    def _store(self, key, keys):
+        self._keys[key] = keys
+        self._keys.move_to_end(key)
+        while len(self._keys) > self.max_entries:
+            self._keys.popitem(last=False)
+
+    def snapshot(self):
+        """Picklable copy of the cached keys and digest key, to preload worker processes"""
+        with self._lock:
+            return self._digest_key, list(self._keys.items())
+
+    def take_derived(self):
+        """Keys derived since the last call, for merge() into the cache this one was loaded from"""
+        with self._lock:
+            if not self._derived:
+                return []
+            derived, self._derived = self._derived, []
+        return derived
+
+    def merge(self, items):
+        """Add keys derived by a cache preloaded from this one's snapshot()"""
+        with self._lock:
+            for key, keys in items:
+                self._store(key, keys)
+
+    def clear(self):
+        """Forget every key, and digest passwords under a new key from now on"""
+        with self._lock:
+            self._keys.clear()
+            self._digest_key = os.urandom(32)
+            self.hits = self.misses = 0
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Memory-mapped archive reader
+
+MappedZipFile maps the whole archive and parses the end record, the ZIP64
+records and the central directory with struct.unpack_from straight out of
+the mapping. Local headers are read the same way, and WinZip AES payloads
+reach the decryptor as memoryview slices of the mapping, so no bytes are
+copied and no seek/read round trips happen on the way. Other entries go
+through zipfile's normal reader on the underlying file.
+
+Mapping can fail (32-bit address space, special files, empty files);
+open_zip() then falls back to a regular AESZipFile. Split archives open
+as a volumes.SplitZipFile, which shares the end record and central
+directory parsers below.
+"""
+
+import mmap
+import struct
+import zipfile
+from collections import namedtuple
+
+from .winzip import AESZipFile, _LOCAL_HEADER, _LOCAL_HEADER_MAGIC
+
+_EOCD = struct.Struct("<4s4H2LH")
+_EOCD_MAGIC = b"PK\005\006"
+_ZIP64_LOCATOR = struct.Struct("<4sLQL")
+_ZIP64_LOCATOR_MAGIC = b"PK\006\007"
+_ZIP64_EOCD = struct.Struct("<4sQ2H2L4Q")
+_ZIP64_EOCD_MAGIC = b"PK\006\006"
+_CENTRAL_DIR = struct.Struct("<4s4B4HL2L5H2L")
+_CENTRAL_DIR_MAGIC = b"PK\001\002"
+
+_ZIP64_EXTRA_ID = 0x0001
+_MAX_COMMENT = 0xFFFF
+_UTF8_FLAG = 0x800
+
+
+def _read_zip64_extra(zinfo, volume):
+    """Replace 0xFFFFFFFF placeholders with the values in the ZIP64 extra field"""
+    extra = zinfo.extra
+    pos = 0
+    while pos + 4 <= len(extra):
+        header_id, size = struct.unpack_from("<HH", extra, pos)
+        if header_id == _ZIP64_EXTRA_ID:
+            values = extra[pos + 4:pos + 4 + size]
+            offset = 0
+
+            def take():
+                nonlocal offset
+                if offset + 8 > len(values):
+                    raise zipfile.BadZipFile(
+                        "Corrupt zip64 extra field for file %r" % zinfo.filename)
+                value = struct.unpack_from("<Q", values, offset)[0]
+                offset += 8
+                return value
+
+            if zinfo.file_size == 0xFFFFFFFF:
+                zinfo.file_size = take()
+            if zinfo.compress_size == 0xFFFFFFFF:
+                zinfo.compress_size = take()
+            if zinfo.header_offset == 0xFFFFFFFF:
+                zinfo.header_offset = take()
+            if volume == 0xFFFF and offset + 4 <= len(values):
+                volume = struct.unpack_from("<L", values, offset)[0]
+            return volume
+        pos += 4 + size
+    return volume
+
+
+# Where the central directory is, from the (ZIP64) end of central directory
+# record. cd_disk is the volume it starts on and offset_cd its offset there;
+# cd_end is the position of the end records in the buffer that was searched.
+EndRecord = namedtuple("EndRecord", "disk_count cd_disk size_cd offset_cd cd_end comment")
+
+
+def find_end_record(raw):
+    """Locate and decode the end records at the end of raw (bytes or mmap)"""
+    size = len(raw)
+    tail_start = max(0, size - _EOCD.size - _MAX_COMMENT)
+    eocd = raw.rfind(_EOCD_MAGIC, tail_start)
+    if eocd < 0 or eocd + _EOCD.size > size:
+        raise zipfile.BadZipFile("File is not a zip file")
+    _, disk, cd_disk, _, _, size_cd, offset_cd, comment_length = _EOCD.unpack_from(raw, eocd)
+    comment = bytes(raw[eocd + _EOCD.size:eocd + _EOCD.size + comment_length])
+    disk_count = disk + 1
+
+    # ZIP64 end record, found through the locator just before the end record
+    cd_end = eocd
+    locator = eocd - _ZIP64_LOCATOR.size
+    if locator >= 0 and raw[locator:locator + 4] == _ZIP64_LOCATOR_MAGIC:
+        disk_count = _ZIP64_LOCATOR.unpack_from(raw, locator)[3]
+        record = locator - _ZIP64_EOCD.size
+        if record < 0 or raw[record:record + 4] != _ZIP64_EOCD_MAGIC:
+            raise zipfile.BadZipFile("Corrupt zip64 end of central directory record")
+        cd_disk, _, _, size_cd, offset_cd = _ZIP64_EOCD.unpack_from(raw, record)[5:]
+        cd_end = record
+    return EndRecord(disk_count, cd_disk, size_cd, offset_cd, cd_end, comment)
+
+
+def parse_central_directory(raw, pos, end, encoding, filelist, name_to_info, concat=0,
+                            volume_starts=None):
+    """Append a ZipInfo per central directory record in raw[pos:end]
+
+    Local header offsets are made absolute: relative to the start of their
+    volume in volume_starts when given (spanned archives), otherwise
+    shifted by concat.
+    """
+    size = len(raw)
+    unpack = _CENTRAL_DIR.unpack_from
+    header_size = _CENTRAL_DIR.size
+    ZipInfo = zipfile.ZipInfo
+    while pos < end:
+        if pos + header_size > size:
+            raise zipfile.BadZipFile("Truncated central directory")
+        (magic, create_version, create_system, extract_version, reserved,
+         flag_bits, compress_type, t, d, crc, compress_size, file_size,
+         name_length, extra_length, comment_length, volume,
+         internal_attr, external_attr, header_offset) = unpack(raw, pos)
+        if magic != _CENTRAL_DIR_MAGIC:
+            raise zipfile.BadZipFile("Bad magic number for central directory")
+        if extract_version > zipfile.MAX_EXTRACT_VERSION:
+            raise NotImplementedError("zip file version %.1f" % (extract_version / 10))
+        pos += header_size
+        name_end = pos + name_length
+        extra_end = name_end + extra_length
+        comment_end = extra_end + comment_length
+        filename = raw[pos:name_end].decode(
+            "utf-8" if flag_bits & _UTF8_FLAG else encoding)
+        pos = comment_end
+
+        zinfo = ZipInfo(filename)
+        zinfo.extra = raw[name_end:extra_end]
+        zinfo.comment = raw[extra_end:comment_end]
+        zinfo.create_version = create_version
+        zinfo.create_system = create_system
+        zinfo.extract_version = extract_version
+        zinfo.reserved = reserved
+        zinfo.flag_bits = flag_bits
+        zinfo.compress_type = compress_type
+        zinfo.CRC = crc
+        zinfo.compress_size = compress_size
+        zinfo.file_size = file_size
+        zinfo.header_offset = header_offset
+        zinfo.internal_attr = internal_attr
+        zinfo.external_attr = external_attr
+        zinfo._raw_time = t
+        zinfo.date_time = ((d >> 9) + 1980, (d >> 5) & 0xF, d & 0x1F,
+                           t >> 11, (t >> 5) & 0x3F, (t & 0x1F) * 2)
+        if 0xFFFFFFFF in (file_size, compress_size, header_offset) or volume == 0xFFFF:
+            volume = _read_zip64_extra(zinfo, volume)
+        zinfo.volume = volume
+        if volume_starts is None:
+            zinfo.header_offset += concat
+        elif volume < len(volume_starts):
+            zinfo.header_offset += volume_starts[volume]
+        else:
+            raise zipfile.BadZipFile("File %r is on missing volume %d" % (filename, volume + 1))
+        filelist.append(zinfo)
+        name_to_info[filename] = zinfo
+
+
+class MappedZipFile(AESZipFile):
+    """Read-only AESZipFile over a memory mapping of the archive"""
+
+    def __init__(self, file, mode="r", **kwargs):
+        if mode != "r":
+            raise ValueError("MappedZipFile is read-only")
+        self._file = open(file, "rb") if isinstance(file, (str, bytes)) or \
+            hasattr(file, "__fspath__") else file
+        try:
+            try:
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files cannot be mapped
+                raise zipfile.BadZipFile("File is not a zip file")
+            self._view = memoryview(self._map)
+            super().__init__(self._file, "r", **kwargs)
+        except BaseException:
+            self._release()
+            raise
+
+    def _release(self):
+        view = getattr(self, "_view", None)
+        if view is not None:
+            self._view = None
+            view.release()
+        mapping = getattr(self, "_map", None)
+        if mapping is not None:
+            self._map = None
+            try:
+                mapping.close()
+            except BufferError:
+                # An entry stream still holds a slice; the GC unmaps it later
+                pass
+        if getattr(self, "_file", None) is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        super().close()
+        self._release()
+
+    def _RealGetContents(self):
+        """Parse the central directory in place from the mapping"""
+        end = find_end_record(self._map)
+        self._comment = end.comment
+        self.disk_count = end.disk_count
+
+        # Data prepended to the archive (self-extractors) shifts every offset
+        concat = end.cd_end - end.size_cd - end.offset_cd
+        self.start_dir = end.offset_cd + concat
+        if self.start_dir < 0:
+            raise zipfile.BadZipFile("Bad offset for central directory")
+        parse_central_directory(self._map, self.start_dir, self.start_dir + end.size_cd,
+                                getattr(self, "metadata_encoding", None) or "cp437",
+                                self.filelist, self.NameToInfo, concat)
+
+    def _data_offset(self, zinfo):
+        offset = zinfo.header_offset
+        if offset + _LOCAL_HEADER.size > len(self._view):
+            raise zipfile.BadZipFile("Truncated file header")
+        fields = _LOCAL_HEADER.unpack_from(self._view, offset)
+        if fields[0] != _LOCAL_HEADER_MAGIC:
+            raise zipfile.BadZipFile("Bad magic number for file header")
+        return offset + _LOCAL_HEADER.size + fields[10] + fields[11]
+
+    def _raw_reader(self, zinfo):
+        """read(n) over an entry's raw bytes, as zero-copy slices of the mapping"""
+        view = self._view
+        position = [self._data_offset(zinfo)]
+
+        def read_raw(n):
+            start = position[0]
+            data = view[start:start + n]
+            position[0] += len(data)
+            return data
+        return read_raw
+
+
+def open_zip(path, mapped=True):
+    """Open an archive for reading, memory-mapped when possible
+
+    Any volume of a split archive opens the whole set as a SplitZipFile.
+    """
+    # volumes builds on this module, so it cannot be imported at the top
+    from .volumes import SplitZipFile, find_volumes
+
+    volumes = find_volumes(path)
+    if volumes is not None:
+        return SplitZipFile(volumes)
+    if mapped:
+        try:
+            return MappedZipFile(path)
+        except (OSError, OverflowError, mmap.error):
+            pass
+    return AESZipFile(path, 'r')
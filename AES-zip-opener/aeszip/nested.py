@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Recursive extraction of archives inside archives
+
+NestedExtractor extracts an archive like zipfile's extract(), except that
+members that are themselves ZIP archives are not written out: each is
+decrypted and decompressed into a SpooledTemporaryFile, which stays in
+memory up to spill_bytes and only then moves to a temporary file, and is
+opened from there and extracted into a folder named after it (docs/a.zip
+becomes docs/a/). Inner archives are read with the outer password.
+
+Nesting is the classic zip bomb, so every level is guarded:
+
+  max_depth   inner archives below this depth are extracted as plain files
+  max_ratio   an entry of at least RATIO_MIN_BYTES whose declared size is
+              more than max_ratio times its compressed size is refused, and
+              the whole run may not produce more than max_ratio times the
+              outer archive's size
+  streaming   an entry may not produce more bytes than its header declares
+
+Any breach raises core.ZipBombError before the bytes reach the disk.
+"""
+
+import os
+import shutil
+import zipfile
+from collections import namedtuple
+
+from .core import ZipBombError
+from .incremental import local_path, restore_mtime
+from .winzip import CHUNK_SIZE, AESZipFile
+
+NestedLimits = namedtuple("NestedLimits", "max_depth spill_bytes max_ratio",
+                          defaults=(3, 64 * 1024 * 1024, 250))
+
+# Members opened as inner archives rather than written out
+INNER_EXTENSIONS = (".zip",)
+
+# Entries smaller than this are never refused for their compression ratio
+RATIO_MIN_BYTES = 1024 * 1024
+
+
+class NestedExtractor:
+    """Extracts an open archive, descending into the archives it contains
+
+    on_read is told about every chunk read from an inner archive (the
+    caller's callback on the outer archive stays in place); on_entry is
+    called after each top-level entry. archives counts the inner archives
+    opened.
+    """
+
+    def __init__(self, pwd, limits=None, archive_size=0, key_cache=None, tracer=None,
+                 on_read=None, on_entry=None):
+        self.pwd = pwd
+        self.limits = limits or NestedLimits()
+        self.max_total_bytes = max(RATIO_MIN_BYTES, archive_size * self.limits.max_ratio)
+        self.key_cache = key_cache
+        self.tracer = tracer
+        self.on_read = on_read
+        self.on_entry = on_entry
+        self.archives = 0
+        self.total_bytes = 0
+        self._entry = None
+        self._entry_bytes = 0
+
+    def _guard(self, forward):
+        """read_callback enforcing the streaming limits, then calling forward"""
+        def on_read(count):
+            self._entry_bytes += count
+            self.total_bytes += count
+            if self._entry_bytes > self._entry.file_size:
+                raise ZipBombError(f"{self._entry.filename} expands beyond the "
+                                   f"{self._entry.file_size} bytes its header declares")
+            if self.total_bytes > self.max_total_bytes:
+                raise ZipBombError(f"Nested extraction stopped after {self.total_bytes} bytes, "
+                                   f"over {self.limits.max_ratio}x the archive size")
+            if forward is not None:
+                forward(count)
+        return on_read
+
+    def _start_entry(self, zinfo, label):
+        ratio = zinfo.file_size / max(1, zinfo.compress_size)
+        if zinfo.file_size >= RATIO_MIN_BYTES and ratio > self.limits.max_ratio:
+            raise ZipBombError(f"{label}: {zinfo.filename} would expand {ratio:.0f}x "
+                               f"(limit {self.limits.max_ratio}x)")
+        self._entry = zinfo
+        self._entry_bytes = 0
+
+    def extract(self, zip_file, extract_dir, members=None, depth=0, label=None):
+        """Extract members (default all) of zip_file into extract_dir"""
+        label = label or zip_file.filename
+        zip_file.read_callback = self._guard(zip_file.read_callback if depth == 0
+                                             else self.on_read)
+        for member in members or zip_file.infolist():
+            zinfo = member if isinstance(member, zipfile.ZipInfo) else zip_file.getinfo(member)
+            self._start_entry(zinfo, label)
+            if not zinfo.is_dir() and depth < self.limits.max_depth and \
+                    zinfo.filename.lower().endswith(INNER_EXTENSIONS):
+                self._extract_inner(zip_file, zinfo, extract_dir, depth, label)
+            else:
+                target = zip_file.extract(zinfo, extract_dir)
+                if not zinfo.is_dir():
+                    restore_mtime(target, zinfo)
+            if depth == 0 and self.on_entry is not None:
+                self.on_entry()
+
+    def _extract_inner(self, zip_file, zinfo, extract_dir, depth, label):
+        """Open an inner archive from memory (or a spill file) and extract it"""
+        # Only nested runs need tempfile
+        import tempfile
+
+        with tempfile.SpooledTemporaryFile(max_size=self.limits.spill_bytes) as spool:
+            with zip_file.open(zinfo) as source:
+                shutil.copyfileobj(source, spool, CHUNK_SIZE)
+            spool.seek(0)
+            try:
+                inner = AESZipFile(spool)
+            except (zipfile.BadZipFile, OSError):
+                # Named like an archive but is not one: keep it as a file
+                spool.seek(0)
+                target = local_path(extract_dir, zinfo.filename)
+                os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+                with open(target, "wb") as f:
+                    shutil.copyfileobj(spool, f, CHUNK_SIZE)
+                restore_mtime(target, zinfo)
+                return
+            with inner:
+                self.archives += 1
+                inner.key_cache = self.key_cache
+                inner.tracer = self.tracer
+                if self.pwd:
+                    inner.setpassword(self.pwd)
+                target_dir = os.path.splitext(local_path(extract_dir, zinfo.filename))[0]
+                self.extract(inner, target_dir, None, depth + 1,
+                             f"{label}/{zinfo.filename}")
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+Per-entry parallel extraction and testing over a process pool
+
+Entries are sorted largest first and packed into batches so a few huge
+files do not end up queued behind each other at the end of the run. Every
+worker process opens its own handle on the archive; the output layout is
+the same as AESZipFile.extractall().
+"""
+
+import lzma
+import os
+import posixpath
+import queue
+import time
+import zipfile
+import zlib
+from collections import namedtuple
+
+from .incremental import restore_mtime
+from .keycache import DerivedKeyCache
+from .mapped import open_zip
+from .trace import Tracer, null_span
+from .winzip import CHUNK_SIZE
+
+# One line of an integrity test report. status is "ok", "bad-crc",
+# "bad-hmac", "bad-password" or "corrupt"; bytes counts what was read.
+EntryResult = namedtuple("EntryResult", "name status bytes seconds error")
+
+# Small entries are grouped until a batch holds roughly this many bytes
+BATCH_BYTES = 8 * 1024 * 1024
+# ... or this many entries, since each entry has a fixed cost (key derivation)
+BATCH_ENTRIES = 64
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def plan_batches(infos, batch_bytes=BATCH_BYTES, workers=1, batch_entries=BATCH_ENTRIES):
+    """Group entries into batches, largest entries first
+
+    With several workers both limits shrink so that there are at least as
+    many batches as workers whenever there are that many entries.
+    """
+    infos = sorted(infos, key=lambda i: i.file_size, reverse=True)
+    if workers > 1:
+        total = sum(info.file_size for info in infos)
+        batch_bytes = max(1, min(batch_bytes, total // workers))
+        batch_entries = max(1, min(batch_entries, len(infos) // workers))
+    batches = []
+    current, current_bytes = [], 0
+    for info in infos:
+        if info.file_size >= batch_bytes:
+            batches.append([info.filename])
+            continue
+        current.append(info.filename)
+        current_bytes += info.file_size
+        if current_bytes >= batch_bytes or len(current) >= batch_entries:
+            batches.append(current)
+            current, current_bytes = [], 0
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _open_batch(path, pwd, on_read, key_cache, tracer):
+    with (tracer.span if tracer is not None else null_span)("open"):
+        zip_file = open_zip(path)
+    if pwd:
+        zip_file.setpassword(pwd)
+    zip_file.read_callback = on_read
+    zip_file.key_cache = key_cache
+    zip_file.tracer = tracer
+    return zip_file
+
+
+def _extract_batch(path, pwd, names, extract_dir, on_read=None, on_entry=None,
+                   key_cache=None, tracer=None):
+    """Extract a batch of entries through a private archive handle"""
+    written = 0
+    with _open_batch(path, pwd, on_read, key_cache, tracer) as zip_file:
+        span = tracer.span if tracer is not None else null_span
+        for name in names:
+            zinfo = zip_file.getinfo(name)
+            target = zip_file.extract(zinfo, extract_dir)
+            with span("set-mtime", "io"):
+                restore_mtime(target, zinfo)
+            written += zinfo.file_size
+            if on_entry is not None:
+                on_entry()
+    return written
+
+
+def _test_entry(zip_file, name, chunk_size=CHUNK_SIZE):
+    """Read one entry to the end so its CRC / HMAC is checked"""
+    start = time.perf_counter()
+    size = 0
+    status, error = "ok", None
+    try:
+        with zip_file.open(name) as f:
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    break
+                size += len(data)
+    except zipfile.BadZipFile as e:
+        status, error = ("bad-hmac" if "HMAC" in str(e) else "bad-crc"
+                         if "CRC" in str(e) else "corrupt"), str(e)
+    except RuntimeError as e:
+        if "password" not in str(e):
+            raise
+        status, error = "bad-password", str(e)
+    except (EOFError, NotImplementedError, OSError, zlib.error, lzma.LZMAError) as e:
+        status, error = "corrupt", f"{type(e).__name__}: {e}"
+    return EntryResult(name, status, size, time.perf_counter() - start, error)
+
+
+def _test_batch(path, pwd, names, on_read=None, on_entry=None, key_cache=None, tracer=None):
+    """Test a batch of entries, carrying on past broken ones"""
+    results = []
+    with _open_batch(path, pwd, on_read, key_cache, tracer) as zip_file:
+        span = tracer.span if tracer is not None else null_span
+        for name in names:
+            with span("test-entry", "entry", entry=name):
+                results.append(_test_entry(zip_file, name))
+            if on_entry is not None:
+                on_entry()
+    return results
+
+
+# Set in each pool worker: queue of (bytes, entries) progress increments
+_progress_queue = None
+# Set in each pool worker: derived keys preloaded from the parent's cache, which
+# also collects the keys derived here for the parent
+_key_cache = None
+# Set in each pool worker: whether batches are traced for the parent
+_trace = False
+# Set in each pool worker: multiprocessing.Event the parent sets to stop every batch
+_cancel_event = None
+
+# Worker progress is batched to about this many bytes per message
+PROGRESS_STEP = 1024 * 1024
+
+
+class BatchCancelled(Exception):
+    """Raised inside a pool worker when the parent stops the run"""
+
+
+def _init_worker(progress_queue, keys=None, trace=False, cancel_event=None):
+    global _progress_queue, _key_cache, _trace, _cancel_event
+    _progress_queue = progress_queue
+    _key_cache = DerivedKeyCache(preload=keys) if keys is not None else None
+    _trace = trace
+    _cancel_event = cancel_event
+
+
+def _run_batch_in_worker(func, path, pwd, names, *args):
+    """Pool entry point: run one batch, streaming progress to the parent
+
+    Every chunk read checks the parent's cancel event, so a cancelled run
+    stops within a chunk even in the middle of a large entry.
+    Returns (batch result, Tracer.state() or None, keys derived for the
+    parent's key cache).
+    """
+    tracer = Tracer() if _trace else None
+    pending = [0]
+
+    def on_read(count):
+        if _cancel_event is not None and _cancel_event.is_set():
+            raise BatchCancelled("Operation cancelled")
+        if _progress_queue is None:
+            return
+        pending[0] += count
+        if pending[0] >= PROGRESS_STEP:
+            _progress_queue.put((pending[0], 0))
+            pending[0] = 0
+
+    def on_entry():
+        if _progress_queue is not None:
+            _progress_queue.put((pending[0], 1))
+            pending[0] = 0
+
+    result = func(path, pwd, names, *args, on_read=on_read, on_entry=on_entry,
+                  key_cache=_key_cache, tracer=tracer)
+    derived = _key_cache.take_derived() if _key_cache is not None else []
+    return result, tracer.state() if tracer is not None else None, derived
+
+
+def _run_batches(func, path, pwd, batches, args=(), workers=None, token=None,
+                 tracker=None, key_cache=None, tracer=None, on_pool=None):
+    """Run func over every batch, in this process or a pool; yields batch results
+
+    func(path, pwd, names, *args, on_read=, on_entry=, key_cache=, tracer=)
+    must be a module-level function so it can be sent to worker processes.
+    Spans traced and keys derived in workers are merged into tracer and
+    key_cache. on_pool, if given, is called with the number of worker
+    processes when a pool is started.
+    """
+    workers = workers or default_workers()
+    if workers <= 1 or len(batches) <= 1:
+        def on_read(count):
+            if tracker is not None:
+                tracker.add_bytes(count)
+            if token is not None:
+                token.check()
+        on_entry = tracker.add_entries if tracker is not None else None
+        for batch in batches:
+            yield func(path, pwd, batch, *args, on_read=on_read, on_entry=on_entry,
+                       key_cache=key_cache, tracer=tracer)
+        return
+
+    # Only pool runs pay for importing multiprocessing
+    import multiprocessing
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    progress_queue = multiprocessing.Queue() if tracker is not None else None
+    cancel_event = multiprocessing.Event()
+    pool_workers = min(workers, len(batches))
+    if on_pool is not None:
+        on_pool(pool_workers)
+    pool = ProcessPoolExecutor(max_workers=pool_workers,
+                               initializer=_init_worker,
+                               initargs=(progress_queue,
+                                         key_cache.snapshot() if key_cache is not None else None,
+                                         tracer is not None, cancel_event))
+    futures = [pool.submit(_run_batch_in_worker, func, path, pwd, batch, *args)
+               for batch in batches]
+    try:
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            for future in done:
+                result, trace_state, derived = future.result()
+                if trace_state is not None:
+                    tracer.merge(trace_state)
+                if derived:
+                    key_cache.merge(derived)
+                yield result
+            _drain(progress_queue, tracker)
+            if token is not None:
+                token.check()
+    except BaseException:
+        # Cancelled, failed or abandoned: running batches stop at their next chunk
+        cancel_event.set()
+        raise
+    finally:
+        # Batches not yet started are dropped
+        pool.shutdown(wait=True, cancel_futures=True)
+        _drain(progress_queue, tracker)
+
+
+def _select(zip_file, members):
+    return zip_file.infolist() if members is None else [zip_file.getinfo(m) for m in members]
+
+
+def extract_parallel(path, pwd, extract_dir, members=None, workers=None, token=None,
+                     tracker=None, key_cache=None, tracer=None, on_pool=None):
+    """Extract entries across a pool of worker processes, returning bytes written
+
+    tracker, when given, is a progress.ProgressTracker fed with bytes and
+    entries as the workers report them. Keys already in key_cache (a
+    keycache.DerivedKeyCache) are handed to every worker so they are not
+    derived again, and the keys the workers derive are added to it. tracer,
+    a trace.Tracer, receives the phases timed in every process. on_pool is
+    told how many worker processes were started, if any.
+    """
+    with open_zip(path) as zip_file:
+        if pwd:
+            zip_file.setpassword(pwd)
+        infos = _select(zip_file, members)
+        # Directories are cheap; create them up front so workers never race on them.
+        # Extracting a synthetic directory entry reuses zipfile's path sanitising.
+        files = [info for info in infos if not info.is_dir()]
+        parents = {posixpath.dirname(info.filename) for info in files}
+        dirs = {info.filename for info in infos if info.is_dir()}
+        dirs.update(parent + '/' for parent in parents if parent)
+        for name in sorted(dirs):
+            zip_file.extract(zipfile.ZipInfo(name), extract_dir)
+
+    if tracker is not None:
+        tracker.total_bytes = sum(info.file_size for info in files)
+        tracker.total_entries = len(files)
+
+    workers = workers or default_workers()
+    batches = plan_batches(files, workers=workers)
+    return sum(_run_batches(_extract_batch, path, pwd, batches, (extract_dir,),
+                            workers, token, tracker, key_cache, tracer, on_pool))
+
+
+def test_parallel(path, pwd, members=None, workers=None, token=None, tracker=None,
+                  key_cache=None, tracer=None, on_pool=None):
+    """Verify the CRC / AES HMAC of every entry, returning a list of EntryResult
+
+    Unlike testzip() this does not stop at the first bad entry. Results are
+    in archive order; arguments are as for extract_parallel().
+    """
+    with open_zip(path) as zip_file:
+        files = [info for info in _select(zip_file, members) if not info.is_dir()]
+    if tracker is not None:
+        tracker.total_bytes = sum(info.file_size for info in files)
+        tracker.total_entries = len(files)
+
+    results = {}
+    workers = workers or default_workers()
+    batches = plan_batches(files, workers=workers)
+    for batch_results in _run_batches(_test_batch, path, pwd, batches, (),
+                                      workers, token, tracker, key_cache, tracer, on_pool):
+        results.update((result.name, result) for result in batch_results)
+    return [results[info.filename] for info in files]
+
+
+def _drain(progress_queue, tracker):
+    if progress_queue is None:
+        return
+    while True:
+        try:
+            count, entries = progress_queue.get_nowait()
+        except queue.Empty:
+            return
+        tracker.bytes_done += count
+        tracker.add_entries(entries)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory entry previews
+
+A preview is the first PREVIEW_LIMIT bytes of one entry, decrypted and
+decompressed straight into memory; nothing is written to disk. Recent
+previews are kept in a byte-bounded LRU keyed by the archive's identity
+(path, size, mtime) and the entry name, so flipping back and forth between
+files does not touch the archive again.
+"""
+
+import threading
+from collections import OrderedDict, namedtuple
+
+from .volumes import archive_key
+
+# Bytes read from an entry for a preview
+PREVIEW_LIMIT = 1024 * 1024
+
+# Total bytes of previews kept in memory
+DEFAULT_CACHE_BYTES = 32 * 1024 * 1024
+
+# Bytes shown as a hex dump when an entry is not text
+HEX_DUMP_LIMIT = 64 * 1024
+
+# size is the entry's full uncompressed size when known
+Preview = namedtuple("Preview", "name data size truncated")
+
+
+class PreviewCache:
+    """Byte-bounded, thread-safe LRU of Preview objects"""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._previews = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _key(self, path, name):
+        archive = archive_key(path)
+        return None if archive is None else archive + (name,)
+
+    def get(self, path, name):
+        key = self._key(path, name)
+        with self._lock:
+            preview = self._previews.get(key)
+            if preview is not None:
+                self._previews.move_to_end(key)
+            return preview
+
+    def put(self, path, preview):
+        key = self._key(path, preview.name)
+        if key is None or len(preview.data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._previews.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.data)
+            self._previews[key] = preview
+            self._bytes += len(preview.data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._previews.popitem(last=False)
+                self._bytes -= len(evicted.data)
+
+    def clear(self):
+        with self._lock:
+            self._previews.clear()
+            self._bytes = 0
+
+
+def is_text(data):
+    """Guess whether data is text worth showing as such"""
+    sample = data[:8192]
+    if b"\0" in sample:
+        return False
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off by the sample boundary is fine
+        if e.start < len(sample) - 3:
+            return False
+    return True
+
+
+def hex_dump(data, limit=HEX_DUMP_LIMIT):
+    lines = []
+    for offset in range(0, min(len(data), limit), 16):
+        row = data[offset:offset + 16]
+        hex_part = " ".join(f"{b:02x}" for b in row)
+        text_part = "".join(chr(b) if 32 <= b < 127 else "." for b in row)
+        lines.append(f"{offset:08x}  {hex_part:<47}  {text_part}")
+    if len(data) > limit:
+        lines.append(f"... {len(data) - limit} more bytes")
+    return "\n".join(lines)
+
+
+def render_preview(preview):
+    """Text for a preview window: decoded text, or a hex dump for binary data"""
+    if is_text(preview.data):
+        text = preview.data.decode("utf-8", errors="replace")
+    else:
+        text = hex_dump(preview.data)
+    if preview.truncated:
+        shown = len(preview.data)
+        total = f" of {preview.size}" if preview.size is not None else ""
+        text += f"\n\n[Preview shows the first {shown}{total} bytes]"
+    return text
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Byte-level progress, throughput and ETA
+
+ProgressTracker turns "bytes written / entries finished so far" (or a bare
+percentage, as 7-Zip reports it) into snapshots with percent, MB/s,
+entries/s, ETA and CPU utilization of this process. CPU close to 100% of
+one core means the run is CPU-bound (decryption/decompression); a low value
+at low MB/s points at the disk.
+"""
+
+import re
+import time
+from collections import namedtuple
+
+ProgressSnapshot = namedtuple(
+    "ProgressSnapshot",
+    "percent bytes_done total_bytes entries_done total_entries "
+    "mb_per_s entries_per_s eta_seconds elapsed cpu_percent")
+
+# How often callbacks fire, in seconds
+REPORT_INTERVAL = 0.1
+
+_7ZIP_PROGRESS = re.compile(r"^\s*(\d{1,3})%(?:\s+(\d+))?")
+
+
+class ProgressTracker:
+    """Accumulates progress and reports throttled snapshots to a callback"""
+
+    def __init__(self, callback=None, total_bytes=None, total_entries=None,
+                 interval=REPORT_INTERVAL, clock=time.monotonic, measure_cpu=True):
+        self.callback = callback
+        self.total_bytes = total_bytes
+        self.total_entries = total_entries
+        self.bytes_done = 0
+        self.entries_done = 0
+        self.percent = None
+        self.interval = interval
+        self._clock = clock
+        self._start = clock()
+        # CPU is only meaningful when the work happens in this process
+        self._cpu_start = time.process_time() if measure_cpu else None
+        self._last_report = None
+
+    def add_bytes(self, count):
+        self.bytes_done += count
+        self._maybe_report()
+
+    def add_entries(self, count=1):
+        self.entries_done += count
+        self._maybe_report()
+
+    def set_percent(self, percent, entries_done=None):
+        """Progress known only as a percentage (7-Zip)"""
+        self.percent = percent
+        if self.total_bytes:
+            self.bytes_done = self.total_bytes * percent // 100
+        if entries_done is not None:
+            self.entries_done = entries_done
+        self._maybe_report()
+
+    def snapshot(self):
+        elapsed = max(self._clock() - self._start, 1e-6)
+        if self.total_bytes:
+            percent = min(100.0, 100.0 * self.bytes_done / self.total_bytes)
+        elif self.percent is not None:
+            percent = float(self.percent)
+        elif self.total_entries:
+            percent = min(100.0, 100.0 * self.entries_done / self.total_entries)
+        else:
+            percent = None
+
+        eta = None
+        if percent:
+            eta = elapsed * (100.0 - percent) / percent
+        cpu = None
+        if self._cpu_start is not None:
+            cpu = 100.0 * (time.process_time() - self._cpu_start) / elapsed
+        return ProgressSnapshot(percent, self.bytes_done, self.total_bytes,
+                                self.entries_done, self.total_entries,
+                                self.bytes_done / elapsed / (1024 * 1024),
+                                self.entries_done / elapsed, eta, elapsed, cpu)
+
+    def _maybe_report(self):
+        if self.callback is None:
+            return
+        now = self._clock()
+        if self._last_report is None or now - self._last_report >= self.interval:
+            self._last_report = now
+            self.callback(self.snapshot())
+
+    def finish(self):
+        """Send a final snapshot regardless of throttling"""
+        if self.callback is not None:
+            self.callback(self.snapshot())
+
+
+def iter_7zip_progress(stream, chunk_size=256):
+    """Yield (percent, entries done) from 7-Zip `-bsp1` output
+
+    7-Zip redraws its progress line with backspaces and carriage returns
+    rather than newlines, so the stream is read in small chunks and split
+    on all three.
+    """
+    pending = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        pending += chunk
+        parts = re.split(r"[\b\r\n]+", pending)
+        pending = parts.pop()
+        for part in parts:
+            match = _7ZIP_PROGRESS.match(part)
+            if match:
+                yield int(match.group(1)), int(match.group(2)) if match.group(2) else None
+    match = _7ZIP_PROGRESS.match(pending)
+    if match:
+        yield int(match.group(1)), int(match.group(2)) if match.group(2) else None
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def format_progress(snapshot):
+    """One-line summary, e.g. '42% - 120.5 MB/s - 310 files/s - ETA 0:12'"""
+    parts = []
+    if snapshot.percent is not None:
+        parts.append(f"{snapshot.percent:.0f}%")
+    parts.append(f"{snapshot.mb_per_s:.1f} MB/s")
+    parts.append(f"{snapshot.entries_per_s:.0f} files/s")
+    if snapshot.eta_seconds is not None:
+        parts.append(f"ETA {format_duration(snapshot.eta_seconds)}")
+    if snapshot.cpu_percent is not None:
+        parts.append(f"CPU {snapshot.cpu_percent:.0f}%")
+    return " - ".join(parts)
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Re-packing an archive into another format in one streaming pass
+
+Each entry is decrypted and decompressed chunk by chunk straight into the
+writer for the new format, so nothing is extracted to disk and memory per
+entry stays at a few chunks whatever its size. The output is written to a
+.part file next to the target and renamed into place once complete.
+
+  tar       uncompressed tar
+  tar.zst   tar compressed with Zstandard (needs the zstandard package)
+  zip       ZIP without encryption
+  zip-aes   ZIP re-encrypted with WinZip AES-256 under a new password
+
+Names, modification times and Unix permissions are kept; directories are
+carried over as directory entries.
+"""
+
+import os
+import shutil
+import stat
+import time
+import zipfile
+
+from .winzip import CHUNK_SIZE
+from .writer import AESZipWriter
+
+FORMAT_TAR = "tar"
+FORMAT_TAR_ZST = "tar.zst"
+FORMAT_ZIP = "zip"
+FORMAT_ZIP_AES = "zip-aes"
+FORMATS = (FORMAT_TAR, FORMAT_TAR_ZST, FORMAT_ZIP, FORMAT_ZIP_AES)
+
+# Output extension per format, for naming outputs and guessing formats from them
+EXTENSIONS = {FORMAT_TAR: ".tar", FORMAT_TAR_ZST: ".tar.zst", FORMAT_ZIP: ".zip",
+              FORMAT_ZIP_AES: ".zip"}
+
+DEFAULT_ZSTD_LEVEL = 3
+
+
+def format_for(path, new_password=None):
+    """Output format implied by a file name, or None
+
+    A .zip is re-encrypted when a new password is given.
+    """
+    name = path.lower()
+    if name.endswith((".tar.zst", ".tzst")):
+        return FORMAT_TAR_ZST
+    if name.endswith(".tar"):
+        return FORMAT_TAR
+    if name.endswith(".zip"):
+        return FORMAT_ZIP_AES if new_password else FORMAT_ZIP
+    return None
+
+
+def _mode(zinfo):
+    """Unix permission bits recorded for an entry, or a default"""
+    mode = stat.S_IMODE(zinfo.external_attr >> 16)
+    if mode:
+        return mode
+    return 0o755 if zinfo.is_dir() else 0o644
+
+
+def _mtime(zinfo):
+    try:
+        return time.mktime(zinfo.date_time + (0, 0, -1))
+    except (OverflowError, ValueError):
+        return 0
+
+
+class _TarSink:
+    """Writes entries into a tar stream, optionally through a zstd compressor"""
+
+    def __init__(self, f, compress, level):
+        # Only tar output pays for importing tarfile
+        import tarfile
+
+        self._tarfile = tarfile
+        self._zstd = None
+        if compress:
+            # Only tar.zst output needs zstandard, an optional dependency
+            try:
+                import zstandard
+            except ImportError:
+                raise ValueError("tar.zst output needs the zstandard package "
+                                 "(pip install zstandard)") from None
+            self._zstd = zstandard.ZstdCompressor(level=level or DEFAULT_ZSTD_LEVEL) \
+                .stream_writer(f, closefd=False)
+            f = self._zstd
+        # "w|" writes sequentially, never seeking back
+        self._tar = tarfile.open(fileobj=f, mode="w|", format=tarfile.PAX_FORMAT)
+
+    def add(self, zinfo, source):
+        tarfile = self._tarfile
+        info = tarfile.TarInfo(zinfo.filename.rstrip("/"))
+        info.mtime = _mtime(zinfo)
+        info.mode = _mode(zinfo)
+        if zinfo.is_dir():
+            info.type = tarfile.DIRTYPE
+            self._tar.addfile(info)
+            return
+        info.size = zinfo.file_size
+        with source() as f:
+            self._tar.addfile(info, f)
+            # addfile() stops at the declared size; reading on to the end makes
+            # the archive reader check the entry's CRC or AES authentication code
+            if f.read(1):
+                raise zipfile.BadZipFile(f"{zinfo.filename} is longer than its header declares")
+
+    def close(self):
+        self._tar.close()
+        if self._zstd is not None:
+            self._zstd.close()
+
+    def abort(self):
+        _close_quietly(self)
+
+
+class _ZipSink:
+    """Writes entries into a ZIP, plain or encrypted with a new password"""
+
+    def __init__(self, f, new_password, compress_type, level):
+        self._zip = AESZipWriter(f, "w", compress_type, allowZip64=True, compresslevel=level)
+        self._encrypt = bool(new_password)
+        # Entry being written, until it is closed
+        self._target = None
+        if self._encrypt:
+            self._zip.setpassword(new_password)
+
+    def add(self, zinfo, source):
+        out = zipfile.ZipInfo(zinfo.filename, zinfo.date_time)
+        out.external_attr = zinfo.external_attr
+        out.create_system = zinfo.create_system
+        out.comment = zinfo.comment
+        if zinfo.is_dir():
+            self._zip.writestr(out, b"")
+            return
+        # Known up front, so ZIP64 and AE-1/AE-2 are decided correctly
+        out.file_size = zinfo.file_size
+        zip64 = zinfo.file_size * 1.05 > zipfile.ZIP64_LIMIT
+        if self._encrypt:
+            target = self._zip.open_encrypted(out, force_zip64=zip64)
+        else:
+            target = self._zip.open_plain(out, force_zip64=zip64)
+        self._target = target
+        with source() as f, target:
+            shutil.copyfileobj(f, target, CHUNK_SIZE)
+        self._target = None
+
+    def close(self):
+        self._zip.close()
+
+    def abort(self):
+        # An entry whose source failed to open was never entered, so never closed
+        if self._target is not None:
+            _close_quietly(self._target)
+            self._target = None
+        _close_quietly(self)
+
+
+def _close_quietly(writer):
+    """Finish a failed sink or entry while its file is still open; the output is discarded"""
+    try:
+        writer.close()
+    except Exception:
+        pass
+
+
+def repack(zip_file, output, fmt, new_password=None, members=None,
+           compress_type=zipfile.ZIP_DEFLATED, level=None, on_entry=None, check=None):
+    """Copy members (default all) of an open archive into a new archive at output
+
+    new_password (bytes) is required for zip-aes and ignored otherwise;
+    level is the zstd or deflate level. on_entry is called after each
+    entry and check before it, so a cancelled run stops between entries
+    (or, through the archive's read_callback, within one). A failed run
+    leaves nothing at output.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown output format {fmt!r}")
+    if fmt == FORMAT_ZIP_AES and not new_password:
+        raise ValueError("zip-aes output needs a new password")
+    infos = zip_file.infolist() if members is None else \
+        [zip_file.getinfo(member) for member in members]
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    partial = output + ".part"
+    try:
+        with open(partial, "wb") as f:
+            if fmt in (FORMAT_TAR, FORMAT_TAR_ZST):
+                sink = _TarSink(f, fmt == FORMAT_TAR_ZST, level)
+            else:
+                sink = _ZipSink(f, new_password if fmt == FORMAT_ZIP_AES else None,
+                                compress_type, level)
+            try:
+                for zinfo in infos:
+                    if check is not None:
+                        check()
+                    sink.add(zinfo, lambda: zip_file.open(zinfo))
+                    if on_entry is not None:
+                        on_entry()
+            except BaseException:
+                # Before f closes, so the writer never flushes into a closed file later
+                sink.abort()
+                raise
+            sink.close()
+        os.replace(partial, output)
+    except BaseException:
+        try:
+            os.remove(partial)
+        except OSError:
+            pass
+        raise
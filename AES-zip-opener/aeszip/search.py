@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Content search inside archives, without writing anything to disk
+
+Each entry is streamed through decryption and decompression and matched
+chunk by chunk. Only the unscanned tail of the previous chunk is carried
+over, so memory per entry stays at one chunk plus the window, whatever the
+entry's size. A literal can be found anywhere; a regular expression only
+matches spans of at most `window` bytes, which keeps the carried-over
+tail bounded. Entries are spread over worker processes in the same
+batches as parallel testing.
+
+Patterns are matched on the raw bytes: a literal is encoded (UTF-8 by
+default) and a regular expression is compiled as a bytes pattern, so
+binary entries are searched as well as text.
+"""
+
+import lzma
+import re
+import zipfile
+import zlib
+from collections import namedtuple
+
+from .mapped import open_zip
+from .parallel import _open_batch, _run_batches, default_workers, plan_batches
+from .winzip import CHUNK_SIZE
+
+# offset is in the entry's decompressed data; context is the text around it
+SearchMatch = namedtuple("SearchMatch", "offset length context")
+# One entry's matches; truncated when max_matches stopped the search early
+SearchResult = namedtuple("SearchResult", "name matches truncated error")
+
+# Longest regular expression match, in bytes
+DEFAULT_WINDOW = 4096
+# Matches reported per entry before moving on to the next entry
+DEFAULT_MAX_MATCHES = 100
+# Bytes of context shown on either side of a match
+CONTEXT_BYTES = 40
+
+
+def compile_pattern(pattern, regex=False, ignore_case=False, encoding="utf-8"):
+    """Compile a literal or regular expression into a bytes pattern
+
+    Returns (compiled pattern, overlap): the number of bytes a match may
+    reach back into the previous chunk, or None when that is bounded only
+    by the search window.
+    """
+    flags = re.IGNORECASE if ignore_case else 0
+    if regex:
+        try:
+            return re.compile(pattern.encode(encoding), flags | re.MULTILINE), None
+        except re.error as e:
+            raise ValueError(f"Invalid regular expression: {e}") from None
+    literal = pattern.encode(encoding)
+    if not literal:
+        raise ValueError("Empty search pattern")
+    return re.compile(re.escape(literal), flags), len(literal) - 1
+
+
+def _context(buffer, start, end):
+    text = bytes(buffer[max(0, start - CONTEXT_BYTES):end + CONTEXT_BYTES])
+    return text.decode("utf-8", "replace").replace("\r", " ").replace("\n", " ")
+
+
+def search_stream(stream, pattern, overlap, window=DEFAULT_WINDOW,
+                  max_matches=DEFAULT_MAX_MATCHES, chunk_size=CHUNK_SIZE):
+    """Matches of pattern in a readable stream, in a bounded sliding window
+
+    Returns (list of SearchMatch, truncated).
+    """
+    keep = overlap if overlap is not None else window
+    matches = []
+    buffer = b""
+    base = 0        # offset in the stream of buffer[0]
+    scan_from = 0   # buffer position where the next scan starts
+    while True:
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer = buffer + chunk if buffer else chunk
+        # A match starting past `limit` might still grow into the next chunk
+        limit = len(buffer) if eof else max(scan_from, len(buffer) - keep)
+        for match in pattern.finditer(buffer, scan_from):
+            if match.start() >= limit:
+                break
+            if match.end() == match.start():
+                continue
+            matches.append(SearchMatch(base + match.start(), match.end() - match.start(),
+                                       _context(buffer, match.start(), match.end())))
+            limit = max(limit, match.end())
+            if len(matches) >= max_matches:
+                return matches, not eof
+        if eof:
+            return matches, False
+        # Carry over what has not been scanned yet, plus context for it
+        carry = max(0, min(limit, len(buffer) - keep) - CONTEXT_BYTES)
+        base += carry
+        buffer = buffer[carry:]
+        scan_from = limit - carry
+
+
+def _search_entry(zip_file, name, pattern, overlap, window, max_matches):
+    try:
+        with zip_file.open(name) as f:
+            matches, truncated = search_stream(f, pattern, overlap, window, max_matches)
+        return SearchResult(name, matches, truncated, None)
+    except RuntimeError as e:
+        if "password" not in str(e):
+            raise
+        return SearchResult(name, [], False, str(e))
+    except (zipfile.BadZipFile, EOFError, NotImplementedError, OSError, zlib.error,
+            lzma.LZMAError) as e:
+        return SearchResult(name, [], False, f"{type(e).__name__}: {e}")
+
+
+def _search_batch(path, pwd, names, pattern, overlap, window, max_matches, on_read=None,
+                  on_entry=None, key_cache=None, tracer=None):
+    """Search a batch of entries; entries with neither matches nor errors are left out"""
+    results = []
+    with _open_batch(path, pwd, on_read, key_cache, tracer) as zip_file:
+        for name in names:
+            result = _search_entry(zip_file, name, pattern, overlap, window, max_matches)
+            if result.matches or result.error:
+                results.append(result)
+            if on_entry is not None:
+                on_entry()
+    return results
+
+
+def iter_search(path, pwd, pattern, overlap, members=None, workers=None, token=None,
+                tracker=None, key_cache=None, tracer=None, window=DEFAULT_WINDOW,
+                max_matches=DEFAULT_MAX_MATCHES, on_pool=None):
+    """Yield a list of SearchResult per finished batch of entries
+
+    pattern and overlap come from compile_pattern(); the other arguments
+    are as for parallel.test_parallel().
+    """
+    with open_zip(path) as zip_file:
+        infos = zip_file.infolist() if members is None else \
+            [zip_file.getinfo(member) for member in members]
+    files = [info for info in infos if not info.is_dir()]
+    if tracker is not None:
+        tracker.total_bytes = sum(info.file_size for info in files)
+        tracker.total_entries = len(files)
+    workers = workers or default_workers()
+    yield from _run_batches(_search_batch, path, pwd, plan_batches(files, workers=workers),
+                            (pattern, overlap, window, max_matches),
+                            workers, token, tracker, key_cache, tracer, on_pool)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Per-phase timing and Chrome trace export
+
+A Tracer records named spans (open, derive-key, decrypt, authenticate,
+decompress, read, write, 7-Zip, ...) as complete events with wall-clock
+start and duration, and keeps per-phase totals. save() writes the Chrome
+trace event format, which chrome://tracing, Perfetto and speedscope open
+as a timeline; the totals are included under "otherData".
+
+Code that may be traced takes an optional tracer and uses
+
+    span = tracer.span if tracer is not None else null_span
+
+so an untraced run only pays for entering a shared no-op context manager.
+Pool workers trace into their own Tracer and hand state() back to the
+parent, which merge()s it; perf_counter() is system-wide on the platforms
+we run on, so worker events line up with the parent's.
+"""
+
+import json
+import os
+import threading
+import time
+
+# Events kept for the timeline; phases past this are only added to the totals
+MAX_EVENTS = 200000
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+def null_span(name, cat="phase", **args):
+    """Stand-in for Tracer.span when tracing is off"""
+    return NULL_SPAN
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "cat", "args", "start")
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.add(self.name, self.start, time.perf_counter() - self.start,
+                        self.cat, self.args)
+        return False
+
+
+class Tracer:
+    """Thread-safe recorder of timed spans"""
+
+    def __init__(self, max_events=MAX_EVENTS):
+        self.max_events = max_events
+        self.origin = time.perf_counter()
+        # (name, cat, start, seconds, pid, tid, args); start is perf_counter() time
+        self.events = []
+        # name -> [count, seconds]
+        self.totals = {}
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def span(self, name, cat="phase", **args):
+        """Context manager timing one phase"""
+        return _Span(self, name, cat, args)
+
+    def add(self, name, start, seconds, cat="phase", args=None):
+        event = (name, cat, start, seconds, os.getpid(), threading.get_ident(), args or None)
+        with self._lock:
+            total = self.totals.get(name)
+            if total is None:
+                self.totals[name] = [1, seconds]
+            else:
+                total[0] += 1
+                total[1] += seconds
+            if len(self.events) < self.max_events:
+                self.events.append(event)
+            else:
+                self.dropped += 1
+
+    def state(self):
+        """Picklable (events, totals, dropped) for merge() in another process"""
+        with self._lock:
+            return list(self.events), {name: list(total) for name, total in self.totals.items()}, \
+                self.dropped
+
+    def merge(self, state):
+        events, totals, dropped = state
+        with self._lock:
+            for name, (count, seconds) in totals.items():
+                total = self.totals.setdefault(name, [0, 0.0])
+                total[0] += count
+                total[1] += seconds
+            room = max(0, self.max_events - len(self.events))
+            self.events.extend(events[:room])
+            self.dropped += dropped + max(0, len(events) - room)
+
+    def summary(self):
+        """(name, count, seconds) per phase, most expensive first"""
+        with self._lock:
+            rows = [(name, count, seconds) for name, (count, seconds) in self.totals.items()]
+        return sorted(rows, key=lambda row: row[2], reverse=True)
+
+    def to_chrome(self):
+        """The trace as a Chrome trace event format dict"""
+        with self._lock:
+            events = list(self.events)
+        main_pid = os.getpid()
+        trace_events = []
+        for pid in sorted({event[4] for event in events} | {main_pid}):
+            trace_events.append({"name": "process_name", "ph": "M", "pid": pid,
+                                 "args": {"name": "aeszip" if pid == main_pid
+                                          else f"worker {pid}"}})
+        for name, cat, start, seconds, pid, tid, args in events:
+            event = {"name": name, "cat": cat, "ph": "X", "pid": pid, "tid": tid,
+                     "ts": round((start - self.origin) * 1e6, 1),
+                     "dur": round(seconds * 1e6, 1)}
+            if args:
+                event["args"] = args
+            trace_events.append(event)
+        return {
+            "traceEvents": trace_events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "phases": {name: {"count": count, "seconds": round(seconds, 6)}
+                           for name, count, seconds in self.summary()},
+                "dropped_events": self.dropped,
+            },
+        }
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome(), f)
+
+
+def format_summary(tracer):
+    """Per-phase totals as a small text table"""
+    lines = [f"{'phase':<16} {'count':>8} {'seconds':>10}"]
+    for name, count, seconds in tracer.summary():
+        lines.append(f"{name:<16} {count:>8} {seconds:>10.3f}")
+    if tracer.dropped:
+        lines.append(f"({tracer.dropped} events beyond {tracer.max_events} "
+                     f"kept in the totals only)")
+    return "\n".join(lines)
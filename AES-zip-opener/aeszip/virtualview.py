@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Windowed Treeview over an EntryStore
+
+Only the rows that fit on screen exist as Treeview items; scrolling rewrites
+their text instead of inserting or deleting anything, so the widget costs the
+same for ten entries or ten million. Selection is tracked as store indices.
+"""
+
+import tkinter as tk
+from tkinter import font as tkfont
+from tkinter import ttk
+
+from .core import format_size
+from .entrystore import EntryStore
+
+COLUMNS = ("Size", "Compressed", "Method", "Modified")
+
+# Treeview heading -> EntryStore sort column
+SORT_KEYS = {"#0": "path", "Size": "size", "Compressed": "packed",
+             "Method": "method", "Modified": "modified"}
+
+
+class VirtualTreeview(ttk.Frame):
+    """Archive contents view that materializes only the visible rows"""
+
+    def __init__(self, master, store=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.store = store if store is not None else EntryStore()
+        self.top = 0
+        self.visible = 0
+        self.selected = set()
+        self.anchor = None
+
+        style = ttk.Style(self)
+        self.row_height = tkfont.nametofont("TkDefaultFont").metrics("linespace") + 4
+        style.configure("Virtual.Treeview", rowheight=self.row_height)
+
+        self.tree = ttk.Treeview(self, columns=COLUMNS, show="tree headings",
+                                 style="Virtual.Treeview", selectmode="none")
+        self.tree.heading("#0", text="File Name", command=lambda: self.sort_by("#0"))
+        for column in COLUMNS:
+            self.tree.heading(column, text=column, command=lambda c=column: self.sort_by(c))
+        self.tree.column("#0", width=250)
+        self.tree.column("Size", width=80)
+        self.tree.column("Compressed", width=80)
+        self.tree.column("Method", width=80)
+        self.tree.column("Modified", width=130)
+
+        self.v_scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        h_scrollbar = ttk.Scrollbar(self, orient=tk.HORIZONTAL, command=self.tree.xview)
+        self.tree.configure(xscrollcommand=h_scrollbar.set)
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.v_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        h_scrollbar.grid(row=1, column=0, sticky=(tk.W, tk.E))
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", self._on_wheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(3))
+        self.tree.bind("<Button-1>", self._on_click)
+        self.tree.bind("<Control-Button-1>", lambda e: self._on_click(e, toggle=True))
+        self.tree.bind("<Shift-Button-1>", lambda e: self._on_click(e, extend=True))
+        self.tree.bind("<Up>", lambda e: self._move_selection(-1))
+        self.tree.bind("<Down>", lambda e: self._move_selection(1))
+        self.tree.bind("<Prior>", lambda e: self.scroll(-self.visible))
+        self.tree.bind("<Next>", lambda e: self.scroll(self.visible))
+        self.tree.bind("<Home>", lambda e: self.scroll_to(0))
+        self.tree.bind("<End>", lambda e: self.scroll_to(len(self.store)))
+
+    # Data
+
+    def clear(self):
+        self.store.clear()
+        self.selected.clear()
+        self.anchor = None
+        self.top = 0
+        self.refresh()
+
+    def add_entries(self, entries):
+        """Append entries to the store and redraw"""
+        self.store.extend(entries)
+        self.refresh()
+
+    def selected_paths(self):
+        """Archive paths of the selected entries, in display order"""
+        paths = self.store.paths
+        return [paths[i] for i in self.store.order if i in self.selected]
+
+    def sort_by(self, heading):
+        column = SORT_KEYS[heading]
+        reverse = self.store.sort_column == column and not self.store.sort_reverse
+        self.store.sort(column, reverse)
+        self.anchor = None
+        self.refresh()
+
+    # Scrolling
+
+    def yview(self, *args):
+        """Scrollbar protocol: ("moveto", fraction) or ("scroll", n, "units"/"pages")"""
+        if not args:
+            return self._fractions()
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * len(self.store)))
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            if args[2] == "pages":
+                amount *= max(1, self.visible - 1)
+            self.scroll(amount)
+
+    def scroll(self, rows):
+        return self.scroll_to(self.top + rows)
+
+    def scroll_to(self, top):
+        top = max(0, min(top, len(self.store) - self.visible))
+        if top != self.top:
+            self.top = top
+            self.refresh()
+        return "break"
+
+    def _fractions(self):
+        total = len(self.store)
+        if not total:
+            return 0.0, 1.0
+        return self.top / total, min(1.0, (self.top + self.visible) / total)
+
+    def _on_wheel(self, event):
+        # Windows reports multiples of 120, macOS small deltas
+        steps = -event.delta // 120 if abs(event.delta) >= 120 else -event.delta
+        self.scroll(3 * steps)
+        return "break"
+
+    def _on_resize(self, event):
+        header = self.row_height
+        children = self.tree.get_children()
+        if children:
+            bbox = self.tree.bbox(children[0])
+            if bbox:
+                header = bbox[1]
+        visible = max(1, (event.height - header) // self.row_height)
+        if visible != self.visible:
+            self.visible = visible
+            self.top = max(0, min(self.top, len(self.store) - visible))
+            self.refresh()
+
+    # Rendering
+
+    def refresh(self):
+        """Rewrite the on-screen rows from the store"""
+        rows = max(0, min(self.visible, len(self.store) - self.top))
+        children = list(self.tree.get_children())
+        if len(children) > rows:
+            self.tree.delete(*children[rows:])
+            children = children[:rows]
+        while len(children) < rows:
+            children.append(self.tree.insert("", tk.END, text=""))
+
+        selected_rows = []
+        for offset, iid in enumerate(children):
+            index = self.store.index_at(self.top + offset)
+            entry = self.store.entry(index)
+            self.tree.item(iid, text=entry.path, values=(
+                format_size(entry.size),
+                format_size(entry.packed),
+                entry.method,
+                entry.modified
+            ))
+            if index in self.selected:
+                selected_rows.append(iid)
+        self.tree.selection_set(selected_rows)
+        self.v_scrollbar.set(*self._fractions())
+
+    # Selection
+
+    def _position_at(self, y):
+        iid = self.tree.identify_row(y)
+        if not iid:
+            return None
+        return self.top + self.tree.index(iid)
+
+    def _on_click(self, event, toggle=False, extend=False):
+        if self.tree.identify_region(event.x, event.y) in ("heading", "separator"):
+            return None
+        self.tree.focus_set()
+        position = self._position_at(event.y)
+        if position is None:
+            return "break"
+        index = self.store.index_at(position)
+        if extend and self.anchor is not None:
+            start, end = sorted((self.anchor, position))
+            self.selected = {self.store.index_at(p) for p in range(start, end + 1)}
+        elif toggle:
+            self.selected.symmetric_difference_update((index,))
+            self.anchor = position
+        else:
+            self.selected = {index}
+            self.anchor = position
+        self.refresh()
+        return "break"
+
+    def _move_selection(self, step):
+        if self.anchor is None or not len(self.store):
+            return "break"
+        position = max(0, min(self.anchor + step, len(self.store) - 1))
+        self.anchor = position
+        self.selected = {self.store.index_at(position)}
+        if position < self.top:
+            self.top = position
+        elif position >= self.top + self.visible:
+            self.top = position - self.visible + 1
+        self.refresh()
+        return "break"
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+Split (multi-volume) archives read in place
+
+Two kinds of volume sets are recognised, from any one of their files:
+
+  name.z01, name.z02, ..., name.zip   spanned ZIP (WinZip, Info-ZIP zip -s).
+                                      Offsets in the central directory are
+                                      relative to the volume they point into.
+  name.zip.001, name.zip.002, ...     a plain archive cut into pieces (7-Zip,
+                                      HJSplit, split -b); offsets are as in
+                                      the joined file.
+
+VolumeFile presents the volumes as one seekable, read-only stream. Volumes
+are opened on first use and only a few are held open at a time, so the
+joined archive is never written to disk or held in memory. SplitZipFile
+reads the end records and central directory through it and turns each
+entry's (volume, offset) into a position in that stream.
+"""
+
+import bisect
+import io
+import os
+import re
+import zipfile
+from collections import OrderedDict
+
+from .mapped import _EOCD, _MAX_COMMENT, _ZIP64_EOCD, _ZIP64_LOCATOR, find_end_record, \
+    parse_central_directory
+from .winzip import AESZipFile
+
+_SPANNED_VOLUME = re.compile(r"\.z(\d{2,})$", re.IGNORECASE)
+_NUMBERED_VOLUME = re.compile(r"\.(\d{3,})$")
+
+# Bytes at the end of a volume set searched for the end records
+_TAIL_SIZE = _EOCD.size + _MAX_COMMENT + _ZIP64_LOCATOR.size + _ZIP64_EOCD.size
+
+
+def _existing(base, suffix):
+    """base + suffix in whichever case exists on disk, or None"""
+    for candidate in (base + suffix, base + suffix.upper()):
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def find_volumes(path):
+    """The volumes of the split archive path belongs to, in order, or None
+
+    A .zip with no .z01 next to it, or a .001 piece with no .002, is not a
+    split archive. Raises zipfile.BadZipFile when volumes are missing.
+    """
+    base, ext = os.path.splitext(path)
+    numbered = _NUMBERED_VOLUME.match(ext)
+    if numbered:
+        width = len(numbered.group(1))
+        volumes = []
+        while True:
+            volume = _existing(base, f".{len(volumes) + 1:0{width}d}")
+            if volume is None:
+                break
+            volumes.append(volume)
+        if len(volumes) < 2:
+            # A lone .001, or a file that merely has a numeric extension
+            return None
+        if int(numbered.group(1)) > len(volumes):
+            raise zipfile.BadZipFile(f"Volume {len(volumes) + 1} of {base} not found")
+        return volumes
+
+    if ext.lower() != ".zip" and not _SPANNED_VOLUME.match(ext):
+        return None
+    volumes = []
+    while True:
+        volume = _existing(base, f".z{len(volumes) + 1:02d}")
+        if volume is None:
+            break
+        volumes.append(volume)
+    if not volumes:
+        if ext.lower() != ".zip":
+            raise zipfile.BadZipFile(f"First volume {base}.z01 not found")
+        return None
+    last = _existing(base, ".zip")
+    if last is None:
+        raise zipfile.BadZipFile(f"Last volume {base}.zip not found")
+    return volumes + [last]
+
+
+def archive_size(path):
+    """Bytes in the archive, or in all volumes of the split archive it belongs to"""
+    return sum(os.path.getsize(volume) for volume in find_volumes(path) or [path])
+
+
+def archive_key(path):
+    """(path, size, mtime_ns) identifying one version of an archive, or None if it is gone
+
+    For a split archive size is the sum over its volumes and mtime_ns the
+    newest of them, so replacing any volume gives a new key.
+    """
+    try:
+        volumes = find_volumes(path) or [path]
+    except zipfile.BadZipFile:
+        # Incomplete set: key the named file, opening it will report the rest
+        volumes = [path]
+    try:
+        stats = [os.stat(volume) for volume in volumes]
+    except OSError:
+        return None
+    return (os.path.normcase(os.path.abspath(path)), sum(st.st_size for st in stats),
+            max(st.st_mtime_ns for st in stats))
+
+
+def archive_stem(path):
+    """Archive name without extension or volume suffix: a for a.zip, a.z02, a.zip.001"""
+    base, ext = os.path.splitext(os.path.basename(path))
+    if _NUMBERED_VOLUME.match(ext):
+        base = os.path.splitext(base)[0]
+    return base
+
+
+class VolumeFile(io.RawIOBase):
+    """Seekable read-only stream over the concatenation of several files"""
+
+    # Volume handles kept open; entries rarely straddle more than two
+    MAX_OPEN = 4
+
+    def __init__(self, paths):
+        super().__init__()
+        self.paths = list(paths)
+        self.name = self.paths[-1]
+        self.sizes = [os.path.getsize(path) for path in self.paths]
+        # Position of each volume's first byte in the joined stream
+        self.starts = []
+        position = 0
+        for size in self.sizes:
+            self.starts.append(position)
+            position += size
+        self.size = position
+        self._position = 0
+        self._handles = OrderedDict()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        elif whence != io.SEEK_SET:
+            raise ValueError(f"invalid whence ({whence})")
+        if offset < 0:
+            raise ValueError(f"negative seek position {offset}")
+        self._position = offset
+        return offset
+
+    def _handle(self, index):
+        handle = self._handles.get(index)
+        if handle is None:
+            handle = self._handles[index] = open(self.paths[index], "rb")
+            while len(self._handles) > self.MAX_OPEN:
+                self._handles.popitem(last=False)[1].close()
+        else:
+            self._handles.move_to_end(index)
+        return handle
+
+    def readinto(self, buffer):
+        """Fill buffer, crossing volume boundaries; short only at the end"""
+        view = memoryview(buffer).cast("B")
+        filled = 0
+        while filled < len(view) and self._position < self.size:
+            index = bisect.bisect_right(self.starts, self._position) - 1
+            handle = self._handle(index)
+            handle.seek(self._position - self.starts[index])
+            wanted = min(len(view) - filled,
+                         self.starts[index] + self.sizes[index] - self._position)
+            count = handle.readinto(view[filled:filled + wanted])
+            if not count:
+                raise zipfile.BadZipFile(f"Volume {self.paths[index]} is shorter than expected")
+            filled += count
+            self._position += count
+        return filled
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = max(0, self.size - self._position)
+        buffer = bytearray(size)
+        count = self.readinto(buffer)
+        del buffer[count:]
+        return bytes(buffer)
+
+    def close(self):
+        for handle in self._handles.values():
+            handle.close()
+        self._handles.clear()
+        super().close()
+
+
+class SplitZipFile(AESZipFile):
+    """Read-only AESZipFile over the volumes of a split archive"""
+
+    def __init__(self, volumes, mode="r", **kwargs):
+        if mode != "r":
+            raise ValueError("SplitZipFile is read-only")
+        self.volumes = list(volumes)
+        self._volume_file = VolumeFile(self.volumes)
+        try:
+            super().__init__(self._volume_file, "r", **kwargs)
+        except BaseException:
+            self._volume_file.close()
+            raise
+        self.filename = self.volumes[-1]
+
+    def close(self):
+        super().close()
+        self._volume_file.close()
+
+    def _RealGetContents(self):
+        """Parse the central directory, mapping (volume, offset) to stream positions"""
+        fp = self.fp
+        tail_start = max(0, fp.size - _TAIL_SIZE)
+        fp.seek(tail_start)
+        end = find_end_record(fp.read())
+        self._comment = end.comment
+        self.disk_count = end.disk_count
+
+        if end.disk_count > 1:
+            # Spanned: one disk per volume, offsets relative to their disk
+            if end.disk_count != len(fp.starts):
+                raise zipfile.BadZipFile(f"Archive has {end.disk_count} volumes, "
+                                         f"{len(fp.starts)} found")
+            if end.cd_disk >= len(fp.starts):
+                raise zipfile.BadZipFile("Bad volume number for central directory")
+            volume_starts, concat = fp.starts, 0
+            self.start_dir = fp.starts[end.cd_disk] + end.offset_cd
+        else:
+            # Pieces of one archive: offsets as in the joined file
+            volume_starts = None
+            concat = tail_start + end.cd_end - end.size_cd - end.offset_cd
+            self.start_dir = end.offset_cd + concat
+        if self.start_dir < 0 or self.start_dir + end.size_cd > fp.size:
+            raise zipfile.BadZipFile("Bad offset for central directory")
+
+        fp.seek(self.start_dir)
+        directory = fp.read(end.size_cd)
+        parse_central_directory(directory, 0, len(directory),
+                                getattr(self, "metadata_encoding", None) or "cp437",
+                                self.filelist, self.NameToInfo, concat, volume_starts)
+
+
+def is_zip_archive(path):
+    """zipfile.is_zipfile() that also accepts any volume of a split archive"""
+    try:
+        if find_volumes(path) is not None:
+            return True
+    except zipfile.BadZipFile:
+        return False
+    return zipfile.is_zipfile(path)
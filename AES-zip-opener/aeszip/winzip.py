@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+"""
+WinZip AES (AE-1 / AE-2) support for zipfile
+
+AESZipFile is a drop-in zipfile.ZipFile for reading. Entries stored with
+compression method 99 are decrypted in-process with AES-CTR, authenticated
+with HMAC-SHA1 and streamed chunk by chunk into the real decompressor, so
+read(), extract(), extractall() and testzip() work on WinZip AES archives.
+"""
+
+import bz2
+import hashlib
+import hmac
+import io
+import struct
+import time
+import zipfile
+import zlib
+from collections import namedtuple
+
+from ._aes import WinZipCTR
+from .trace import null_span
+
+WZ_AES = 99
+AES_EXTRA_ID = 0x9901
+AES_KDF_ITERATIONS = 1000
+AES_AUTH_CODE_SIZE = 10
+AES_PV_SIZE = 2
+
+# strength byte -> (key bits, key length, salt length)
+AES_STRENGTHS = {
+    1: (128, 16, 8),
+    2: (192, 24, 12),
+    3: (256, 32, 16),
+}
+
+CHUNK_SIZE = 64 * 1024
+
+AESInfo = namedtuple("AESInfo", "version strength bits key_length salt_length compress_type")
+
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_LOCAL_HEADER_MAGIC = b"PK\003\004"
+
+
+def aes_info(zinfo):
+    """Return the AESInfo for a WinZip AES entry, or None for other entries"""
+    if zinfo.compress_type != WZ_AES:
+        return None
+    extra = zinfo.extra
+    pos = 0
+    while pos + 4 <= len(extra):
+        header_id, size = struct.unpack("<HH", extra[pos:pos + 4])
+        if header_id == AES_EXTRA_ID and size >= 7:
+            version, vendor, strength, method = struct.unpack(
+                "<H2sBH", extra[pos + 4:pos + 11])
+            if vendor != b"AE" or strength not in AES_STRENGTHS:
+                raise zipfile.BadZipFile(
+                    "Unsupported AES extra field for file %r" % zinfo.filename)
+            bits, key_length, salt_length = AES_STRENGTHS[strength]
+            return AESInfo(version, strength, bits, key_length, salt_length, method)
+        pos += 4 + size
+    raise zipfile.BadZipFile("Missing AES extra field for file %r" % zinfo.filename)
+
+
+def derive_keys(pwd, salt, key_length):
+    """Derive (encryption key, HMAC key, password verifier) from a password"""
+    material = hashlib.pbkdf2_hmac("sha1", pwd, salt, AES_KDF_ITERATIONS,
+                                   2 * key_length + AES_PV_SIZE)
+    return (material[:key_length],
+            material[key_length:2 * key_length],
+            material[2 * key_length:])
+
+
+def _make_decompressor(compress_type, filename):
+    if compress_type == zipfile.ZIP_STORED:
+        return None
+    if compress_type == zipfile.ZIP_DEFLATED:
+        return zlib.decompressobj(-15)
+    if compress_type == zipfile.ZIP_BZIP2:
+        return bz2.BZ2Decompressor()
+    if compress_type == zipfile.ZIP_LZMA:
+        return zipfile.LZMADecompressor()
+    raise NotImplementedError(
+        "Compression method %d is not supported for AES file %r" % (compress_type, filename))
+
+
+class AESExtFile(io.BufferedIOBase):
+    """Readable stream over one decrypted and decompressed AES entry"""
+
+    def __init__(self, read_raw, zinfo, pwd, info=None, chunk_size=CHUNK_SIZE,
+                 key_cache=None, tracer=None):
+        self.name = zinfo.filename
+        self._read_raw = read_raw
+        self._zinfo = zinfo
+        self._info = info or aes_info(zinfo)
+        self._chunk_size = chunk_size
+        self._buffer = b""
+        self._eof = False
+        self._crc = 0
+        self._produced = 0
+        self._span = span = tracer.span if tracer is not None else null_span
+
+        overhead = self._info.salt_length + AES_PV_SIZE + AES_AUTH_CODE_SIZE
+        if zinfo.compress_size < overhead:
+            raise zipfile.BadZipFile("Truncated AES data for file %r" % self.name)
+        self._remaining = zinfo.compress_size - overhead
+
+        header = read_raw(self._info.salt_length + AES_PV_SIZE)
+        salt = header[:self._info.salt_length]
+        derive = key_cache.derive if key_cache is not None else derive_keys
+        with span("derive-key"):
+            key, auth_key, verifier = derive(pwd, salt, self._info.key_length)
+        if not hmac.compare_digest(verifier, header[self._info.salt_length:]):
+            raise RuntimeError("Bad password for file %r" % self.name)
+
+        self._cipher = WinZipCTR(key)
+        self._mac = hmac.new(auth_key, digestmod=hashlib.sha1)
+        self._decompressor = _make_decompressor(self._info.compress_type, self.name)
+
+    def readable(self):
+        return True
+
+    def _fill(self):
+        """Decrypt and decompress the next chunk into the buffer
+
+        The fill that consumes the last of the ciphertext also checks the
+        authentication code, so no byte of the final chunk is handed out
+        unverified.
+        """
+        plain = b""
+        if self._remaining > 0:
+            data = self._read_raw(min(self._chunk_size, self._remaining))
+            if not data:
+                raise EOFError("Truncated AES data for file %r" % self.name)
+            self._remaining -= len(data)
+            span = self._span
+            with span("authenticate"):
+                self._mac.update(data)
+            with span("decrypt"):
+                plain = self._cipher.process(data)
+            if self._decompressor is not None:
+                with span("decompress"):
+                    plain = self._decompressor.decompress(plain)
+        if self._remaining == 0 and self._decompressor is not None and \
+                hasattr(self._decompressor, "flush"):
+            plain += self._decompressor.flush()
+
+        if plain:
+            self._crc = zlib.crc32(plain, self._crc)
+            self._produced += len(plain)
+            self._buffer += plain
+        if self._remaining == 0:
+            self._finish()
+
+    def _need_fill(self, n):
+        # Once the declared size is out, read on to the end so the entry is
+        # authenticated before a reader that stops at file_size gets the last bytes
+        return not self._eof and (len(self._buffer) < n or
+                                  self._produced >= self._zinfo.file_size)
+
+    def _finish(self):
+        """Check the authentication code (and CRC for AE-1) at end of stream"""
+        self._eof = True
+        stored = self._read_raw(AES_AUTH_CODE_SIZE)
+        if not hmac.compare_digest(self._mac.digest()[:AES_AUTH_CODE_SIZE], bytes(stored)):
+            raise zipfile.BadZipFile("Bad HMAC check for file %r" % self.name)
+        if self._info.version == 1 and self._crc != self._zinfo.CRC:
+            raise zipfile.BadZipFile("Bad CRC-32 for file %r" % self.name)
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            chunks = [self._buffer]
+            self._buffer = b""
+            while not self._eof:
+                self._fill()
+                chunks.append(self._buffer)
+                self._buffer = b""
+            return b"".join(chunks)
+        while self._need_fill(n):
+            self._fill()
+        data, self._buffer = self._buffer[:n], self._buffer[n:]
+        return data
+
+    def read1(self, n=-1):
+        while self._need_fill(1):
+            self._fill()
+        if n is None or n < 0:
+            n = len(self._buffer)
+        data, self._buffer = self._buffer[:n], self._buffer[n:]
+        return data
+
+
+class _CountingReader:
+    """Wraps an entry stream and reports the size of every read"""
+
+    def __init__(self, raw, callback):
+        self._raw = raw
+        self._callback = callback
+
+    def read(self, n=-1):
+        data = self._raw.read(n)
+        if data:
+            self._callback(len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._raw.close()
+
+
+class _TracedReader(_CountingReader):
+    """Wraps an entry stream and times every read
+
+    For streams zipfile decrypts and decompresses itself, "read" is the
+    finest phase available (AES streams time their own phases, so their
+    reads are not recorded again). While extracting, the time between one read
+    and the next is the write of the previous chunk, recorded as "write".
+    """
+
+    def __init__(self, raw, tracer, reads=True, gaps=None):
+        self._raw = raw
+        self._tracer = tracer
+        self._reads = reads
+        self._gaps = gaps
+        self._last = None
+
+    def read(self, n=-1):
+        start = time.perf_counter()
+        if self._gaps is not None and self._last is not None:
+            self._tracer.add(self._gaps, self._last, start - self._last, "io")
+        data = self._raw.read(n)
+        self._last = time.perf_counter()
+        if self._reads:
+            self._tracer.add("read", start, self._last - start)
+        return data
+
+    def __exit__(self, *exc_info):
+        if self._gaps is not None and self._last is not None:
+            self._tracer.add(self._gaps, self._last, time.perf_counter() - self._last, "io")
+        self._raw.close()
+
+
+class AESZipFile(zipfile.ZipFile):
+    """zipfile.ZipFile that can also read WinZip AES encrypted entries
+
+    Set read_callback to a callable taking a byte count to be told about
+    every chunk of decompressed data read from an entry (extract(),
+    extractall(), read() and testzip() all go through open()). It may raise
+    to abort the operation mid-entry.
+
+    Set key_cache to a keycache.DerivedKeyCache to reuse derived AES keys
+    across opens and archive handles.
+
+    Set tracer to a trace.Tracer to time key derivation, decryption,
+    authentication and decompression of AES entries, reads of other
+    entries and, in extract(), the writes to disk.
+    """
+
+    read_callback = None
+    key_cache = None
+    tracer = None
+    _extracting = False
+
+    def _data_offset(self, zinfo):
+        """Locate the start of an entry's data past its local file header"""
+        with self._lock:
+            self.fp.seek(zinfo.header_offset)
+            header = self.fp.read(_LOCAL_HEADER.size)
+        if len(header) != _LOCAL_HEADER.size:
+            raise zipfile.BadZipFile("Truncated file header")
+        fields = _LOCAL_HEADER.unpack(header)
+        if fields[0] != _LOCAL_HEADER_MAGIC:
+            raise zipfile.BadZipFile("Bad magic number for file header")
+        return zinfo.header_offset + _LOCAL_HEADER.size + fields[10] + fields[11]
+
+    def _raw_reader(self, zinfo):
+        """Return a read(n) callable over an entry's raw (encrypted) bytes"""
+        position = [self._data_offset(zinfo)]
+
+        def read_raw(n):
+            with self._lock:
+                self.fp.seek(position[0])
+                data = self.fp.read(n)
+            position[0] += len(data)
+            return data
+        return read_raw
+
+    def check_password(self, pwd=None):
+        """Fail fast on a wrong password, before any bulk work
+
+        The first AES entry's 2-byte password verifier is compared (one key
+        derivation), then the smallest encrypted entry is read in full so
+        its HMAC (or CRC) confirms the key. Raises RuntimeError like open()
+        on a wrong or missing password and BadZipFile if the check entry is
+        corrupt. Returns the name of the entry read, or None when nothing in
+        the archive is encrypted.
+        """
+        encrypted = [zinfo for zinfo in self.infolist()
+                     if zinfo.flag_bits & 0x1 and not zinfo.is_dir()]
+        if not encrypted:
+            return None
+        pwd = pwd or self.pwd
+        if not pwd:
+            raise RuntimeError("File %r is encrypted, password required for extraction"
+                               % encrypted[0].filename)
+
+        smallest = min(encrypted, key=lambda zinfo: zinfo.compress_size)
+        first_aes = next((zinfo for zinfo in encrypted if zinfo.compress_type == WZ_AES), None)
+        if first_aes is not None and first_aes is not smallest:
+            info = aes_info(first_aes)
+            header = self._raw_reader(first_aes)(info.salt_length + AES_PV_SIZE)
+            derive = self.key_cache.derive if self.key_cache is not None else derive_keys
+            verifier = derive(pwd, header[:info.salt_length], info.key_length)[2]
+            if not hmac.compare_digest(verifier, header[info.salt_length:]):
+                raise RuntimeError("Bad password for file %r" % first_aes.filename)
+
+        read_callback, self.read_callback = self.read_callback, None
+        try:
+            with self.open(smallest, pwd=pwd) as f:
+                while f.read(CHUNK_SIZE):
+                    pass
+        finally:
+            self.read_callback = read_callback
+        return smallest.filename
+
+    def open(self, name, mode="r", pwd=None, *, force_zip64=False):
+        if mode != "r":
+            return super().open(name, mode, pwd, force_zip64=force_zip64)
+        zinfo = name if isinstance(name, zipfile.ZipInfo) else self.getinfo(name)
+        if zinfo.compress_type != WZ_AES:
+            stream = super().open(zinfo, mode, pwd)
+            if self.tracer is not None:
+                stream = _TracedReader(stream, self.tracer,
+                                       gaps="write" if self._extracting else None)
+        else:
+            stream = self._open_aes(zinfo, pwd)
+            if self.tracer is not None and self._extracting:
+                stream = _TracedReader(stream, self.tracer, reads=False, gaps="write")
+        if self.read_callback is not None:
+            return _CountingReader(stream, self.read_callback)
+        return stream
+
+    def _open_aes(self, zinfo, pwd):
+        if not self.fp:
+            raise ValueError("Attempt to use ZIP archive that was already closed")
+        pwd = pwd or self.pwd
+        if not pwd:
+            raise RuntimeError("File %r is encrypted, password required for extraction"
+                               % zinfo.filename)
+        return AESExtFile(self._raw_reader(zinfo), zinfo, pwd, key_cache=self.key_cache,
+                          tracer=self.tracer)
+
+    def _extract_member(self, member, targetpath, pwd):
+        if self.tracer is None:
+            return super()._extract_member(member, targetpath, pwd)
+        name = member.filename if isinstance(member, zipfile.ZipInfo) else member
+        self._extracting = True
+        try:
+            with self.tracer.span("extract-entry", "entry", entry=name):
+                return super()._extract_member(member, targetpath, pwd)
+        finally:
+            self._extracting = False
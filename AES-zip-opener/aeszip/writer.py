@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""
+Writing encrypted entries
+
+zipfile can read traditional PKWARE ("ZipCrypto") entries but cannot write
+encrypted entries of any kind. encode_entry() compresses and encrypts one
+entry in memory, as WinZip AES-256 or ZipCrypto, and AESZipWriter appends
+encoded entries to an archive; the central directory, ZIP64 records and
+closing are left to zipfile.
+
+Encoding is a pure function of its inputs, so callers may encode entries
+concurrently and only serialize the writes. open_encrypted() is the
+streaming counterpart for entries too large to hold in memory: data is
+compressed, encrypted and authenticated as it is written, and the header
+is completed afterwards like zipfile's own open(name, "w").
+"""
+
+import hashlib
+import hmac
+import io
+import os
+import struct
+import time
+import zipfile
+import zlib
+from collections import namedtuple
+
+from ._aes import WinZipCTR
+from .winzip import AES_EXTRA_ID, AES_STRENGTHS, WZ_AES, derive_keys
+
+ENCRYPTION_NONE = "none"
+ENCRYPTION_ZIPCRYPTO = "zipcrypto"
+ENCRYPTION_AES256 = "aes256"
+ENCRYPTIONS = (ENCRYPTION_NONE, ENCRYPTION_ZIPCRYPTO, ENCRYPTION_AES256)
+
+# WinZip writes AE-2 (no CRC, which would leak information) for tiny entries
+AE2_THRESHOLD = 20
+
+_AES256_STRENGTH = 3
+
+# payload is everything after the local header; compress_type is what the
+# header records (99 for AES), extra any extra field the entry needs
+EncodedEntry = namedtuple("EncodedEntry", "payload crc file_size compress_type flag_bits extra")
+
+
+def _compress(data, compress_type, compresslevel):
+    if compress_type == zipfile.ZIP_STORED:
+        return data
+    compressor = zipfile._get_compressor(compress_type, compresslevel)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _aes_extra(version, compress_type):
+    return struct.pack("<HHH2sBH", AES_EXTRA_ID, 7, version, b"AE", _AES256_STRENGTH,
+                       compress_type)
+
+
+def _encrypt_aes(compressed, pwd, salt=None):
+    _, key_length, salt_length = AES_STRENGTHS[_AES256_STRENGTH]
+    salt = salt or os.urandom(salt_length)
+    key, auth_key, verifier = derive_keys(pwd, salt, key_length)
+    ciphertext = WinZipCTR(key).process(compressed)
+    auth_code = hmac.new(auth_key, ciphertext, hashlib.sha1).digest()[:10]
+    return salt + verifier + ciphertext + auth_code
+
+
+_CRC_TABLE = None
+
+
+def _crc_table():
+    global _CRC_TABLE
+    if _CRC_TABLE is None:
+        table = []
+        for i in range(256):
+            crc = i
+            for _ in range(8):
+                crc = (crc >> 1) ^ 0xEDB88320 if crc & 1 else crc >> 1
+            table.append(crc)
+        _CRC_TABLE = table
+    return _CRC_TABLE
+
+
+def _encrypt_zipcrypto(compressed, pwd, check_byte):
+    """Traditional PKWARE encryption (weak; for compatibility and testing only)"""
+    table = _crc_table()
+    k0, k1, k2 = 0x12345678, 0x23456789, 0x34567890
+    for byte in pwd:
+        k0 = (k0 >> 8) ^ table[(k0 ^ byte) & 0xFF]
+        k1 = ((k1 + (k0 & 0xFF)) * 134775813 + 1) & 0xFFFFFFFF
+        k2 = (k2 >> 8) ^ table[(k2 ^ (k1 >> 24)) & 0xFF]
+
+    # The key update is inlined in the loop; it runs once per byte
+    plain = os.urandom(11) + bytes((check_byte,)) + compressed
+    out = bytearray(len(plain))
+    for i, byte in enumerate(plain):
+        temp = (k2 | 2) & 0xFFFF
+        out[i] = byte ^ (((temp * (temp ^ 1)) >> 8) & 0xFF)
+        k0 = (k0 >> 8) ^ table[(k0 ^ byte) & 0xFF]
+        k1 = ((k1 + (k0 & 0xFF)) * 134775813 + 1) & 0xFFFFFFFF
+        k2 = (k2 >> 8) ^ table[(k2 ^ (k1 >> 24)) & 0xFF]
+    return bytes(out)
+
+
+def encode_entry(data, pwd=None, compress_type=zipfile.ZIP_DEFLATED,
+                 encryption=ENCRYPTION_AES256, compresslevel=None):
+    """Compress and encrypt one entry's data, returning an EncodedEntry"""
+    if encryption not in ENCRYPTIONS:
+        raise ValueError(f"Unknown encryption {encryption!r}")
+    if encryption != ENCRYPTION_NONE and not pwd:
+        raise ValueError("A password is required for encrypted entries")
+    crc = zlib.crc32(data)
+    compressed = _compress(data, compress_type, compresslevel)
+    flag_bits = 0x02 if compress_type == zipfile.ZIP_LZMA else 0
+    if encryption == ENCRYPTION_NONE:
+        return EncodedEntry(compressed, crc, len(data), compress_type, flag_bits, b"")
+    flag_bits |= 0x01
+    if encryption == ENCRYPTION_ZIPCRYPTO:
+        return EncodedEntry(_encrypt_zipcrypto(compressed, pwd, crc >> 24), crc,
+                            len(data), compress_type, flag_bits, b"")
+    version = 2 if len(data) < AE2_THRESHOLD else 1
+    return EncodedEntry(_encrypt_aes(compressed, pwd), crc if version == 1 else 0,
+                        len(data), WZ_AES, flag_bits, _aes_extra(version, compress_type))
+
+
+class _AESWriteFile(zipfile._ZipWriteFile):
+    """Writable stream of one AES-256 entry: compress, encrypt, authenticate"""
+
+    def __init__(self, zf, zinfo, zip64, compress_type, compresslevel, version, pwd):
+        super().__init__(zf, zinfo, zip64)
+        self._compressor = zipfile._get_compressor(compress_type, compresslevel)
+        self._version = version
+        _, key_length, salt_length = AES_STRENGTHS[_AES256_STRENGTH]
+        salt = os.urandom(salt_length)
+        key, auth_key, verifier = derive_keys(pwd, salt, key_length)
+        self._cipher = WinZipCTR(key)
+        self._mac = hmac.new(auth_key, digestmod=hashlib.sha1)
+        self._fileobj.write(salt + verifier)
+        self._compress_size = len(salt) + len(verifier)
+
+    def _emit(self, data):
+        if data:
+            data = self._cipher.process(data)
+            self._mac.update(data)
+            self._compress_size += len(data)
+            self._fileobj.write(data)
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        if not isinstance(data, (bytes, bytearray)):
+            data = memoryview(data).cast("B")
+        nbytes = len(data)
+        self._file_size += nbytes
+        self._crc = zlib.crc32(data, self._crc)
+        self._emit(self._compressor.compress(data) if self._compressor else data)
+        return nbytes
+
+    def close(self):
+        if self.closed:
+            return
+        zf = self._zipfile
+        try:
+            io.BufferedIOBase.close(self)
+            if self._compressor:
+                self._emit(self._compressor.flush())
+            auth_code = self._mac.digest()[:10]
+            self._fileobj.write(auth_code)
+            self._compress_size += len(auth_code)
+
+            zinfo = self._zinfo
+            zinfo.compress_size = self._compress_size
+            zinfo.file_size = self._file_size
+            zinfo.CRC = self._crc if self._version == 1 else 0
+            if not self._zip64 and max(self._file_size, self._compress_size) > zipfile.ZIP64_LIMIT:
+                raise RuntimeError("File size too large, try using force_zip64")
+            if zinfo.flag_bits & 0x08:
+                fmt = "<LLQQ" if self._zip64 else "<LLLL"
+                self._fileobj.write(struct.pack(fmt, 0x08074b50, zinfo.CRC,
+                                                zinfo.compress_size, zinfo.file_size))
+                zf.start_dir = self._fileobj.tell()
+            else:
+                zf.start_dir = self._fileobj.tell()
+                self._fileobj.seek(zinfo.header_offset)
+                self._fileobj.write(zinfo.FileHeader(self._zip64))
+                self._fileobj.seek(zf.start_dir)
+            zf.filelist.append(zinfo)
+            zf.NameToInfo[zinfo.filename] = zinfo
+        finally:
+            zf._writing = False
+
+
+class AESZipWriter(zipfile.ZipFile):
+    """zipfile.ZipFile that can also write AES-256 and ZipCrypto entries"""
+
+    def open_encrypted(self, zinfo_or_arcname, compress_type=None, compresslevel=None,
+                       force_zip64=False):
+        """Writable stream for one AES-256 entry, using the password from setpassword()
+
+        Like open(name, "w"), but the data is encrypted as it is written.
+        Set zinfo.file_size beforehand when it is known: it decides ZIP64
+        and whether the entry is AE-1 or (when tiny) AE-2.
+        """
+        if not self.pwd:
+            raise ValueError("A password is required for encrypted entries")
+        if isinstance(zinfo_or_arcname, zipfile.ZipInfo):
+            zinfo = zinfo_or_arcname
+        else:
+            zinfo = zipfile.ZipInfo(zinfo_or_arcname, time.localtime(time.time())[:6])
+            zinfo.external_attr = 0o600 << 16
+        if compress_type is None:
+            compress_type = self.compression
+        if compresslevel is None:
+            compresslevel = self.compresslevel
+        version = 2 if zinfo.file_size < AE2_THRESHOLD and zinfo.file_size else 1
+        zip64 = force_zip64 or zinfo.file_size * 1.05 > zipfile.ZIP64_LIMIT
+        if zip64 and not self._allowZip64:
+            raise zipfile.LargeZipFile("Filesize would require ZIP64 extensions")
+
+        zinfo.compress_type = WZ_AES
+        zinfo.flag_bits = 0x01 | (0x02 if compress_type == zipfile.ZIP_LZMA else 0) | \
+            (0x800 if _needs_utf8(zinfo.filename) else 0) | (0 if self._seekable else 0x08)
+        zinfo.extra = _aes_extra(version, compress_type)
+        zinfo.compress_size = zinfo.CRC = 0
+        if self._writing:
+            raise ValueError("Can't write to the ZIP file while there is "
+                             "another write handle open on it.")
+        if self.mode not in ('w', 'x', 'a'):
+            raise ValueError("write() requires mode 'w', 'x', or 'a'")
+        if zinfo.filename in self.NameToInfo:
+            raise ValueError(f"Duplicate name: {zinfo.filename!r}")
+        if self._seekable:
+            self.fp.seek(self.start_dir)
+        zinfo.header_offset = self.fp.tell()
+        self._didModify = True
+        self.fp.write(zinfo.FileHeader(zip64))
+        self._writing = True
+        try:
+            return _AESWriteFile(self, zinfo, zip64, compress_type, compresslevel, version,
+                                 self.pwd)
+        except BaseException:
+            self._writing = False
+            raise
+
+    def open_plain(self, zinfo, force_zip64=False):
+        """open(zinfo, "w") with the archive's compression method and level"""
+        zinfo.compress_type = self.compression
+        zinfo._compresslevel = self.compresslevel
+        return self.open(zinfo, "w", force_zip64=force_zip64)
+
+    def write_encoded(self, zinfo_or_arcname, encoded):
+        """Append an EncodedEntry under the given name or ZipInfo"""
+        if isinstance(zinfo_or_arcname, zipfile.ZipInfo):
+            zinfo = zinfo_or_arcname
+        else:
+            zinfo = zipfile.ZipInfo(zinfo_or_arcname)
+            zinfo.external_attr = 0o600 << 16
+        zinfo.compress_type = encoded.compress_type
+        zinfo.flag_bits = encoded.flag_bits | (0x800 if _needs_utf8(zinfo.filename) else 0)
+        zinfo.extra = encoded.extra + zinfo.extra
+        zinfo.CRC = encoded.crc
+        zinfo.file_size = encoded.file_size
+        zinfo.compress_size = len(encoded.payload)
+        zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT
+        if zip64 and not self._allowZip64:
+            raise zipfile.LargeZipFile("Filesize would require ZIP64 extensions")
+
+        with self._lock:
+            if self._writing:
+                raise ValueError("Can't write to the ZIP file while there is "
+                                 "another write handle open on it.")
+            if self.mode not in ('w', 'x', 'a'):
+                raise ValueError("write() requires mode 'w', 'x', or 'a'")
+            if zinfo.filename in self.NameToInfo:
+                raise ValueError(f"Duplicate name: {zinfo.filename!r}")
+            if self._seekable:
+                self.fp.seek(self.start_dir)
+            zinfo.header_offset = self.fp.tell()
+            self._didModify = True
+            self.fp.write(zinfo.FileHeader(zip64))
+            self.fp.write(encoded.payload)
+            self.start_dir = self.fp.tell()
+            self.filelist.append(zinfo)
+            self.NameToInfo[zinfo.filename] = zinfo
+
+    def writestr_encrypted(self, zinfo_or_arcname, data, compress_type=None,
+                           encryption=ENCRYPTION_AES256, compresslevel=None):
+        """writestr() with encryption, using the password from setpassword()"""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if compress_type is None:
+            compress_type = self.compression
+        encoded = encode_entry(data, self.pwd, compress_type, encryption,
+                               compresslevel if compresslevel is not None else self.compresslevel)
+        self.write_encoded(zinfo_or_arcname, encoded)
+
+
+def _needs_utf8(name):
+    try:
+        name.encode("ascii")
+        return False
+    except UnicodeEncodeError:
+        return True
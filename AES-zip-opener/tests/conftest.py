@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""Shared fixtures: small WinZip AES archives built on the fly"""
+
+import bz2
+import hashlib
+import hmac
+import os
+import random
+import struct
+import zipfile
+import zlib
+
+import pytest
+
+from aeszip._aes import WinZipCTR
+from aeszip.winzip import AES_AUTH_CODE_SIZE, AES_EXTRA_ID, WZ_AES, AESZipFile, derive_keys
+
+PASSWORD = b"correct horse"
+
+_CENTRAL_HEADER = struct.Struct(zipfile.structCentralDir)
+_LOCAL_HEADER = struct.Struct(zipfile.structFileHeader)
+_END_RECORD = struct.Struct(zipfile.structEndArchive)
+
+
+def sample_data(size, seed=0):
+    """Half random, half repetitive, so every compressor has work to do"""
+    rng = random.Random(seed)
+    head = rng.randbytes(size // 2)
+    return head + b"abcdefgh" * ((size - len(head)) // 8) + b"x" * ((size - len(head)) % 8)
+
+
+def tamper(path, name):
+    """Flip one byte in the middle of an entry's encrypted data"""
+    with AESZipFile(path) as zip_file:
+        zinfo = zip_file.getinfo(name)
+        start = zip_file._data_offset(zinfo)
+    raw = bytearray(path.read_bytes())
+    raw[start + zinfo.compress_size // 2] ^= 0x01
+    path.write_bytes(bytes(raw))
+
+
+def understate_size(path, name, size):
+    """Understate an entry's size in the central directory"""
+    raw = bytearray(path.read_bytes())
+    with zipfile.ZipFile(path) as zip_file:
+        pos = zip_file.start_dir
+    while raw[pos:pos + 4] == zipfile.stringCentralDir:
+        fields = list(_CENTRAL_HEADER.unpack_from(raw, pos))
+        if raw[pos + _CENTRAL_HEADER.size:pos + _CENTRAL_HEADER.size + fields[12]] == \
+                name.encode():
+            fields[11] = size
+            _CENTRAL_HEADER.pack_into(raw, pos, *fields)
+        pos += _CENTRAL_HEADER.size + fields[12] + fields[13] + fields[14]
+    path.write_bytes(bytes(raw))
+
+
+def _compress(data, compress_type):
+    if compress_type == zipfile.ZIP_DEFLATED:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        return compressor.compress(data) + compressor.flush()
+    if compress_type == zipfile.ZIP_BZIP2:
+        return bz2.compress(data)
+    if compress_type == zipfile.ZIP_LZMA:
+        compressor = zipfile.LZMACompressor()
+        return compressor.compress(data) + compressor.flush()
+    return data
+
+
+def _encrypt(data, pwd):
+    """salt + verifier + AES-256-CTR ciphertext + HMAC-SHA1 code"""
+    salt = os.urandom(16)
+    key, auth_key, verifier = derive_keys(pwd, salt, 32)
+    ciphertext = WinZipCTR(key).process(data)
+    code = hmac.new(auth_key, ciphertext, hashlib.sha1).digest()[:AES_AUTH_CODE_SIZE]
+    return salt + verifier + ciphertext + code
+
+
+def write_aes_archive(path, entries, compress_type=zipfile.ZIP_DEFLATED, pwd=PASSWORD):
+    """Write {name: data} as WinZip AES-256 entries, AE-2 below 20 bytes like WinZip
+
+    zipfile stores the encrypted payloads; the method, flags, CRC and size
+    fields are then patched in both headers, as zipfile cannot write method 99.
+    """
+    fields = {}
+    with zipfile.ZipFile(path, "w") as zip_file:
+        for name, data in entries.items():
+            version = 2 if len(data) < 20 else 1
+            zinfo = zipfile.ZipInfo(name, (2024, 5, 6, 7, 8, 10))
+            zinfo.extra = struct.pack("<HHH2sBH", AES_EXTRA_ID, 7, version, b"AE", 3,
+                                      compress_type)
+            zip_file.writestr(zinfo, _encrypt(_compress(data, compress_type), pwd))
+            fields[name] = (zlib.crc32(data) if version == 1 else 0, len(data))
+        infos = zip_file.infolist()
+        start_dir = zip_file.start_dir
+
+    raw = bytearray(path.read_bytes())
+    pos = start_dir
+    for zinfo in infos:
+        crc, size = fields[zinfo.filename]
+        local = list(_LOCAL_HEADER.unpack_from(raw, zinfo.header_offset))
+        local[3] |= 0x1
+        local[4], local[7], local[9] = WZ_AES, crc, size
+        _LOCAL_HEADER.pack_into(raw, zinfo.header_offset, *local)
+        central = list(_CENTRAL_HEADER.unpack_from(raw, pos))
+        central[5] |= 0x1
+        central[6], central[9], central[11] = WZ_AES, crc, size
+        _CENTRAL_HEADER.pack_into(raw, pos, *central)
+        pos += _CENTRAL_HEADER.size + central[12] + central[13] + central[14]
+    path.write_bytes(bytes(raw))
+    return path
+
+
+@pytest.fixture
+def make_archive(tmp_path):
+    """make_archive({name: data}, compress_type) -> path of a new AES-256 archive"""
+    def make(entries, compress_type=zipfile.ZIP_DEFLATED, name="test.zip"):
+        return write_aes_archive(tmp_path / name, entries, compress_type)
+    return make
+
+
+@pytest.fixture
+def make_spanned():
+    """make_spanned(archive, volume_size) -> volumes of a spanned copy: .z01, .z02, ..., .zip
+
+    Like zip -s: local records are cut into volumes, each central directory
+    record names the volume its entry starts in and its offset there, and the
+    central directory and end record go in the last volume.
+    """
+    def make(path, volume_size):
+        raw = path.read_bytes()
+        with zipfile.ZipFile(path) as zip_file:
+            infos = zip_file.infolist()
+            start_dir = zip_file.start_dir
+        pieces = [raw[i:i + volume_size] for i in range(0, start_dir, volume_size)]
+        starts = [i * volume_size for i in range(len(pieces))]
+
+        directory = bytearray()
+        pos = start_dir
+        for zinfo in infos:
+            fields = list(_CENTRAL_HEADER.unpack_from(raw, pos))
+            disk = zinfo.header_offset // volume_size
+            fields[15] = disk
+            fields[18] = zinfo.header_offset - starts[disk]
+            length = _CENTRAL_HEADER.size + fields[12] + fields[13] + fields[14]
+            directory += _CENTRAL_HEADER.pack(*fields) + raw[pos + _CENTRAL_HEADER.size:pos + length]
+            pos += length
+        last = len(pieces) - 1
+        end = _END_RECORD.pack(zipfile.stringEndArchive, last, last, len(infos), len(infos),
+                               len(directory), len(pieces[-1]), 0)
+        pieces[-1] += bytes(directory) + end
+
+        base = path.with_suffix("")
+        volumes = [base.with_name(f"{base.name}.z{i + 1:02d}") for i in range(last)]
+        volumes.append(base.with_name(f"{base.name}.zip"))
+        path.unlink()
+        for volume, piece in zip(volumes, pieces):
+            volume.write_bytes(piece)
+        return volumes
+    return make
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""Backend ranking, split planning and the learned throughput history"""
+
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+
+from aeszip import backends
+from aeszip.backends import FACTOR_LIMITS, OPERATIONS, ArchiveProfile, Backend, GroupCost, \
+    ThroughputHistory, plan_split, rank_backends
+from aeszip.core import Archive, OperationCancelled
+
+MB = 1024 * 1024
+
+
+def _prior(startup=0.0, **methods):
+    return {
+        "startup": startup,
+        "per_entry": dict.fromkeys(OPERATIONS, 0.0),
+        "kdf": 0.0,
+        "methods": methods,
+        "other_methods": None,
+        "crypto": {"none": None, "zipcrypto": None, "aes": None},
+    }
+
+
+class StubBackend(Backend):
+    def __init__(self, name, prior, zip_only=False, usable=True, error=None):
+        self.name = name
+        self.prior = prior
+        self.zip_only = zip_only
+        self.usable = usable
+        self.error = error
+        self.calls = 0
+
+    def available(self, archive):
+        return self.usable
+
+    def test(self, archive):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return True, f"tested by {self.name}"
+
+
+@pytest.fixture
+def register(monkeypatch):
+    """register(*backends) replaces the registered backends for one test"""
+    monkeypatch.setattr(backends, "_BACKENDS", OrderedDict())
+
+    def register(*stubs, method=None):
+        for stub in stubs:
+            backends.register_backend(stub, method)
+        return stubs
+    return register
+
+
+ARCHIVE = SimpleNamespace(workers=1)
+STORED = {"none:stored": GroupCost(10, 100 * MB)}
+
+
+def test_rank_backends_by_predicted_time(register):
+    slow, fast, zip_only, missing = register(
+        StubBackend("slow", _prior(stored=100)),
+        StubBackend("fast", _prior(stored=1000)),
+        StubBackend("zip-only", _prior(stored=10000), zip_only=True),
+        StubBackend("missing", _prior(stored=10000), usable=False))
+
+    ranked = rank_backends(ARCHIVE, "test", STORED)
+    assert [(backend.name, round(seconds, 3)) for backend, seconds in ranked] == [
+        ("zip-only", 0.01), ("fast", 0.1), ("slow", 1.0)]
+
+    # A backend that cannot read the archive stays as the last fallback
+    ranked = rank_backends(ARCHIVE, "test", STORED, readable=False)
+    assert [(backend, seconds is None) for backend, seconds in ranked] == [
+        (fast, False), (slow, False), (zip_only, True)]
+
+    # An unsupported method makes the prediction None as well
+    assert rank_backends(ARCHIVE, "test", {"none:lzma": GroupCost(1, 1)})[-1][1] is None
+
+
+def test_rank_backends_applies_history(register):
+    slow, fast = register(StubBackend("slow", _prior(stored=100)),
+                          StubBackend("fast", _prior(stored=1000)))
+    history = ThroughputHistory()
+    # fast turned out 20 times slower than predicted on this machine
+    history.record("fast", "test", "none:stored", 0.1, 2.0, 100 * MB)
+    ranked = rank_backends(ARCHIVE, "test", STORED, history)
+    assert [backend for backend, _ in ranked] == [slow, fast]
+    assert ranked[1][1] == pytest.approx(2.0)
+
+
+def _split_backends(register, startup=0.03):
+    return register(StubBackend("A", _prior(startup, stored=1000, lzma=10)),
+                    StubBackend("B", _prior(startup, stored=10, lzma=1000)))
+
+
+def test_plan_split_worth_a_second_process(register):
+    first, second = _split_backends(register)
+    profile = ArchiveProfile([("a.bin", "none:stored", 100 * MB),
+                              ("b.xz", "none:lzma", 100 * MB),
+                              ("c.bin", "none:stored", 10 * MB)])
+    assert plan_split(ARCHIVE, profile) == [(first, ["a.bin", "c.bin"]), (second, ["b.xz"])]
+
+
+def test_plan_split_not_worth_a_second_process(register):
+    _split_backends(register, startup=0.5)
+    profile = ArchiveProfile([("a.bin", "none:stored", MB), ("b.xz", "none:lzma", MB)])
+    # Saves about 0.2 s, less than starting the other backend
+    assert plan_split(ARCHIVE, profile) is None
+
+
+def test_plan_split_one_backend_best_for_everything(register):
+    register(StubBackend("A", _prior(stored=1000, lzma=1000)),
+             StubBackend("B", _prior(stored=10, lzma=10)))
+    profile = ArchiveProfile([("a.bin", "none:stored", 100 * MB),
+                              ("b.xz", "none:lzma", 100 * MB)])
+    assert plan_split(ARCHIVE, profile) is None
+    assert plan_split(ARCHIVE, None) is None
+
+
+def test_history_factor_is_averaged():
+    history = ThroughputHistory()
+    history.record("A", "test", "none:stored", 1.0, 2.0, 10 * MB)
+    assert history.factor("A", "test", "none:stored") == 2.0
+    # The next prediction already includes the factor: 2 s predicted, 4 s measured
+    history.record("A", "test", "none:stored", 2.0, 4.0, 10 * MB)
+    assert history.factor("A", "test", "none:stored") == pytest.approx(0.7 * 2 + 0.3 * 4)
+    record = history.records()["A/test/none:stored"]
+    assert record["runs"] == 2 and record["mb_per_s"] == 2.5
+    assert history.factor("B", "test", "none:stored") == 1.0
+
+
+def test_history_factor_is_clamped():
+    history = ThroughputHistory()
+    history.record("A", "test", "none:stored", 0.1, 1000.0, MB)
+    history.record("B", "test", "none:stored", 100.0, 0.06, MB)
+    assert history.factor("A", "test", "none:stored") == FACTOR_LIMITS[1]
+    assert history.factor("B", "test", "none:stored") == FACTOR_LIMITS[0]
+
+
+def test_history_ignores_noise():
+    history = ThroughputHistory()
+    history.record("A", "test", "none:stored", 1.0, 0.01, MB)
+    history.record("A", "test", "none:stored", 0.0, 1.0, MB)
+    history.record("A", "test", None, 1.0, 1.0, MB)
+    assert history.records() == {}
+
+
+def test_history_persists(tmp_path):
+    path = str(tmp_path / "throughput.json")
+    ThroughputHistory(path).record("A", "test", "none:stored", 1.0, 3.0, MB)
+    assert ThroughputHistory(path).factor("A", "test", "none:stored") == 3.0
+    (tmp_path / "bad.json").write_text("{not json")
+    assert ThroughputHistory(str(tmp_path / "bad.json")).records() == {}
+
+
+def _archive(tmp_path, method="auto"):
+    # Not a ZIP file, so the cost model has nothing to go on and keeps the order
+    path = tmp_path / "data.bin"
+    path.write_bytes(b"not a zip")
+    return Archive(str(path), "", method)
+
+
+def test_auto_mode_falls_back_on_error(register, tmp_path):
+    broken, working = register(StubBackend("broken", _prior(stored=1000), error=OSError("gone")),
+                               StubBackend("working", _prior(stored=100)))
+    passed, details, method = _archive(tmp_path).test()
+    assert (passed, details, method) == (True, "tested by working", "working")
+    assert broken.calls == working.calls == 1
+
+
+def test_last_backend_error_is_raised(register, tmp_path):
+    register(StubBackend("broken", _prior(stored=1000), error=OSError("gone")),
+             StubBackend("also-broken", _prior(stored=100), error=OSError("also gone")))
+    with pytest.raises(OSError, match="also gone"):
+        _archive(tmp_path).test()
+
+
+def test_explicit_method_and_cancel_do_not_fall_back(register, tmp_path):
+    broken = StubBackend("broken", _prior(stored=1000), error=OSError("gone"))
+    cancelled = StubBackend("cancelled", _prior(stored=1000), error=OperationCancelled())
+    working = StubBackend("working", _prior(stored=100))
+    register(broken, method="python")
+    register(working)
+    with pytest.raises(OSError, match="gone"):
+        _archive(tmp_path, "python").test()
+
+    register(cancelled, method="python")
+    with pytest.raises(OperationCancelled):
+        _archive(tmp_path).test()
+    assert working.calls == 0
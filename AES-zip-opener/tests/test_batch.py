@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""Batch extraction: the I/O budget, the drop-folder watcher and the archive queue"""
+
+import json
+import os
+import zipfile
+
+import pytest
+from conftest import PASSWORD, sample_data
+
+from aeszip.batch import ArchiveQueue, FolderWatcher, IOBudget
+from aeszip.core import Archive, OperationCancelled
+from aeszip.jobs import CancelToken
+
+
+class FakeClock:
+    """A clock that only moves when slept on"""
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_io_budget_spends_the_burst_without_waiting():
+    clock = FakeClock()
+    budget = IOBudget(1000, clock=clock, sleep=clock.sleep)
+    budget.consume(600)
+    budget.consume(400)
+    assert clock.sleeps == []
+
+
+def test_io_budget_overdraft_is_repaid_by_sleeping():
+    clock = FakeClock()
+    budget = IOBudget(1000, burst=500, clock=clock, sleep=clock.sleep)
+    budget.consume(750)
+    # 250 bytes in debt at 1000 bytes/s, slept in steps of at most MAX_SLEEP
+    assert clock.sleeps == [0.1, 0.1, pytest.approx(0.05)]
+
+    # Time repays the debt and refills the bucket, but never beyond burst
+    clock.now += 10
+    budget.consume(500)
+    assert len(clock.sleeps) == 3
+    budget.consume(100)
+    assert sum(clock.sleeps[3:]) == pytest.approx(0.1)
+
+
+def test_io_budget_wait_is_cancellable():
+    clock = FakeClock()
+    budget = IOBudget(100, clock=clock, sleep=clock.sleep)
+    token = CancelToken()
+    token.cancel()
+    with pytest.raises(OperationCancelled):
+        budget.consume(1000, token)
+    assert clock.sleeps == []
+    with pytest.raises(ValueError):
+        IOBudget(0)
+
+
+def test_folder_watcher_waits_for_archives_to_settle(tmp_path):
+    clock = FakeClock()
+    watcher = FolderWatcher(str(tmp_path), settle_seconds=2.0, clock=clock)
+    archive = tmp_path / "drop.zip"
+    archive.write_bytes(b"part")
+    (tmp_path / "notes.txt").write_bytes(b"not an archive")
+
+    assert watcher.scan() == []
+    clock.now += 1.5
+    # Still being copied in: the size changed, so it must settle again
+    archive.write_bytes(b"partial")
+    assert watcher.scan() == []
+    clock.now += 1.5
+    assert watcher.scan() == []
+    clock.now += 0.5
+    assert watcher.scan() == [str(archive)]
+    clock.now += 10
+    assert watcher.scan() == []
+
+    # Replaced by a different archive: reported again once it settles
+    archive.write_bytes(b"another archive")
+    assert watcher.scan() == []
+    clock.now += 2
+    assert watcher.scan() == [str(archive)]
+
+
+def test_folder_watcher_without_settling(tmp_path):
+    watcher = FolderWatcher(str(tmp_path), settle_seconds=0, clock=FakeClock())
+    (tmp_path / "a.zip").write_bytes(b"a")
+    assert watcher.scan() == [str(tmp_path / "a.zip")]
+    assert watcher.scan() == []
+    assert FolderWatcher(str(tmp_path / "missing")).scan() == []
+
+
+def _run(queue, paths):
+    try:
+        added = [queue.add(str(path)) for path in paths]
+        queue.wait(interval=0.01)
+    finally:
+        queue.shutdown()
+    return added
+
+
+def _log(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_queue_extracts_and_logs(make_archive, tmp_path):
+    first = make_archive({"a.txt": b"alpha"}, name="first.zip")
+    second = make_archive({"b.txt": b"beta"}, name="second.zip")
+    results_path = str(tmp_path / "results.jsonl")
+    delivered = []
+    queue = ArchiveQueue(str(tmp_path / "out"), PASSWORD.decode(), "python",
+                         results_path=results_path, on_result=delivered.append)
+
+    assert _run(queue, [first, second, first]) == [True, True, False]
+    assert sorted((r.archive, r.status, r.method) for r in delivered) == [
+        (str(first), "ok", "Python"), (str(second), "ok", "Python")]
+    assert (tmp_path / "out" / "first" / "a.txt").read_bytes() == b"alpha"
+    assert (tmp_path / "out" / "second" / "b.txt").read_bytes() == b"beta"
+    records = _log(results_path)
+    assert {record["archive"] for record in records} == {str(first), str(second)}
+    assert all(record["mtime_ns"] == os.stat(record["archive"]).st_mtime_ns
+               for record in records)
+
+
+def test_queue_resumes_from_the_results_log(make_archive, tmp_path):
+    done = make_archive({"a.txt": b"alpha"}, name="done.zip")
+    changed = make_archive({"b.txt": b"beta"}, name="changed.zip")
+    failed = make_archive({"c.txt": b"gamma"}, name="failed.zip")
+    results_path = str(tmp_path / "results.jsonl")
+    out = str(tmp_path / "out")
+
+    _run(ArchiveQueue(out, PASSWORD.decode(), "python", results_path=results_path),
+         [done, changed])
+    queue = ArchiveQueue(out, "wrong", "python", results_path=results_path)
+    _run(queue, [failed])
+    assert [(r.archive, r.status) for r in queue.results] == [(str(failed), "bad-password")]
+
+    st = os.stat(changed)
+    os.utime(changed, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    queue = ArchiveQueue(out, PASSWORD.decode(), "python", results_path=results_path)
+    # Extracted before and unchanged: skipped. Changed or failed: extracted again
+    assert _run(queue, [done, changed, failed]) == [False, True, True]
+    assert sorted(r.status for r in queue.results) == ["ok", "ok"]
+
+
+def test_output_folders_are_unique(tmp_path):
+    queue = ArchiveQueue(str(tmp_path / "out"))
+    try:
+        outputs = [queue.output_for(str(tmp_path / folder / "data.zip"))
+                   for folder in ("a", "b", "a")]
+    finally:
+        queue.shutdown()
+    out = str(tmp_path / "out")
+    assert outputs == [os.path.join(out, "data"), os.path.join(out, "data-2"),
+                       os.path.join(out, "data")]
+
+
+def _charged(archive, operation):
+    """Bytes the I/O budget was charged for one operation on archive"""
+    clock = FakeClock()
+    archive.io_budget = IOBudget(1000000, burst=1, clock=clock, sleep=clock.sleep)
+    operation()
+    return round(sum(clock.sleeps) * 1000000) + 1
+
+
+def test_pool_runs_are_charged_for_the_entries_they_read(make_archive, tmp_path):
+    contents = {"big.bin": sample_data(200000), "small.txt": b"small\n" * 100}
+    path = make_archive(contents)
+    with zipfile.ZipFile(path) as zip_file:
+        sizes = {info.filename: info.compress_size for info in zip_file.infolist()}
+    archive = Archive(str(path), PASSWORD.decode(), "python", workers=2)
+    out = str(tmp_path / "out")
+
+    assert _charged(archive, archive.test) == sum(sizes.values())
+    assert _charged(archive, lambda: archive.extract(out, ["small.txt"])) == sizes["small.txt"]
+    assert _charged(archive, lambda: archive.extract(out)) == sum(sizes.values())
+
+    # An incremental run pays for the files it extracts again, not the whole archive
+    with open(os.path.join(out, "small.txt"), "r+b") as f:
+        f.write(b"S")
+    assert _charged(archive, lambda: archive.extract(out, incremental=True)) == \
+        sizes["small.txt"]
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Creating AES-256 archives with aeszip.create"""
+
+import zipfile
+
+import pytest
+from conftest import PASSWORD, sample_data
+
+from aeszip.create import collect_files, create_archive
+from aeszip.winzip import AESZipFile, aes_info
+
+
+def _read_all(path):
+    with AESZipFile(path) as zip_file:
+        zip_file.setpassword(PASSWORD)
+        return {zinfo.filename: (aes_info(zinfo), zip_file.read(zinfo))
+                for zinfo in zip_file.infolist()}
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_create_archive_round_trip(tmp_path, workers):
+    source = tmp_path / "docs"
+    (source / "sub").mkdir(parents=True)
+    contents = {"docs/tiny.txt": b"hi", "docs/empty.txt": b"",
+                "docs/sub/big.bin": sample_data(300000, seed=2),
+                "docs/photo.jpg": sample_data(5000, seed=3)}
+    for name, data in contents.items():
+        (tmp_path / name).write_bytes(data)
+    output = tmp_path / "out.zip"
+
+    create_archive(str(output), collect_files([str(source)]), PASSWORD, workers=workers)
+
+    read = _read_all(output)
+    assert {name: data for name, (_, data) in read.items() if not name.endswith("/")} == contents
+    assert "docs/sub/" in read
+    assert read["docs/photo.jpg"][0].compress_type == zipfile.ZIP_STORED
+    assert read["docs/tiny.txt"][0].version == 2
+    assert read["docs/sub/big.bin"][0].version == 1
+    assert not (tmp_path / "out.zip.part").exists()
+
+
+def test_collect_files(tmp_path):
+    source = tmp_path / "docs"
+    source.mkdir()
+    (source / "b.txt").write_bytes(b"b")
+    (source / "a.txt").write_bytes(b"a")
+    (tmp_path / "single.txt").write_bytes(b"single")
+    output = source / "docs.zip"
+    output.write_bytes(b"")
+
+    entries = collect_files([str(source), str(tmp_path / "single.txt")], exclude=[str(output)])
+    assert [zinfo.filename for _, zinfo in entries] == ["docs/", "docs/a.txt", "docs/b.txt",
+                                                        "single.txt"]
+    with pytest.raises(ValueError, match="Two files"):
+        collect_files([str(source / "a.txt"), str(source / "a.txt")])
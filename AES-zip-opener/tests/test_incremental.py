@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Incremental extraction: which files are skipped as already up to date"""
+
+import os
+import zlib
+
+from conftest import PASSWORD, sample_data
+
+from aeszip.core import Archive
+from aeszip.incremental import local_path, plan_incremental
+
+CONTENTS = {"a.txt": b"alpha\n" * 100, "sub/b.bin": sample_data(50000), "tiny.txt": b"tiny"}
+
+
+def _archive(make_archive):
+    return Archive(str(make_archive(CONTENTS)), PASSWORD.decode(), "python")
+
+
+def test_empty_folder_extracts_everything(make_archive, tmp_path):
+    entries, _ = _archive(make_archive).list()
+    plan = plan_incremental(entries, str(tmp_path / "out"))
+    assert sorted(plan.extract) == sorted(CONTENTS)
+    assert (plan.skipped, plan.skipped_bytes) == (0, 0)
+
+
+def test_extracted_files_are_skipped(make_archive, tmp_path):
+    archive = _archive(make_archive)
+    out = str(tmp_path / "out")
+    archive.extract(out)
+    entries, _ = archive.list()
+
+    plan = plan_incremental(entries, out)
+    assert plan.extract == []
+    assert plan.skipped == len(CONTENTS)
+    assert plan.skipped_bytes == sum(len(data) for data in CONTENTS.values())
+
+    assert archive.extract(out, incremental=True) == "none - all files up to date"
+    assert archive.skipped_files == len(CONTENTS)
+
+
+def _rewrite(path, data):
+    """Replace a file's contents but keep its modification time"""
+    st = os.stat(path)
+    with open(path, "wb") as f:
+        f.write(data)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+def test_changed_files_are_extracted_again(make_archive, tmp_path):
+    archive = _archive(make_archive)
+    out = str(tmp_path / "out")
+    archive.extract(out)
+    entries, _ = archive.list()
+
+    # Same size and time, different bytes: only the CRC tells
+    _rewrite(local_path(out, "a.txt"), b"ALPHA\n" * 100)
+    # Different size
+    _rewrite(local_path(out, "sub/b.bin"), b"short")
+    os.remove(local_path(out, "tiny.txt"))
+
+    assert sorted(plan_incremental(entries, out).extract) == sorted(CONTENTS)
+    assert plan_incremental(entries, out, verify_crc=False).extract == ["sub/b.bin", "tiny.txt"]
+
+    archive.extract(out, incremental=True)
+    assert archive.skipped_files == 0
+    with open(local_path(out, "a.txt"), "rb") as f:
+        assert f.read() == CONTENTS["a.txt"]
+
+
+def test_entries_without_crc_compare_size_and_time(make_archive, tmp_path):
+    # Tiny entries are WinZip AE-2, which records no CRC
+    archive = _archive(make_archive)
+    out = str(tmp_path / "out")
+    archive.extract(out)
+    entries = {entry.path: entry for entry in archive.list()[0]}
+    assert entries["tiny.txt"].crc is None
+    assert entries["a.txt"].crc == zlib.crc32(CONTENTS["a.txt"])
+
+    _rewrite(local_path(out, "tiny.txt"), b"TINY")
+    assert plan_incremental([entries["tiny.txt"]], out).skipped == 1
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""The persistent listing index: store, lookup, invalidation and eviction"""
+
+import os
+
+from conftest import PASSWORD
+
+from aeszip.core import Archive, ArchiveEntry
+from aeszip.index import ROW_OVERHEAD, ArchiveIndex
+
+ENTRIES = [ArchiveEntry("a.txt", 10, 5, "AES-256 Deflate", "2024-05-06 07:08", 1234),
+           ArchiveEntry("dir/b.bin", 2000, 2000, "AES-256 Store", "2024-05-06 07:09", None)]
+
+
+def _archive_file(tmp_path, name, size=100):
+    path = tmp_path / name
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def _touch(path, seconds):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + seconds * 10**9))
+
+
+def test_store_and_lookup(tmp_path):
+    index = ArchiveIndex(str(tmp_path / "index.sqlite"))
+    path = _archive_file(tmp_path, "a.zip")
+    assert index.lookup(path) is None
+
+    index.store(path, ENTRIES, "7-Zip")
+    assert index.lookup(path) == (ENTRIES, "7-Zip")
+    # Another handle on the same database sees it too
+    assert ArchiveIndex(str(tmp_path / "index.sqlite")).lookup(path) == (ENTRIES, "7-Zip")
+
+
+def test_changed_archive_misses(tmp_path):
+    index = ArchiveIndex(str(tmp_path / "index.sqlite"))
+    path = _archive_file(tmp_path, "a.zip")
+    index.store(path, ENTRIES, "Python")
+
+    _touch(path, 5)
+    assert index.lookup(path) is None
+    # The stale listing was dropped, so restoring the time does not bring it back
+    _touch(path, -5)
+    assert index.lookup(path) is None
+
+
+def test_missing_archive(tmp_path):
+    index = ArchiveIndex(str(tmp_path / "index.sqlite"))
+    index.store(str(tmp_path / "gone.zip"), ENTRIES, "Python")
+    assert index.lookup(str(tmp_path / "gone.zip")) is None
+
+
+def test_invalidate_and_clear(tmp_path):
+    index = ArchiveIndex(str(tmp_path / "index.sqlite"))
+    first, second = _archive_file(tmp_path, "a.zip"), _archive_file(tmp_path, "b.zip")
+    index.store(first, ENTRIES, "Python")
+    index.store(second, ENTRIES, "Python")
+
+    index.invalidate(first)
+    assert index.lookup(first) is None
+    assert index.lookup(second) is not None
+    index.clear()
+    assert index.lookup(second) is None
+
+
+def _listing_bytes(entries):
+    return sum(len(e.path) + len(e.method) + len(e.modified) + ROW_OVERHEAD for e in entries)
+
+
+def test_least_recently_used_archives_are_evicted(tmp_path):
+    index = ArchiveIndex(str(tmp_path / "index.sqlite"), max_bytes=2 * _listing_bytes(ENTRIES))
+    paths = [_archive_file(tmp_path, f"{name}.zip") for name in "abc"]
+    index.store(paths[0], ENTRIES, "Python")
+    index.store(paths[1], ENTRIES, "Python")
+    # Using a makes b the least recently used
+    assert index.lookup(paths[0]) is not None
+
+    index.store(paths[2], ENTRIES, "Python")
+    assert index.lookup(paths[1]) is None
+    assert index.lookup(paths[0]) is not None
+    assert index.lookup(paths[2]) is not None
+
+
+def test_listing_over_budget_is_not_stored(tmp_path):
+    index = ArchiveIndex(str(tmp_path / "index.sqlite"), max_bytes=_listing_bytes(ENTRIES) - 1)
+    path = _archive_file(tmp_path, "a.zip")
+    index.store(path, ENTRIES, "Python")
+    assert index.lookup(path) is None
+
+
+def test_archive_lists_from_the_index(make_archive, tmp_path):
+    index = ArchiveIndex(str(tmp_path / "index.sqlite"))
+    path = str(make_archive({"a.txt": b"alpha" * 10, "b.txt": b"beta"}))
+
+    entries, method = Archive(path, PASSWORD.decode(), "python", index=index).list()
+    assert method == "Python"
+    cached, method = Archive(path, PASSWORD.decode(), "python", index=index).list()
+    assert method == "Python (cached)"
+    assert cached == entries
+    assert [entry.path for entry in cached] == ["a.txt", "b.txt"]
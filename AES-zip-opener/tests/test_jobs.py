@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Background jobs: cancellation tokens and dispatch through JobScheduler.poll()"""
+
+import threading
+import time
+
+import pytest
+
+from aeszip.core import OperationCancelled
+from aeszip.jobs import CancelToken, Job, JobScheduler
+
+
+class FakeProcess:
+    def __init__(self, running=True):
+        self.running = running
+        self.terminated = False
+
+    def poll(self):
+        return None if self.running else 0
+
+    def terminate(self):
+        self.terminated = True
+
+
+def _poll_until(scheduler, done, timeout=5):
+    """Run poll() on this thread, as a UI loop would, until done() holds"""
+    deadline = time.monotonic() + timeout
+    while not done():
+        assert time.monotonic() < deadline, "timed out waiting for jobs"
+        scheduler.poll()
+        time.sleep(0.005)
+
+
+def test_cancel_token():
+    token = CancelToken()
+    token.check()
+    running, finished = FakeProcess(), FakeProcess(running=False)
+    token.attach(running)
+    token.attach(finished)
+    token.cancel()
+    assert token.cancelled
+    assert running.terminated and not finished.terminated
+    with pytest.raises(OperationCancelled):
+        token.check()
+
+
+def test_attach_after_cancel_terminates_at_once():
+    token = CancelToken()
+    token.cancel()
+    process = FakeProcess()
+    token.attach(process)
+    assert process.terminated
+
+
+def test_detached_process_is_left_alone():
+    token = CancelToken()
+    process = FakeProcess()
+    token.attach(process)
+    token.detach(process)
+    token.cancel()
+    assert not process.terminated
+
+
+def test_callbacks_run_on_the_polling_thread():
+    scheduler = JobScheduler(max_workers=2)
+    events = []
+
+    def work(job):
+        job.report(1)
+        job.report(2)
+        return threading.current_thread().name
+
+    def failing(job):
+        raise ValueError("broken")
+
+    scheduler.submit(Job("ok", work, on_success=lambda result: events.append(("ok", result)),
+                         on_progress=lambda value: events.append(
+                             ("progress", value, threading.current_thread().name))))
+    scheduler.submit(Job("bad", failing, on_error=lambda e: events.append(("error", str(e)))))
+    try:
+        _poll_until(scheduler, lambda: not scheduler.active() and len(events) == 4)
+    finally:
+        scheduler.shutdown()
+
+    me = threading.current_thread().name
+    assert ("progress", 1, me) in events and ("progress", 2, me) in events
+    assert events.index(("progress", 1, me)) < events.index(("progress", 2, me))
+    assert ("error", "broken") in events
+    (result,) = [event[1] for event in events if event[0] == "ok"]
+    assert result.startswith("aeszip-job-")
+
+
+def test_jobs_wait_their_turn_and_cancel():
+    scheduler = JobScheduler(max_workers=1)
+    started = threading.Event()
+    order, errors = [], []
+
+    def blocking(job):
+        started.set()
+        while True:
+            job.token.check()
+            time.sleep(0.005)
+
+    first = scheduler.submit(Job("first", blocking, on_error=errors.append))
+    second = scheduler.submit(Job("second", lambda job: order.append("second")))
+    third = scheduler.submit(Job("third", lambda job: order.append("third"),
+                                 on_error=errors.append))
+    try:
+        assert started.wait(5)
+        assert second.state == Job.QUEUED
+        third.cancel()
+        first.cancel()
+        _poll_until(scheduler, lambda: len(errors) == 2 and order)
+    finally:
+        scheduler.shutdown()
+
+    assert first.state == Job.CANCELLED and third.state == Job.CANCELLED
+    assert second.state == Job.DONE
+    assert order == ["second"]
+    assert len(errors) == 2 and all(isinstance(e, OperationCancelled) for e in errors)
+
+
+def test_poll_limit():
+    scheduler = JobScheduler()
+    reported = threading.Event()
+    progress, results = [], []
+
+    def chatty(job):
+        for i in range(5):
+            job.report(i)
+        reported.set()
+        return "done"
+
+    scheduler.submit(Job("chatty", chatty, on_success=results.append,
+                         on_progress=progress.append))
+    try:
+        assert reported.wait(5)
+        assert scheduler.poll(limit=2) == 2
+        assert progress == [0, 1]
+        _poll_until(scheduler, lambda: results)
+    finally:
+        scheduler.shutdown()
+    assert progress == [0, 1, 2, 3, 4]
+    assert results == ["done"]
+    assert scheduler.active() == []
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""The session cache of PBKDF2-derived AES keys"""
+
+import pickle
+
+import pytest
+from conftest import PASSWORD, sample_data
+
+from aeszip import parallel
+from aeszip.keycache import DerivedKeyCache
+from aeszip.winzip import AESZipFile, derive_keys
+
+
+def test_derive_is_memoized():
+    cache = DerivedKeyCache()
+    keys = cache.derive(b"pw", b"salt" * 4, 32)
+    assert keys == derive_keys(b"pw", b"salt" * 4, 32)
+    assert cache.derive(b"pw", bytearray(b"salt" * 4), 32) is keys
+    assert (cache.hits, cache.misses, len(cache)) == (1, 1, 1)
+
+    # Another password or salt is another key
+    assert cache.derive(b"other", b"salt" * 4, 32) != keys
+    assert cache.derive(b"pw", b"SALT" * 4, 32) != keys
+    assert (cache.hits, cache.misses, len(cache)) == (1, 3, 3)
+
+
+def test_least_recently_used_keys_are_dropped():
+    cache = DerivedKeyCache(max_entries=2)
+    cache.derive(b"pw", b"a" * 16, 32)
+    cache.derive(b"pw", b"b" * 16, 32)
+    cache.derive(b"pw", b"a" * 16, 32)
+    cache.derive(b"pw", b"c" * 16, 32)
+    assert len(cache) == 2
+    cache.derive(b"pw", b"a" * 16, 32)
+    assert cache.misses == 3
+    cache.derive(b"pw", b"b" * 16, 32)
+    assert cache.misses == 4
+
+
+def test_clear():
+    cache = DerivedKeyCache()
+    cache.derive(b"pw", b"a" * 16, 32)
+    cache.clear()
+    assert (len(cache), cache.hits, cache.misses) == (0, 0, 0)
+
+
+def test_preloaded_cache_hits():
+    cache = DerivedKeyCache()
+    keys = cache.derive(b"pw", b"a" * 16, 32)
+    worker = DerivedKeyCache(preload=cache.snapshot())
+    assert worker.derive(b"pw", b"a" * 16, 32) == keys
+    assert (worker.hits, worker.misses) == (1, 0)
+
+
+def test_password_is_never_stored():
+    cache = DerivedKeyCache()
+    cache.derive(b"my secret password", b"a" * 16, 32)
+    assert b"my secret password" not in pickle.dumps(cache.snapshot())
+    assert b"my secret password" not in vars(cache).values()
+
+    # Two caches digest the same password differently
+    other = DerivedKeyCache()
+    other.derive(b"my secret password", b"a" * 16, 32)
+    assert cache.snapshot()[1][0][0] != other.snapshot()[1][0][0]
+
+
+def test_archive_handles_share_the_cache(make_archive):
+    path = make_archive({f"f{i}.txt": sample_data(100, seed=i) for i in range(5)})
+    cache = DerivedKeyCache()
+    for _ in range(2):
+        with AESZipFile(path) as zip_file:
+            zip_file.key_cache = cache
+            zip_file.setpassword(PASSWORD)
+            assert zip_file.testzip() is None
+    assert (cache.misses, cache.hits) == (5, 5)
+
+
+def test_keys_derived_from_a_snapshot_are_merged_back():
+    cache = DerivedKeyCache()
+    preloaded = cache.derive(b"pw", b"a" * 16, 32)
+    worker = DerivedKeyCache(preload=cache.snapshot())
+    worker.derive(b"pw", b"a" * 16, 32)
+    derived = worker.derive(b"pw", b"b" * 16, 32)
+    items = worker.take_derived()
+    assert len(items) == 1 and worker.take_derived() == []
+
+    cache.merge(items)
+    assert cache.derive(b"pw", b"b" * 16, 32) == derived
+    assert cache.derive(b"pw", b"a" * 16, 32) == preloaded
+    assert (len(cache), cache.misses, cache.hits) == (2, 1, 2)
+    assert cache.take_derived() == []
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_pool_workers_fill_the_cache(make_archive, workers):
+    path = make_archive({f"f{i}.txt": sample_data(100, seed=i) for i in range(12)})
+    cache = DerivedKeyCache()
+    results = parallel.test_parallel(str(path), PASSWORD, workers=workers, key_cache=cache)
+    assert all(result.status == "ok" for result in results)
+    assert len(cache) == 12
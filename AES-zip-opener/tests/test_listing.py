@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Parsing `7z l -slt` listings, as streamed from a running 7-Zip"""
+
+import io
+
+from aeszip.core import iter_7zip_listing, parse_7zip_listing
+
+TRANSCRIPT = """\
+7-Zip [64] 16.02 : Copyright (c) 1999-2016 Igor Pavlov : 2016-05-21
+p7zip Version 16.02 (locale=C.UTF-8,Utf16=on,HugeFiles=on,64 bits,8 CPUs)
+
+Scanning the drive for archives:
+1 file, 4821 bytes (5 KiB)
+
+Listing archive: test.zip
+
+--
+Path = test.zip
+Type = zip
+Physical Size = 4821
+
+----------
+Path = docs
+Folder = +
+Size = 0
+Packed Size = 0
+Modified = 2024-05-06 07:08:10
+Attributes = D drwxr-xr-x
+Encrypted = -
+CRC =
+Method = Store
+
+Path = docs/report.txt
+Folder = -
+Size = 12345
+Packed Size = 4567
+Modified = 2024-05-06 07:08:10
+Attributes = _ -rw-r--r--
+Encrypted = +
+CRC = 1A2B3C4D
+Method = AES-256 Deflate
+
+Path = old/
+Size = 0
+Packed Size = 0
+Attributes = D
+
+Path = empty.txt
+Folder = -
+Size = 0
+Packed Size = 28
+Modified = 2023-12-31 23:59:58
+Encrypted = +
+Method = AES-256 Store
+"""
+
+
+def _summary(entries):
+    return [(e.path, e.size, e.packed, e.method, e.modified) for e in entries]
+
+
+def test_files_are_listed_and_folders_skipped():
+    assert _summary(parse_7zip_listing(TRANSCRIPT)) == [
+        ("docs/report.txt", 12345, 4567, "AES-256 Deflate", "2024-05-06 07:08:10"),
+        ("empty.txt", 0, 28, "AES-256 Store", "2023-12-31 23:59:58"),
+    ]
+
+
+def test_streamed_lines_with_windows_line_ends():
+    stream = io.StringIO(TRANSCRIPT.replace("\n", "\r\n"), newline="")
+    assert _summary(iter_7zip_listing(stream)) == _summary(parse_7zip_listing(TRANSCRIPT))
+
+
+def test_entries_arrive_before_the_listing_ends():
+    lines = iter(TRANSCRIPT.splitlines())
+    entries = iter_7zip_listing(lines)
+    assert next(entries).path == "docs/report.txt"
+    # The second entry has not been read yet
+    assert any(line.startswith("Path = empty.txt") for line in lines)
+
+
+def test_missing_fields_and_no_entries():
+    listing = "----------\nPath = a.bin\nSize = ?\n"
+    assert _summary(parse_7zip_listing(listing)) == [("a.bin", 0, 0, "Unknown", "Unknown")]
+    assert parse_7zip_listing("Path = archive.zip\nType = zip\n") == []
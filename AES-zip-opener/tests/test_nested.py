@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Nested extraction and its zip bomb guards"""
+
+import zipfile
+
+import pytest
+from conftest import PASSWORD, sample_data, understate_size
+
+from aeszip.core import Archive, ZipBombError
+from aeszip.nested import RATIO_MIN_BYTES, NestedLimits
+
+
+def _extract(path, out, limits=None):
+    archive = Archive(str(path), PASSWORD.decode(), "python")
+    archive.nested_limits = limits
+    method = archive.extract(str(out), nested=True)
+    return archive, method
+
+
+def test_inner_archives_become_folders(make_archive, tmp_path):
+    inner = make_archive({"a.txt": b"alpha", "sub/b.txt": b"beta"}, name="inner.zip")
+    outer = make_archive({"docs/inner.zip": inner.read_bytes(), "top.txt": b"top",
+                          "fake.zip": b"named like an archive, but is not one"},
+                         name="outer.zip")
+    out = tmp_path / "out"
+
+    archive, method = _extract(outer, out)
+    assert method == "Python (nested)"
+    assert archive.nested_archives == 1
+    assert (out / "docs" / "inner" / "a.txt").read_bytes() == b"alpha"
+    assert (out / "docs" / "inner" / "sub" / "b.txt").read_bytes() == b"beta"
+    assert not (out / "docs" / "inner.zip").exists()
+    assert (out / "top.txt").read_bytes() == b"top"
+    assert (out / "fake.zip").read_bytes() == b"named like an archive, but is not one"
+
+
+def test_archives_below_max_depth_are_written_as_files(make_archive, tmp_path):
+    deepest = make_archive({"deep.txt": b"deep"}, name="deepest.zip")
+    middle = make_archive({"deepest.zip": deepest.read_bytes()}, name="middle.zip")
+    outer = make_archive({"middle.zip": middle.read_bytes()}, name="outer.zip")
+    out = tmp_path / "out"
+
+    archive, _ = _extract(outer, out, NestedLimits(max_depth=1))
+    assert archive.nested_archives == 1
+    assert (out / "middle" / "deepest.zip").read_bytes() == deepest.read_bytes()
+
+    archive, _ = _extract(outer, tmp_path / "all")
+    assert archive.nested_archives == 2
+    assert (tmp_path / "all" / "middle" / "deepest" / "deep.txt").read_bytes() == b"deep"
+
+
+def test_entry_ratio_guard(make_archive, tmp_path):
+    bomb = make_archive({"zeros.bin": bytes(2 * RATIO_MIN_BYTES)}, name="bomb.zip")
+    outer = make_archive({"bomb.zip": bomb.read_bytes()}, zipfile.ZIP_STORED, name="outer.zip")
+    with pytest.raises(ZipBombError, match=r"outer.zip/bomb.zip: zeros.bin would expand"):
+        _extract(outer, tmp_path / "out")
+    assert not (tmp_path / "out" / "bomb" / "zeros.bin").exists()
+
+    # Small entries are never refused for their ratio
+    small = make_archive({"zeros.bin": bytes(RATIO_MIN_BYTES - 1)}, name="small.zip")
+    _extract(small, tmp_path / "small")
+    assert (tmp_path / "small" / "zeros.bin").stat().st_size == RATIO_MIN_BYTES - 1
+
+
+def test_total_output_cap(make_archive, tmp_path):
+    # Each entry compresses about 2:1 and is too small for the per-entry guard
+    contents = {f"f{i}.bin": sample_data(RATIO_MIN_BYTES - 1, seed=i) for i in range(4)}
+    path = make_archive(contents)
+    with pytest.raises(ZipBombError, match=r"over 1.5x the archive size"):
+        _extract(path, tmp_path / "out", NestedLimits(max_ratio=1.5))
+    _extract(path, tmp_path / "all", NestedLimits(max_ratio=3))
+    assert len(list((tmp_path / "all").iterdir())) == 4
+
+
+def test_declared_size_overrun(make_archive, tmp_path):
+    path = make_archive({"liar.bin": sample_data(50000)})
+    understate_size(path, "liar.bin", 1000)
+    with pytest.raises(ZipBombError, match=r"liar.bin expands beyond the 1000 bytes"):
+        _extract(path, tmp_path / "out")
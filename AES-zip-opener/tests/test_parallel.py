@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Batch planning and extraction across a process pool"""
+
+import zipfile
+
+import pytest
+from conftest import PASSWORD, sample_data, tamper
+
+from aeszip import parallel
+from aeszip.core import Archive
+from aeszip.parallel import BATCH_BYTES, BATCH_ENTRIES, extract_parallel, plan_batches
+
+
+def _info(name, size):
+    zinfo = zipfile.ZipInfo(name)
+    zinfo.file_size = size
+    return zinfo
+
+
+def test_plan_batches_largest_first():
+    infos = [_info(f"small{i}", 10) for i in range(3)] + [_info("big", 100), _info("mid", 60)]
+    assert plan_batches(infos, batch_bytes=80) == [["big"], ["mid", "small0", "small1"],
+                                                   ["small2"]]
+
+
+def test_plan_batches_caps_entries():
+    infos = [_info(f"f{i}", 100) for i in range(1000)]
+    batches = plan_batches(infos)
+    assert len(batches) == -(-1000 // BATCH_ENTRIES)
+    assert all(len(batch) <= BATCH_ENTRIES for batch in batches)
+
+
+@pytest.mark.parametrize("workers", [2, 4])
+def test_plan_batches_spreads_small_entries_across_workers(workers):
+    # Far below BATCH_BYTES and BATCH_ENTRIES, yet every worker gets a share
+    infos = [_info(f"f{i}", 100) for i in range(40)]
+    assert plan_batches(infos) == [[info.filename for info in infos]]
+    batches = plan_batches(infos, workers=workers)
+    assert len(batches) >= workers
+    assert sorted(name for batch in batches for name in batch) == sorted(i.filename for i in infos)
+    assert plan_batches(infos[:1], workers=workers) == [["f0"]]
+
+
+def test_plan_batches_empty():
+    assert plan_batches([]) == []
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_extract_parallel(make_archive, tmp_path, workers):
+    # Two entries of a batch each, so the pool really gets two batches
+    contents = {"big1.bin": sample_data(BATCH_BYTES + 1, seed=1),
+                "dir/big2.bin": sample_data(BATCH_BYTES + 2, seed=2),
+                "dir/sub/small.txt": b"small\n" * 10}
+    path = make_archive(contents)
+    out = tmp_path / "out"
+
+    written = extract_parallel(str(path), PASSWORD, str(out), workers=workers)
+
+    assert written == sum(len(data) for data in contents.values())
+    for name, data in contents.items():
+        assert (out / name).read_bytes() == data
+
+
+def test_extract_parallel_members(make_archive, tmp_path):
+    path = make_archive({"a.txt": b"a" * 100, "b.txt": b"b" * 100})
+    out = tmp_path / "out"
+    extract_parallel(str(path), PASSWORD, str(out), members=["b.txt"], workers=2)
+    assert sorted(p.name for p in out.iterdir()) == ["b.txt"]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parallel_reports_every_entry(make_archive, workers):
+    contents = {f"f{i}.bin": sample_data(BATCH_BYTES // 2, seed=i) for i in range(4)}
+    path = make_archive(contents, zipfile.ZIP_STORED)
+    tamper(path, "f2.bin")
+
+    results = parallel.test_parallel(str(path), PASSWORD, workers=workers)
+    assert [(r.name, r.status) for r in results] == [
+        ("f0.bin", "ok"), ("f1.bin", "ok"), ("f2.bin", "bad-hmac"), ("f3.bin", "ok")]
+    assert results[0].bytes == BATCH_BYTES // 2 and results[0].error is None
+    assert "HMAC" in results[2].error
+
+
+def test_parallel_wrong_password(make_archive):
+    path = make_archive({"a.txt": b"a" * 100, "b.txt": b"b" * 100})
+    results = parallel.test_parallel(str(path), b"wrong", workers=1)
+    assert [r.status for r in results] == ["bad-password", "bad-password"]
+
+
+@pytest.mark.parametrize("workers, started", [(1, 0), (2, 2), (8, 4)])
+def test_archive_reports_pool_workers(make_archive, tmp_path, workers, started):
+    path = str(make_archive({f"f{i}.txt": b"data" * 10 for i in range(4)}))
+    archive = Archive(path, PASSWORD.decode(), "python", workers=workers)
+    assert archive.test()[0]
+    assert archive.pool_workers == started
+    archive.extract(str(tmp_path / "out"))
+    assert archive.pool_workers == started
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Progress tracking and parsing of 7-Zip's redrawn progress line"""
+
+import io
+
+import pytest
+
+from aeszip.progress import ProgressTracker, format_duration, format_progress, \
+    iter_7zip_progress
+
+# What 7-Zip -bsp1 writes to a pipe: each update erases the last with backspaces
+REDRAWN = ("\b\b\b\b    \b\b\b\b  0%"
+           "\b\b\b\b    \b\b\b\b  7% 2 - docs/report.txt"
+           + "\b" * 26 + " " * 26 + "\b" * 26 + " 42% 15 - big.bin"
+           + "\b" * 17 + " " * 17 + "\b" * 17 + "100% 20\r\n"
+           "Everything is Ok\r\n")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 256])
+def test_backspace_redraws(chunk_size):
+    assert list(iter_7zip_progress(io.StringIO(REDRAWN), chunk_size)) == [
+        (0, None), (7, 2), (42, 15), (100, 20)]
+
+
+def test_carriage_returns_and_last_line_without_newline():
+    stream = io.StringIO("  5% 1\r 60% 3\r 99% 4")
+    assert list(iter_7zip_progress(stream, chunk_size=4)) == [(5, 1), (60, 3), (99, 4)]
+
+
+def test_other_output_is_ignored():
+    stream = io.StringIO("7-Zip 23.01\nScanning the drive:\n1 file, 100 bytes\n\nWarnings: 0\n")
+    assert list(iter_7zip_progress(stream)) == []
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_snapshot_rates_and_eta():
+    clock = FakeClock()
+    tracker = ProgressTracker(total_bytes=400 * 1024 * 1024, total_entries=10,
+                              clock=clock, measure_cpu=False)
+    clock.now += 2
+    tracker.add_bytes(100 * 1024 * 1024)
+    tracker.add_entries(4)
+
+    snapshot = tracker.snapshot()
+    assert snapshot.percent == 25.0
+    assert snapshot.mb_per_s == 50.0
+    assert snapshot.entries_per_s == 2.0
+    assert snapshot.eta_seconds == 6.0
+    assert snapshot.cpu_percent is None
+    assert format_progress(snapshot) == "25% - 50.0 MB/s - 2 files/s - ETA 0:06"
+
+
+def test_percent_only_progress():
+    tracker = ProgressTracker(measure_cpu=False)
+    assert tracker.snapshot().percent is None
+    tracker.set_percent(30, entries_done=3)
+    assert tracker.snapshot().percent == 30.0
+    assert tracker.entries_done == 3
+
+    sized = ProgressTracker(total_bytes=1000, measure_cpu=False)
+    sized.set_percent(30)
+    assert sized.bytes_done == 300
+
+
+def test_reports_are_throttled():
+    clock = FakeClock()
+    reports = []
+    tracker = ProgressTracker(reports.append, total_bytes=100, interval=0.5, clock=clock,
+                              measure_cpu=False)
+    tracker.add_bytes(10)
+    tracker.add_bytes(10)
+    clock.now += 0.2
+    tracker.add_bytes(10)
+    clock.now += 0.4
+    tracker.add_bytes(10)
+    assert [report.bytes_done for report in reports] == [10, 40]
+    tracker.finish()
+    assert reports[-1].bytes_done == 40 and len(reports) == 3
+
+
+def test_format_duration():
+    assert format_duration(5) == "0:05"
+    assert format_duration(125.9) == "2:05"
+    assert format_duration(3 * 3600 + 61) == "3:01:01"
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Converting archives with aeszip.repack, including damaged ones"""
+
+import tarfile
+import zipfile
+
+import pytest
+from conftest import PASSWORD, sample_data, tamper, understate_size
+
+from aeszip.repack import FORMAT_TAR, FORMAT_ZIP, FORMAT_ZIP_AES, repack
+from aeszip.winzip import AESZipFile
+
+CONTENTS = {"dir/small.txt": b"hello\n" * 10, "dir/big.bin": sample_data(300000)}
+
+
+def _repack(path, output, fmt, new_password=None):
+    with AESZipFile(path) as zip_file:
+        zip_file.setpassword(PASSWORD)
+        repack(zip_file, str(output), fmt, new_password)
+
+
+def test_to_tar(make_archive, tmp_path):
+    output = tmp_path / "out.tar"
+    _repack(make_archive(CONTENTS), output, FORMAT_TAR)
+    with tarfile.open(output) as tar:
+        assert {member.name: tar.extractfile(member).read() for member in tar} == CONTENTS
+
+
+@pytest.mark.parametrize("fmt", [FORMAT_ZIP, FORMAT_ZIP_AES])
+def test_to_zip(make_archive, tmp_path, fmt):
+    output = tmp_path / "out.zip"
+    new_password = b"new password" if fmt == FORMAT_ZIP_AES else None
+    _repack(make_archive(CONTENTS), output, fmt, new_password)
+    with AESZipFile(output) as zip_file:
+        zip_file.setpassword(new_password)
+        assert {name: zip_file.read(name) for name in zip_file.namelist()} == CONTENTS
+        assert bool(zip_file.getinfo("dir/big.bin").flag_bits & 0x1) == bool(new_password)
+
+
+# The writer must be finished before the output is discarded, not flush into it later
+@pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")
+@pytest.mark.parametrize("fmt", [FORMAT_TAR, FORMAT_ZIP, FORMAT_ZIP_AES])
+def test_tampered_entry_fails_conversion(make_archive, tmp_path, fmt):
+    path = make_archive(CONTENTS, zipfile.ZIP_STORED)
+    tamper(path, "dir/big.bin")
+    output = tmp_path / "out"
+    with pytest.raises(zipfile.BadZipFile, match="Bad HMAC"):
+        _repack(path, output, fmt, b"new password")
+    assert not output.exists()
+    assert not (tmp_path / "out.part").exists()
+
+
+def test_entry_longer_than_declared_fails_tar_conversion(make_archive, tmp_path):
+    path = make_archive(CONTENTS)
+    understate_size(path, "dir/big.bin", 1000)
+    output = tmp_path / "out.tar"
+    with pytest.raises(zipfile.BadZipFile, match="longer than its header declares"):
+        _repack(path, output, FORMAT_TAR)
+    assert not output.exists()
+
+
+@pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")
+@pytest.mark.parametrize("fmt", [FORMAT_TAR, FORMAT_ZIP, FORMAT_ZIP_AES])
+def test_wrong_password_fails_conversion(make_archive, tmp_path, fmt):
+    output = tmp_path / "out"
+    with AESZipFile(make_archive(CONTENTS)) as zip_file:
+        zip_file.setpassword(b"wrong")
+        with pytest.raises(RuntimeError, match="Bad password"):
+            repack(zip_file, str(output), fmt, b"new password")
+    assert not output.exists()
+    assert not (tmp_path / "out.part").exists()
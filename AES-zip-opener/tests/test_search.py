@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Searching entry contents: matches must be found wherever chunks are cut"""
+
+import io
+import re
+
+import pytest
+from conftest import PASSWORD, sample_data
+
+from aeszip.search import DEFAULT_WINDOW, compile_pattern, iter_search, search_stream
+
+
+def _offsets(data, pattern, regex=False, ignore_case=False, chunk_size=7, window=DEFAULT_WINDOW):
+    compiled, overlap = compile_pattern(pattern, regex, ignore_case)
+    matches, truncated = search_stream(io.BytesIO(data), compiled, overlap, window,
+                                       chunk_size=chunk_size)
+    assert not truncated
+    return [(match.offset, match.length) for match in matches]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 16, 1024])
+def test_literal_across_chunk_boundaries(chunk_size):
+    data = b"..needle...needleneedle.." + b"x" * 50 + b"needle"
+    expected = [(m.start(), 6) for m in re.finditer(b"needle", data)]
+    assert _offsets(data, "needle", chunk_size=chunk_size) == expected
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 9, 64])
+def test_regex_across_chunk_boundaries(chunk_size):
+    data = b"id=12345; id=7; x" * 20
+    expected = [(m.start(), m.end() - m.start()) for m in re.finditer(rb"id=\d+", data)]
+    assert _offsets(data, r"id=\d+", regex=True, chunk_size=chunk_size) == expected
+
+
+def test_match_as_long_as_the_window():
+    data = b"a" * 10 + b"<" + b"b" * 62 + b">" + b"c" * 10
+    assert _offsets(data, "<b+>", regex=True, chunk_size=5, window=64) == [(10, 64)]
+
+
+def test_ignore_case_and_context():
+    compiled, overlap = compile_pattern("Invoice", ignore_case=True)
+    data = b"first line\nthe INVOICE number\nlast"
+    matches, _ = search_stream(io.BytesIO(data), compiled, overlap, chunk_size=4)
+    assert [match.offset for match in matches] == [data.index(b"INVOICE")]
+    assert "line the INVOICE" in matches[0].context
+    assert "\n" not in matches[0].context
+
+
+def test_max_matches_truncates():
+    compiled, overlap = compile_pattern("ab")
+    matches, truncated = search_stream(io.BytesIO(b"ab" * 100), compiled, overlap,
+                                       max_matches=5, chunk_size=3)
+    assert [match.offset for match in matches] == [0, 2, 4, 6, 8]
+    assert truncated
+
+
+def test_empty_pattern_is_rejected():
+    with pytest.raises(ValueError):
+        compile_pattern("")
+    with pytest.raises(ValueError, match="Invalid regular expression"):
+        compile_pattern("(", regex=True)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_search_encrypted_archive(make_archive, workers):
+    big = sample_data(3 * 1024 * 1024)
+    # Straddles the 1 MB read chunk
+    big = big[:1024 * 1024 - 3] + b"needle" + big[1024 * 1024 + 3:]
+    path = make_archive({"big.bin": big, "a.txt": b"no match", "b.txt": b"a needle here"})
+    compiled, overlap = compile_pattern("needle")
+
+    results = {result.name: result
+               for batch in iter_search(str(path), PASSWORD, compiled, overlap, workers=workers)
+               for result in batch}
+
+    assert sorted(results) == ["b.txt", "big.bin"]
+    assert [m.offset for m in results["b.txt"].matches] == [2]
+    assert 1024 * 1024 - 3 in [m.offset for m in results["big.bin"].matches]
+    assert all(result.error is None for result in results.values())
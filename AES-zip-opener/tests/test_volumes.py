@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Split archives: plain .001 pieces and spanned .z01 volumes"""
+
+import os
+import zipfile
+
+import pytest
+from conftest import PASSWORD, sample_data
+
+from aeszip.mapped import open_zip
+from aeszip.volumes import SplitZipFile, archive_key, archive_size, find_volumes, \
+    is_zip_archive
+
+CONTENTS = {f"dir/f{i}.txt": f"file {i}\n".encode() * (i + 1) for i in range(20)}
+CONTENTS["big.bin"] = sample_data(250000)
+
+
+def _split(path, piece_size):
+    """Cut an archive into name.zip.001, .002, ... like 7-Zip or split -b"""
+    raw = path.read_bytes()
+    pieces = []
+    for number, start in enumerate(range(0, len(raw), piece_size), 1):
+        piece = path.with_name(f"{path.name}.{number:03d}")
+        piece.write_bytes(raw[start:start + piece_size])
+        pieces.append(piece)
+    path.unlink()
+    return pieces
+
+
+def _read_all(path):
+    with open_zip(str(path)) as zip_file:
+        assert isinstance(zip_file, SplitZipFile)
+        zip_file.setpassword(PASSWORD)
+        assert zip_file.testzip() is None
+        return {name: zip_file.read(name) for name in zip_file.namelist()}
+
+
+@pytest.mark.parametrize("piece_size", [4096, 100000])
+def test_numbered_pieces(make_archive, piece_size):
+    pieces = _split(make_archive(CONTENTS), piece_size)
+    assert len(pieces) > 1
+    for piece in (pieces[0], pieces[-1]):
+        assert find_volumes(str(piece)) == [str(p) for p in pieces]
+        assert is_zip_archive(str(piece))
+        assert _read_all(piece) == CONTENTS
+
+
+@pytest.mark.parametrize("volume_size", [4096, 100000])
+def test_spanned_volumes(make_archive, make_spanned, volume_size):
+    volumes = make_spanned(make_archive(CONTENTS, zipfile.ZIP_STORED), volume_size)
+    assert volumes[0].name == "test.z01" and volumes[-1].name == "test.zip"
+    for volume in (volumes[0], volumes[-1]):
+        assert find_volumes(str(volume)) == [str(v) for v in volumes]
+        assert _read_all(volume) == CONTENTS
+
+
+def test_missing_volume(make_archive, make_spanned):
+    volumes = make_spanned(make_archive(CONTENTS, zipfile.ZIP_STORED), 4096)
+    volumes[-1].unlink()
+    with pytest.raises(zipfile.BadZipFile, match="Last volume"):
+        find_volumes(str(volumes[0]))
+    assert not is_zip_archive(str(volumes[0]))
+
+
+def test_lone_piece_is_not_split(make_archive):
+    path = make_archive(CONTENTS)
+    single = path.with_name("single.zip.001")
+    path.rename(single)
+    assert find_volumes(str(single)) is None
+    assert find_volumes(str(single.with_name("other.zip"))) is None
+
+
+def test_archive_key_covers_every_volume(make_archive):
+    pieces = _split(make_archive(CONTENTS), 4096)
+    key = archive_key(str(pieces[0]))
+    assert key[1] == archive_size(str(pieces[0])) == sum(p.stat().st_size for p in pieces)
+
+    st = pieces[-1].stat()
+    os.utime(pieces[-1], ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert archive_key(str(pieces[0])) != key
+    assert archive_key(str(pieces[0].with_name("gone.zip"))) is None
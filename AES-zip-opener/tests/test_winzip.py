@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Reading WinZip AES entries with aeszip.winzip"""
+
+import zipfile
+
+import pytest
+from conftest import PASSWORD, sample_data, tamper
+
+from aeszip.core import Archive, PasswordError
+from aeszip.winzip import AESZipFile, aes_info
+
+METHODS = [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED, zipfile.ZIP_BZIP2, zipfile.ZIP_LZMA]
+
+# WinZip writes AE-2 below 20 bytes and AE-1 from there on
+SIZES = {2: 19, 1: 200000}
+
+
+def _read_all(path, pwd=PASSWORD):
+    with AESZipFile(path) as zip_file:
+        zip_file.setpassword(pwd)
+        return {zinfo.filename: (aes_info(zinfo), zip_file.read(zinfo))
+                for zinfo in zip_file.infolist()}
+
+
+@pytest.mark.parametrize("compress_type", METHODS)
+@pytest.mark.parametrize("version", [1, 2])
+def test_round_trip(make_archive, compress_type, version):
+    data = sample_data(SIZES[version])
+    path = make_archive({"entry.bin": data}, compress_type)
+
+    info, read = _read_all(path)["entry.bin"]
+    assert read == data
+    assert info.version == version
+    assert info.compress_type == compress_type
+
+
+def test_small_reads_and_extract(make_archive, tmp_path):
+    data = sample_data(150000)
+    path = make_archive({"dir/entry.bin": data, "other.txt": b"other"})
+    with AESZipFile(path) as zip_file:
+        zip_file.setpassword(PASSWORD)
+        with zip_file.open("dir/entry.bin") as f:
+            chunks = iter(lambda: f.read(1000), b"")
+            assert b"".join(chunks) == data
+        zip_file.extractall(tmp_path / "out")
+        assert zip_file.testzip() is None
+    assert (tmp_path / "out" / "dir" / "entry.bin").read_bytes() == data
+    assert (tmp_path / "out" / "other.txt").read_bytes() == b"other"
+
+
+def test_wrong_password(make_archive):
+    path = make_archive({"entry.bin": sample_data(1000)})
+    with AESZipFile(path) as zip_file:
+        with pytest.raises(RuntimeError, match="Bad password"):
+            zip_file.read("entry.bin", pwd=b"wrong")
+        with pytest.raises(RuntimeError, match="password required"):
+            zip_file.read("entry.bin")
+
+
+@pytest.mark.parametrize("version", [1, 2])
+def test_tampered_data_fails_hmac(make_archive, version):
+    path = make_archive({"entry.bin": sample_data(SIZES[version])}, zipfile.ZIP_STORED)
+    tamper(path, "entry.bin")
+    with AESZipFile(path) as zip_file:
+        zip_file.setpassword(PASSWORD)
+        with pytest.raises(zipfile.BadZipFile, match="Bad HMAC"):
+            zip_file.read("entry.bin")
+        assert zip_file.testzip() == "entry.bin"
+
+
+def test_check_password(make_archive):
+    path = make_archive({"big.bin": sample_data(100000), "small.txt": b"small but AE-1"})
+    with AESZipFile(path) as zip_file:
+        with pytest.raises(RuntimeError, match="Bad password"):
+            zip_file.check_password(b"wrong")
+        with pytest.raises(RuntimeError, match="password required"):
+            zip_file.check_password()
+        # The smallest entry is read in full to confirm the key
+        assert zip_file.check_password(PASSWORD) == "small.txt"
+
+
+def test_check_password_catches_a_bad_entry(make_archive):
+    path = make_archive({"entry.bin": sample_data(1000)}, zipfile.ZIP_STORED)
+    tamper(path, "entry.bin")
+    with AESZipFile(path) as zip_file, pytest.raises(zipfile.BadZipFile):
+        zip_file.check_password(PASSWORD)
+
+
+def test_nothing_encrypted(tmp_path):
+    path = tmp_path / "plain.zip"
+    with zipfile.ZipFile(path, "w") as zip_file:
+        zip_file.writestr("a.txt", b"plain")
+    with AESZipFile(path) as zip_file:
+        assert zip_file.check_password() is None
+
+
+def test_archive_verify_password(make_archive, tmp_path):
+    path = str(make_archive({"entry.bin": sample_data(1000)}))
+    assert Archive(path, PASSWORD.decode(), "python").verify_password()
+    with pytest.raises(PasswordError, match="Incorrect password"):
+        Archive(path, "wrong", "python").verify_password()
+    with pytest.raises(PasswordError):
+        Archive(path, "", "python").verify_password()
+    assert not Archive(path, "", "python").verify_password(required=False)
+    (tmp_path / "not.zip").write_bytes(b"not a zip")
+    assert not Archive(str(tmp_path / "not.zip"), "pw", "python").verify_password()
+
+
+def test_reading_exactly_file_size_authenticates(make_archive):
+    # Readers such as tarfile stop at the declared size; the last bytes must
+    # not be handed out before the authentication code has been checked
+    data = sample_data(200000)
+    path = make_archive({"entry.bin": data}, zipfile.ZIP_STORED)
+    tamper(path, "entry.bin")
+    remaining = len(data)
+    with AESZipFile(path) as zip_file:
+        zip_file.setpassword(PASSWORD)
+        with zip_file.open("entry.bin") as f, pytest.raises(zipfile.BadZipFile, match="Bad HMAC"):
+            while remaining:
+                remaining -= len(f.read(min(remaining, 65536)))
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Writing AES-256, ZipCrypto and plain entries with aeszip.writer"""
+
+import zipfile
+
+import pytest
+from conftest import PASSWORD, sample_data
+
+from aeszip.winzip import AESZipFile, aes_info
+from aeszip.writer import AE2_THRESHOLD, ENCRYPTION_NONE, ENCRYPTION_ZIPCRYPTO, AESZipWriter, \
+    encode_entry
+
+METHODS = [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED, zipfile.ZIP_BZIP2, zipfile.ZIP_LZMA]
+
+# AE-2 below AE2_THRESHOLD bytes, AE-1 from there on
+SIZES = {2: AE2_THRESHOLD - 1, 1: 200000}
+
+
+def _write(path, entries, compress_type=zipfile.ZIP_DEFLATED, **kwargs):
+    with AESZipWriter(path, "w") as zip_file:
+        zip_file.setpassword(PASSWORD)
+        for arcname, data in entries.items():
+            zip_file.writestr_encrypted(arcname, data, compress_type, **kwargs)
+    return path
+
+
+def _read_all(path, pwd=PASSWORD):
+    with AESZipFile(path) as zip_file:
+        zip_file.setpassword(pwd)
+        return {zinfo.filename: (aes_info(zinfo), zip_file.read(zinfo))
+                for zinfo in zip_file.infolist()}
+
+
+@pytest.mark.parametrize("compress_type", METHODS)
+@pytest.mark.parametrize("version", [1, 2])
+def test_writestr_round_trip(tmp_path, compress_type, version):
+    data = sample_data(SIZES[version])
+    path = _write(tmp_path / "test.zip", {"entry.bin": data}, compress_type)
+
+    info, read = _read_all(path)["entry.bin"]
+    assert read == data
+    assert info.version == version
+    assert info.compress_type == compress_type
+
+
+@pytest.mark.parametrize("compress_type", METHODS)
+@pytest.mark.parametrize("version", [1, 2])
+def test_streamed_round_trip(tmp_path, compress_type, version):
+    data = sample_data(SIZES[version], seed=1)
+    path = tmp_path / "streamed.zip"
+    with AESZipWriter(path, "w") as zip_file:
+        zip_file.setpassword(PASSWORD)
+        zinfo = zipfile.ZipInfo("entry.bin")
+        zinfo.file_size = len(data)
+        with zip_file.open_encrypted(zinfo, compress_type) as target:
+            for i in range(0, len(data), 7000):
+                target.write(data[i:i + 7000])
+
+    info, read = _read_all(path)["entry.bin"]
+    assert read == data
+    assert info.version == version
+
+
+@pytest.mark.parametrize("encryption", [ENCRYPTION_ZIPCRYPTO, ENCRYPTION_NONE])
+def test_stdlib_reads_other_encryptions(tmp_path, encryption):
+    contents = {"a.txt": b"alpha\n" * 100, "b.bin": sample_data(5000)}
+    path = _write(tmp_path / "test.zip", contents, encryption=encryption)
+    with zipfile.ZipFile(path) as zip_file:
+        zip_file.setpassword(PASSWORD)
+        assert {name: zip_file.read(name) for name in zip_file.namelist()} == contents
+        assert zip_file.testzip() is None
+
+
+def test_stdlib_reads_structure(tmp_path):
+    # Not decryptable by zipfile, but the layout must be a valid ZIP
+    path = _write(tmp_path / "test.zip", {"a.txt": b"a" * 100, "b.txt": b"b",
+                                          "ü.txt": b"unicode"})
+    with zipfile.ZipFile(path) as zip_file:
+        assert zip_file.namelist() == ["a.txt", "b.txt", "ü.txt"]
+        assert all(zinfo.flag_bits & 0x1 for zinfo in zip_file.infolist())
+        assert zip_file.getinfo("ü.txt").flag_bits & 0x800
+
+
+def test_encode_entry_errors():
+    with pytest.raises(ValueError, match="password is required"):
+        encode_entry(b"data")
+    with pytest.raises(ValueError, match="Unknown encryption"):
+        encode_entry(b"data", PASSWORD, encryption="rot13")
+
+
+def test_duplicate_name(tmp_path):
+    with AESZipWriter(tmp_path / "test.zip", "w") as zip_file:
+        zip_file.setpassword(PASSWORD)
+        zip_file.writestr_encrypted("a.txt", b"first")
+        with pytest.raises(ValueError, match="Duplicate name"):
+            zip_file.writestr_encrypted("a.txt", b"second")